@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+Unit tests for the parts of the proxy that need no server.  Run from
+the repository root with:
+
+    python -m unittest discover
+"""
+
+import os
+import sys
+
+# the wrapper's modules import each other from the wrapper folder.
+_WRAPPER = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "wrapper")
+if _WRAPPER not in sys.path:
+    sys.path.insert(0, _WRAPPER)
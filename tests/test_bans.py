@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+""" proxy.bans - the in-memory ban file indexes. """
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from api.helpers import epoch_to_timestr
+from proxy.bans import IPBans, PlayerBans
+
+UUID = "069a79f4-44e9-4726-a5be-fca90e38aaf5"
+
+
+class _BanFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.log = logging.getLogger("tests")
+
+    def _write(self, filename, records):
+        path = os.path.join(self.directory, "%s.json" % filename)
+        with open(path, "w") as f:
+            json.dump(records, f)
+        # a new mtime, however quickly the file was rewritten
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + len(records) + 1))
+
+    def _read(self, filename):
+        with open(os.path.join(self.directory, "%s.json" % filename)) as f:
+            return json.load(f)
+
+
+class IPBansTest(_BanFileTest):
+    def setUp(self):
+        super(IPBansTest, self).setUp()
+        self._write("banned-ips", [
+            {"ip": "1.2.3.4", "expires": "forever"},
+            {"ip": "192.168.", "expires": "forever"},
+            {"ip": "10.0.0.0/8", "expires": "forever"},
+            {"ip": "172.16.5.128/25", "expires": "forever"}])
+        self.bans = IPBans(self.directory, self.log)
+
+    def test_exact_address(self):
+        self.assertEqual(self.bans.find("1.2.3.4")["ip"], "1.2.3.4")
+        self.assertEqual(self.bans.find("1.2.3.40"), None)
+
+    def test_prefix(self):
+        self.assertEqual(self.bans.find("192.168.40.1")["ip"], "192.168.")
+        self.assertEqual(self.bans.find("192.169.0.1"), None)
+
+    def test_cidr_blocks(self):
+        self.assertEqual(self.bans.find("10.250.3.9")["ip"], "10.0.0.0/8")
+        self.assertEqual(self.bans.find("11.0.0.1"), None)
+        self.assertEqual(self.bans.find("172.16.5.200")["ip"],
+                         "172.16.5.128/25")
+        self.assertEqual(self.bans.find("172.16.5.127"), None)
+
+    def test_not_an_address(self):
+        self.assertEqual(self.bans.find("::1"), None)
+
+    def test_file_changed_on_disk(self):
+        self.assertEqual(self.bans.find("5.6.7.8"), None)
+        self._write("banned-ips", [{"ip": "5.6.7.8", "expires": "forever"}])
+        self.assertEqual(self.bans.find("5.6.7.8")["ip"], "5.6.7.8")
+        self.assertEqual(self.bans.find("1.2.3.4"), None)
+
+    def test_add_and_remove(self):
+        record = {"ip": "8.8.0.0/16", "expires": "forever"}
+        self.assertTrue(self.bans.add(record))
+        self.assertTrue(self.bans.find("8.8.4.4") is record)
+        self.assertEqual(len(self._read("banned-ips")), 5)
+        self.assertTrue(self.bans.remove(record))
+        self.assertEqual(self.bans.find("8.8.4.4"), None)
+        self.assertEqual(len(self._read("banned-ips")), 4)
+
+    def test_missing_file(self):
+        bans = IPBans(os.path.join(self.directory, "none"), self.log)
+        self.assertEqual(bans.find("1.2.3.4"), None)
+        self.assertFalse(bans.exists)
+
+
+class PlayerBansTest(_BanFileTest):
+    def setUp(self):
+        super(PlayerBansTest, self).setUp()
+        now = time.time()
+        self._write("banned-players", [
+            {"uuid": UUID, "name": "Notch", "expires": "forever"},
+            {"uuid": "u-2", "name": "Past",
+             "expires": epoch_to_timestr(now - 3600)},
+            {"uuid": "u-3", "name": "Later",
+             "expires": epoch_to_timestr(now + 3600)},
+            {"uuid": "u-4", "name": "Older",
+             "expires": epoch_to_timestr(now - 7200)}])
+        self.bans = PlayerBans(self.directory, self.log)
+
+    def test_find_by_uuid_or_name(self):
+        self.assertEqual(self.bans.find(uuid=UUID)["name"], "Notch")
+        self.assertEqual(self.bans.find(name="Later")["uuid"], "u-3")
+        self.assertEqual(self.bans.find(name="Nobody"), None)
+
+    def test_expired_bans_pardoned_together(self):
+        expired = self.bans.expire()
+        self.assertEqual(sorted([record["name"] for record in expired]),
+                         ["Older", "Past"])
+        self.assertEqual(self.bans.find(uuid="u-2"), None)
+        self.assertEqual(self.bans.find(name="Later")["uuid"], "u-3")
+        self.assertEqual([record["name"]
+                          for record in self._read("banned-players")],
+                         ["Notch", "Later"])
+        self.assertEqual(self.bans.expire(), [])
+
+    def test_expiry_later(self):
+        self.bans.expire()
+        expired = self.bans.expire(int(time.time()) + 7200)
+        self.assertEqual([record["name"] for record in expired], ["Later"])
+
+    def test_removed_ban_does_not_expire(self):
+        self.bans.remove(self.bans.find(name="Past"))
+        self.assertEqual([record["name"] for record in self.bans.expire()],
+                         ["Older"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+""" proxy.chunkcache - the shared chunk store. """
+
+import gc
+import unittest
+
+from proxy.chunkcache import ChunkCache
+
+SERVER = ("127.0.0.1", 25565)
+
+
+def _key(x, z, dimension=0):
+    return SERVER, dimension, x, z
+
+
+def _payload(seed, size=100):
+    return (b"%c" % seed) * size
+
+
+class ChunkCacheTest(unittest.TestCase):
+    def _released(self):
+        """ Let go of the chunks nobody references any more. """
+        # (CPython frees them at once; other interpreters may not)
+        gc.collect()
+
+    def test_held_chunks_only_without_budget(self):
+        cache = ChunkCache(0)
+        chunk = cache.put(_key(0, 0), _payload(1))
+        self.assertTrue(_key(0, 0) in cache)
+        self.assertEqual(cache.contents(chunk), (_payload(1), []))
+        self.assertEqual(cache.stats()["chunks"], 0)
+        self.assertEqual(cache.stats()["bytes"], 0)
+        chunk = None
+        self._released()
+        self.assertFalse(_key(0, 0) in cache)
+
+    def test_players_share_one_chunk(self):
+        cache = ChunkCache(0)
+        first = cache.put(_key(0, 0), _payload(1))
+        second = cache.put(_key(0, 0), _payload(1))
+        self.assertTrue(first is second)
+        self.assertEqual(cache.stats()["held"], 1)
+
+    def test_identical_payloads_stored_once(self):
+        cache = ChunkCache(1000)
+        cache.put(_key(0, 0), _payload(1))
+        cache.put(_key(1, 0, 1), _payload(1))
+        cache.put(_key(2, 0), _payload(2))
+        stats = cache.stats()
+        self.assertEqual((stats["stored"], stats["shared"]), (2, 1))
+        self.assertEqual(stats["chunks"], 3)
+        self.assertEqual(stats["buffers"], 2)
+        self.assertEqual(stats["bytes"], 200)
+
+    def test_least_recently_stored_evicted(self):
+        cache = ChunkCache(250)
+        for x in range(3):
+            cache.put(_key(x, 0), _payload(x))
+        self._released()
+        stats = cache.stats()
+        self.assertEqual((stats["chunks"], stats["evicted"]), (2, 1))
+        self.assertEqual(stats["bytes"], 200)
+        self.assertFalse(_key(0, 0) in cache)
+        self.assertTrue(_key(2, 0) in cache)
+        # storing one again makes it the most recent
+        cache.put(_key(1, 0), _payload(1))
+        cache.put(_key(3, 0), _payload(3))
+        self._released()
+        self.assertTrue(_key(1, 0) in cache)
+        self.assertFalse(_key(2, 0) in cache)
+
+    def test_held_chunk_outlives_eviction(self):
+        cache = ChunkCache(150)
+        held = cache.put(_key(0, 0), _payload(0))
+        cache.put(_key(1, 0), _payload(1))
+        self._released()
+        self.assertEqual(cache.stats()["evicted"], 1)
+        self.assertTrue(_key(0, 0) in cache)
+        self.assertEqual(cache.contents(held)[0], _payload(0))
+
+    def test_block_changes_are_kept_in_order(self):
+        cache = ChunkCache(0)
+        chunk = cache.put(_key(0, 0), _payload(1))
+        cache.patch(_key(0, 0), 0x0b, b"stone", (1, 2, 3))
+        cache.patch(_key(0, 0), 0x10, b"multi")
+        cache.patch(_key(0, 0), 0x0b, b"air", (1, 2, 3))
+        self.assertEqual(cache.contents(chunk)[1],
+                         [(0x10, b"multi"), (0x0b, b"air")])
+        self.assertEqual(cache.stats()["patched"], 3)
+
+    def test_new_payload_clears_changes(self):
+        cache = ChunkCache(0)
+        chunk = cache.put(_key(0, 0), _payload(1))
+        cache.patch(_key(0, 0), 0x0b, b"stone", (1, 2, 3))
+        cache.put(_key(0, 0), _payload(2))
+        self.assertEqual(cache.contents(chunk), (_payload(2), []))
+
+    def test_changes_to_unheld_chunks_ignored(self):
+        cache = ChunkCache(0)
+        cache.patch(_key(0, 0), 0x0b, b"stone", (1, 2, 3))
+        self.assertFalse(_key(0, 0) in cache)
+        self.assertEqual(cache.stats()["patched"], 0)
+
+    def test_changes_count_toward_the_budget(self):
+        cache = ChunkCache(230)
+        cache.put(_key(0, 0), _payload(0))
+        cache.put(_key(1, 0), _payload(1))
+        self._released()
+        cache.patch(_key(1, 0), 0x0b, b"x" * 20, (1, 2, 3))
+        self.assertEqual(cache.stats()["bytes"], 220)
+        cache.patch(_key(1, 0), 0x0b, b"x" * 30, (1, 2, 3))
+        self.assertEqual(cache.stats()["bytes"], 230)
+        cache.patch(_key(1, 0), 0x0b, b"x" * 10, (1, 2, 4))
+        stats = cache.stats()
+        self.assertEqual((stats["chunks"], stats["bytes"]), (1, 140))
+        self.assertFalse(_key(0, 0) in cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+""" proxy.entity.entitycontrol - entity indexes and area thinning. """
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from proxy.entity.entitybasics import Entity
+from proxy.entity.entitycontrol import EntityControl, AREA_BLOCKS
+
+
+class _JavaServer(object):
+    def __init__(self):
+        self.version_compute = 11200
+        self.lagged_at = 0
+        self.spammy_stuff = []
+
+
+class _Wrapper(object):
+    def __init__(self):
+        self.javaserver = _JavaServer()
+
+
+class _Proxy(object):
+    """ The parts of the Proxy that EntityControl uses. """
+
+    def __init__(self, ent_config):
+        self.ent_config = ent_config
+        self.wrapper = _Wrapper()
+        self.log = logging.getLogger("tests")
+        self.commands = []
+
+    def run_command(self, command):
+        self.commands.append(command)
+
+
+class EntityControlTest(unittest.TestCase):
+    def setUp(self):
+        # (EntityControl writes a wrapper-data/json/entities.json readout)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        self.proxy = _Proxy({
+            "enable-entity-controls": False,
+            "thinning-frequency": 30,
+            "thinning-activation-threshhold": 100,
+            "thinning-commands-per-pass": 10,
+            "thin-Cow": 10,
+            "thin-Zombie": 4})
+        self.control = EntityControl(self.proxy)
+        self._eid = 0
+
+    def _spawn(self, name, x, z, count=1, player="alice", dimension=0):
+        for _ in range(count):
+            self._eid += 1
+            self.control.add_entity(Entity(
+                self._eid, None, name, name, (x, 64.0, z), (0, 0), False,
+                player, dimension))
+        return self._eid
+
+    def test_area_counts(self):
+        self._spawn("Cow", 5, 5, 3)
+        self._spawn("Cow", AREA_BLOCKS + 1, 5)
+        self._spawn("Cow", -1, 5)
+        self._spawn("Zombie", 5, 5, 2, dimension=-1)
+        self.assertEqual(self.control._area_counts, {
+            (0, 0, 0): {"Cow": 3},
+            (0, 1, 0): {"Cow": 1},
+            (0, -1, 0): {"Cow": 1},
+            (-1, 0, 0): {"Zombie": 2}})
+
+    def test_moves_update_the_counts(self):
+        eid = self._spawn("Cow", 5, 5)
+        # relative moves are in 1/4096ths of a block
+        self.control.move_entity(eid, (AREA_BLOCKS * 4096, 0, 0))
+        self.assertEqual(self.control._area_counts, {(0, 1, 0): {"Cow": 1}})
+        # teleports are in 1/32nds
+        self.control.teleport_entity(eid, (5 * 32, 64 * 32, -5 * 32))
+        self.assertEqual(self.control._area_counts, {(0, 0, -1): {"Cow": 1}})
+
+    def test_removing_entities(self):
+        eid = self._spawn("Cow", 5, 5, 2)
+        self._spawn("Cow", 5, 5, player="bob")
+        self.control.remove_entity(eid)
+        self.assertEqual(self.control._area_counts, {(0, 0, 0): {"Cow": 2}})
+        self.control.remove_owner("alice")
+        self.assertEqual(self.control.countEntityTypesInPlayer("alice"), {})
+        self.assertEqual(self.control.countEntityTypesInPlayer("bob"),
+                         {"Cow": 1})
+        self.control.remove_owner("bob")
+        self.assertEqual(self.control._area_counts, {})
+        self.assertEqual(self.control._grid, {})
+        self.assertEqual(self.control.countActiveEntities(), 0)
+
+    def test_entities_near(self):
+        self._spawn("Cow", 0, 0)
+        self._spawn("Cow", 40, 0)
+        self._spawn("Cow", 0, 0, dimension=-1)
+        near = self.control.getEntitiesNear((1, 64, 1), 10)
+        self.assertEqual([entity.x for entity in near], [0])
+        self.assertEqual(len(self.control.getEntitiesNear((0, 64, 0), 50)),
+                         2)
+        self.assertEqual(
+            len(self.control.getEntitiesNear((0, 64, 0), 5, -1)), 1)
+
+    def test_thinning_command(self):
+        self._spawn("Cow", AREA_BLOCKS + 3, -3, 30)
+        self.control._thin()
+        self.assertEqual(self.proxy.commands, [
+            "tp @e[type=Cow,x=%d,y=0,z=%d,dx=%d,dy=255,dz=%d,c=10] "
+            "~ ~-500 ~" % (AREA_BLOCKS, -AREA_BLOCKS, AREA_BLOCKS - 1,
+                           AREA_BLOCKS - 1)])
+
+    def test_thinning_skips_small_surplus_and_other_dimensions(self):
+        self._spawn("Cow", 5, 5, 13)
+        self._spawn("Zombie", 5, 5, 30, dimension=-1)
+        self._spawn("Sheep", 5, 5, 50)
+        self.control._thin()
+        self.assertEqual(self.proxy.commands, [])
+
+    def test_thinning_biggest_first_within_the_limit(self):
+        self.control.thinningCommands = 2
+        self._spawn("Cow", 5, 5, 20)
+        self._spawn("Zombie", 5, 5, 40)
+        self._spawn("Cow", AREA_BLOCKS + 5, 5, 40)
+        self.control._thin()
+        self.assertEqual([command.split(",")[-1][:5]
+                          for command in self.proxy.commands],
+                         ["c=18]", "c=15]"])
+        # half as many commands after the server lagged
+        self.proxy.commands = []
+        self.proxy.wrapper.javaserver.lagged_at = time.time()
+        self.control._thin()
+        self.assertEqual(len(self.proxy.commands), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+""" proxy.packets.packet - framing, codecs and the send queue. """
+
+import io
+import logging
+import socket
+import struct
+import threading
+import unittest
+
+from proxy.packets.packet import Packet, LazyNBT, _compile, LANE_BULK, \
+    LANE_CONTROL
+from proxy.utils.constants import PLAY, PROTOCOL_1_8START, PROTOCOL_1_12, \
+    BOOL, BYTE, DOUBLE, FLOAT, INT, LONG, POSITION, RAW, SHORT, SLOT, \
+    STRING, UBYTE, USHORT, VARINT
+
+THRESHOLD = 256
+
+
+class _JavaServer(object):
+    def __init__(self, version):
+        self.protocolVersion = version
+
+
+class _Owner(object):
+    """ The parts of a client/server connection a Packet uses. """
+
+    def __init__(self, parsers=None, version=PROTOCOL_1_12):
+        self.log = logging.getLogger("tests")
+        self.javaserver = _JavaServer(version)
+        self.parsers = parsers
+        self.state = PLAY
+        self.abort = False
+        self.closed = None
+
+    def close_server(self, reason):
+        self.closed = reason
+
+
+def _frame(pkid, body, threshold=THRESHOLD):
+    """ The bytes a peer would send for a packet. """
+    writer = Packet(None, _Owner())
+    writer.compressThreshold = threshold
+    return writer.handle_compression(
+        threshold, writer.send_varint(pkid) + body)
+
+
+class _XorCipher(object):
+    """ Stands in for an AES stream cipher: update() keeps no state. """
+
+    def update(self, data):
+        return bytes(bytearray([byte ^ 0x5a for byte in bytearray(data)]))
+
+
+class _SocketTest(unittest.TestCase):
+    def _socketpair(self):
+        ours, theirs = socket.socketpair()
+        self.addCleanup(ours.close)
+        self.addCleanup(theirs.close)
+        return ours, theirs
+
+    def _reader(self, data, owner, threshold=THRESHOLD):
+        """ A Packet with `data` waiting on its socket. """
+        ours, theirs = self._socketpair()
+        theirs.sendall(data)
+        pk = Packet(ours, owner)
+        pk.compressThreshold = threshold
+        return pk
+
+
+class PassthroughTest(_SocketTest):
+    """ Packets no parser wants are forwarded without decompressing. """
+
+    def setUp(self):
+        self.body = b"\x00\x00\x00\x07" + b"\x04" + b"x" * 1000
+        self.wire = _frame(0x20, self.body)
+
+    def test_unwanted_packet_is_not_inflated(self):
+        pk = self._reader(self.wire, _Owner({PLAY: {0x01: None}}))
+        pkid, orig = pk.grabpacket()
+        self.assertEqual(pkid, 0x20)
+        self.assertEqual(pk.buffer.getvalue(), b"")
+        self.assertEqual(pk.compression_stats()["decompressed"], 0)
+        # the frame as it arrived, less its length prefix
+        self.assertEqual(pk.pack_varint(len(orig)) + orig, self.wire)
+
+    def test_wanted_packet_is_decoded(self):
+        pk = self._reader(self.wire, _Owner({PLAY: {0x20: None}}))
+        pkid, orig = pk.grabpacket()
+        self.assertEqual(pkid, 0x20)
+        self.assertEqual(pk.compression_stats()["decompressed"], 1)
+        self.assertEqual(pk.readpkt([INT, STRING]), [7, "xxxx"])
+        self.assertEqual(pk.pack_varint(len(orig)) + orig, self.wire)
+
+    def test_owner_without_parsers_decodes_everything(self):
+        pk = self._reader(self.wire, _Owner())
+        pk.grabpacket()
+        self.assertEqual(pk.compression_stats()["decompressed"], 1)
+        self.assertEqual(pk.buffer.read(), self.body)
+
+    def test_forwarded_frames_are_unchanged(self):
+        small = _frame(0x21, b"abc")
+        pk = self._reader(self.wire + small, _Owner({PLAY: {}}))
+        ours, theirs = self._socketpair()
+        out = Packet(ours, _Owner())
+        out.compressThreshold = THRESHOLD
+        for _ in range(2):
+            pkid, orig = pk.grabpacket()
+            out.send_raw_untouched(orig, pkid)
+        out.flush()
+        expected = self.wire + small
+        received = b""
+        while len(received) < len(expected):
+            received += theirs.recv(65536)
+        self.assertEqual(received, expected)
+        self.assertEqual(out.compression_stats()["compressed"], 0)
+
+
+class FramingTest(_SocketTest):
+    """ Frames are sliced out of the connection's receive buffer. """
+
+    def test_frames_read_in_order(self):
+        frames = [_frame(pkid, b"%d" % pkid * pkid, -1)
+                  for pkid in range(1, 40)]
+        pk = self._reader(b"".join(frames), _Owner(), -1)
+        for pkid in range(1, 40):
+            self.assertEqual(pk.grabpacket()[0], pkid)
+            self.assertEqual(pk.buffer.read(), b"%d" % pkid * pkid)
+
+    def test_frame_larger_than_one_read(self):
+        body = bytes(bytearray(range(256))) * 1024
+        ours, theirs = self._socketpair()
+        # (more than the socket buffers hold, so send it alongside)
+        sender = threading.Thread(
+            target=theirs.sendall, args=(_frame(0x22, body, -1),))
+        sender.start()
+        pk = Packet(ours, _Owner())
+        pkid, orig = pk.grabpacket()
+        sender.join()
+        self.assertEqual(pkid, 0x22)
+        self.assertEqual(pk.buffer.read(), body)
+
+    def test_has_frame_on_a_partial_frame(self):
+        wire = _frame(0x23, b"y" * 300, -1)
+        ours, theirs = self._socketpair()
+        ours.setblocking(False)
+        pk = Packet(ours, _Owner())
+        self.assertFalse(pk.has_frame())
+        # nothing to read is not an error
+        pk.feed()
+        theirs.sendall(wire[:1])
+        pk.feed()
+        self.assertFalse(pk.has_frame())
+        theirs.sendall(wire[1:100])
+        pk.feed()
+        self.assertFalse(pk.has_frame())
+        theirs.sendall(wire[100:])
+        pk.feed()
+        self.assertTrue(pk.has_frame())
+        self.assertEqual(pk.grabpacket()[0], 0x23)
+        self.assertFalse(pk.has_frame())
+
+    def test_cipher_applies_to_buffered_bytes(self):
+        # the login's last plain packet and the first encrypted one can
+        # arrive in the same read.
+        plain = _frame(0x02, b"plain", -1)
+        secret = _frame(0x24, b"secret", -1)
+        pk = self._reader(plain + _XorCipher().update(secret), _Owner(), -1)
+        self.assertEqual(pk.grabpacket()[0], 0x02)
+        pk.recvCipher = _XorCipher()
+        self.assertEqual(pk.grabpacket()[0], 0x24)
+        self.assertEqual(pk.buffer.read(), b"secret")
+
+    def test_closed_socket_raises_eof(self):
+        ours, theirs = self._socketpair()
+        theirs.sendall(_frame(0x01, b"", -1))
+        theirs.close()
+        pk = Packet(ours, _Owner())
+        self.assertEqual(pk.grabpacket()[0], 0x01)
+        self.assertRaises(EOFError, pk.grabpacket)
+
+
+class CodecTest(unittest.TestCase):
+    """ readpkt/sendpkt type lists compiled to struct codecs. """
+
+    ARGS = [VARINT, INT, BOOL, DOUBLE, STRING, SHORT, BOOL, UBYTE,
+            POSITION, LONG, FLOAT, USHORT, BYTE, RAW]
+    VALUES = [-2, 70000, True, 1.5, u"h\xe9llo", -3, False, 200,
+              (-100, 64, 3000), 1 << 40, 0.25, 65535, -128, b"rest"]
+
+    def setUp(self):
+        self.pk = Packet(None, _Owner())
+
+    def _read(self, data, args):
+        self.pk.buffer = io.BytesIO(data)
+        return self.pk.readpkt(args)
+
+    def test_round_trip(self):
+        data = self.pk.sendpkt(0x30, self.ARGS, self.VALUES)
+        self.assertEqual(self.pk.queue[-1], (-1, data))
+        self.pk.buffer = io.BytesIO(data)
+        self.assertEqual(self.pk.read_varint(), 0x30)
+        values = self.pk.readpkt(self.ARGS)
+        self.assertEqual(values, self.VALUES)
+        self.assertTrue(values[2] is True and values[6] is False)
+
+    def test_matches_field_by_field_encoding(self):
+        pk = self.pk
+        expected = (pk.send_varint(0x31) + pk.send_varint(-2) +
+                    pk.send_int(70000) + pk.send_bool(True) +
+                    pk.send_double(1.5) + pk.send_string(u"h\xe9llo"))
+        self.assertEqual(
+            pk.sendpkt(0x31, self.ARGS[:5], self.VALUES[:5]), expected)
+
+    def test_fixed_fields_share_a_struct(self):
+        codec = _compile([INT, BOOL, DOUBLE, STRING, SHORT, BYTE])
+        self.assertEqual([step[2] for step in codec.steps], [3, 1, 2])
+        self.assertEqual(codec.steps[0][1].format, ">ibd")
+        self.assertTrue(codec.steps[1][1] is None)
+
+    def test_codecs_are_compiled_once(self):
+        self.assertTrue(_compile([INT, STRING]) is _compile((INT, STRING)))
+
+    def test_bool_reads_one_as_true(self):
+        self.assertEqual(self._read(b"\x01\x00\x02", [BOOL, BOOL, BOOL]),
+                         [True, False, False])
+
+    def test_truncated_packet_raises(self):
+        self.assertRaises(struct.error, self._read,
+                          struct.pack(">i", 1), [INT, INT])
+
+
+class QueueLimitTest(unittest.TestCase):
+    """ Send queue watermarks, dropping, coalescing and the hard limit. """
+
+    DROP = 0x40
+    MOVE = 0x41
+    CHAT = 0x42
+
+    def setUp(self):
+        self.owner = _Owner()
+        self.pk = Packet(None, self.owner)
+        self.pk.set_queue_limits(1000, 500, 5000)
+        self.pk.droppable = set([self.DROP, self.MOVE])
+        self.pk.coalesce = set([self.MOVE])
+
+    def _send(self, pkid, size=100):
+        self.pk.send_raw_untouched(b"%c" % pkid + b"z" * (size - 1), pkid)
+
+    def _queued(self):
+        # (a coalescable item is a [compression, payload, pkid] list)
+        return [item[1][:1] for item in self.pk.queue]
+
+    def test_nothing_dropped_below_high_water(self):
+        for _ in range(9):
+            self._send(self.DROP)
+        self.assertEqual(len(self.pk.queue), 9)
+        self.assertEqual(self.pk.dropped, 0)
+
+    def test_droppable_packets_dropped_when_congested(self):
+        for _ in range(11):
+            self._send(self.CHAT)
+        self._send(self.DROP)
+        self._send(self.CHAT)
+        self.assertEqual(self.pk.dropped, 1)
+        self.assertEqual(len(self.pk.queue), 12)
+        self.assertFalse(b"%c" % self.DROP in self._queued())
+
+    def test_coalesced_packet_keeps_its_place(self):
+        for _ in range(11):
+            self._send(self.CHAT)
+        self._send(self.MOVE, 50)
+        self._send(self.CHAT)
+        self._send(self.MOVE, 80)
+        self._send(self.MOVE, 90)
+        self.assertEqual(self.pk.coalesced, 2)
+        self.assertEqual(self._queued()[11:], [b"%c" % self.MOVE,
+                                               b"%c" % self.CHAT])
+        self.assertEqual(len(self.pk.queue[11][1]), 90)
+        self.assertEqual(self.pk._qbytes, 12 * 100 + 90)
+        batch = self.pk._next_batch()
+        self.assertEqual(len(batch[11][1]), 90)
+        self.assertEqual(self.pk._qbytes, 0)
+
+    def test_drops_stop_below_low_water(self):
+        for _ in range(11):
+            self._send(self.CHAT)
+        self._send(self.DROP)
+        self.assertEqual(self.pk.dropped, 1)
+        self.pk._next_batch()
+        self._send(self.DROP)
+        self.assertEqual(self.pk.dropped, 1)
+        self.assertEqual(self._queued(), [b"%c" % self.DROP])
+
+    def test_hard_limit_closes_the_connection(self):
+        for _ in range(51):
+            self._send(self.CHAT)
+        self.assertFalse(self.pk.abort)
+        self._send(self.CHAT)
+        self.assertTrue(self.pk.abort)
+        self.assertTrue(self.owner.abort)
+        self.assertFalse(self.pk.has_queued())
+        self._send(self.CHAT)
+        self.assertFalse(self.pk.has_queued())
+
+
+class LaneTest(unittest.TestCase):
+    """ Control, interactive and bulk send lanes. """
+
+    KEEPALIVE = 0x50
+    CHUNK = 0x51
+    CHAT = 0x52
+    BLOCK = 0x53
+    RESPAWN = 0x54
+
+    def setUp(self):
+        self.pk = Packet(None, _Owner())
+
+    def _lanes(self):
+        self.pk.set_lanes({self.KEEPALIVE: LANE_CONTROL,
+                           self.CHUNK: LANE_BULK}, (4, 1),
+                          follow_bulk=[self.BLOCK], barriers=[self.RESPAWN])
+
+    def _send(self, pkid, size=1024):
+        self.pk.send_raw_untouched(b"%c" % pkid + b"z" * (size - 1), pkid)
+
+    def _batch(self):
+        return [payload[:1] for compression, payload in self.pk._next_batch()]
+
+    def test_earlier_packets_are_not_overtaken(self):
+        self._send(self.CHAT)
+        self._lanes()
+        self._send(self.KEEPALIVE)
+        self.assertEqual(self._batch(),
+                         [b"%c" % self.CHAT, b"%c" % self.KEEPALIVE])
+
+    def test_control_goes_first(self):
+        self._lanes()
+        self._send(self.CHUNK)
+        self._send(self.CHAT)
+        self._send(self.KEEPALIVE)
+        self.assertEqual(self._batch()[0], b"%c" % self.KEEPALIVE)
+
+    def test_lanes_share_a_batch_by_weight(self):
+        self._lanes()
+        for _ in range(100):
+            self._send(self.CHUNK)
+            self._send(self.CHAT)
+        batch = self._batch()
+        chat = batch.count(b"%c" % self.CHAT)
+        self.assertEqual(chat, 4 * batch.count(b"%c" % self.CHUNK))
+        self.assertTrue(chat < 100)
+
+    def test_bulk_lane_is_not_starved(self):
+        self._lanes()
+        self._send(self.CHUNK)
+        for _ in range(200):
+            self._send(self.CHAT)
+        self.assertTrue(b"%c" % self.CHUNK in self._batch())
+
+    def test_follow_bulk_waits_for_queued_chunks(self):
+        self._lanes()
+        self._send(self.BLOCK)
+        self.assertEqual(len(self.pk.queue), 1)
+        self._send(self.CHUNK)
+        self._send(self.BLOCK)
+        self.assertEqual(len(self.pk.bulk), 2)
+
+    def test_barrier_holds_later_packets_until_bulk_drains(self):
+        self._lanes()
+        self._send(self.CHUNK)
+        self._send(self.RESPAWN)
+        self._send(self.CHAT)
+        self._send(self.KEEPALIVE)
+        self.assertEqual(len(self.pk.bulk), 3)
+        self.assertEqual(self._batch(), [b"%c" % self.KEEPALIVE,
+                                         b"%c" % self.CHUNK,
+                                         b"%c" % self.RESPAWN,
+                                         b"%c" % self.CHAT])
+        self._send(self.CHAT)
+        self.assertEqual(len(self.pk.queue), 1)
+
+
+class LazyNBTTest(unittest.TestCase):
+    """ Slot NBT kept as raw bytes until something reads it. """
+
+    TAG = {"type": 10, "name": "", "value": [
+        {"type": 8, "name": "Name", "value": u"Sw\xf6rd"},
+        {"type": 3, "name": "Damage", "value": 5},
+        {"type": 9, "name": "ench", "value": [
+            {"type": 2, "name": "", "value": 16},
+            {"type": 2, "name": "", "value": 34}]},
+        {"type": 10, "name": "display", "value": [
+            {"type": 11, "name": "colors", "value": [1, 2, 3]},
+            {"type": 12, "name": "ids", "value": [1 << 40]},
+            {"type": 7, "name": "bytes", "value": b"\x01\x02"}]}]}
+
+    def setUp(self):
+        self.pk = Packet(None, _Owner())
+        self.slot = {"id": 276, "count": 1, "damage": 0, "nbt": self.TAG}
+        self.data = self.pk.send_slot(self.slot) + b"after"
+
+    def _read_slot(self, data):
+        self.pk.buffer = io.BytesIO(data)
+        return self.pk.read_slot()
+
+    def test_tag_is_skipped_not_decoded(self):
+        nbt = self._read_slot(self.data)["nbt"]
+        self.assertTrue(isinstance(nbt, LazyNBT))
+        self.assertFalse(nbt.loaded)
+        self.assertEqual(nbt["type"], 10)
+        self.assertFalse(nbt.loaded)
+        # the tag's end was found
+        self.assertEqual(self.pk.buffer.read(), b"after")
+
+    def test_unread_tag_is_sent_as_it_arrived(self):
+        slot = self._read_slot(self.data)
+        self.assertEqual(self.pk.send_slot(slot) + b"after", self.data)
+        self.assertFalse(slot["nbt"].loaded)
+
+    def test_reading_decodes_like_read_tag(self):
+        nbt = self._read_slot(self.data)["nbt"]
+        self.assertEqual(nbt["value"], self.TAG["value"])
+        self.assertTrue(nbt.loaded)
+        self.assertEqual(nbt, self.TAG)
+        self.assertEqual(nbt.copy(), self.TAG)
+        self.assertEqual(type(nbt.copy()), dict)
+
+    def test_changed_tag_is_encoded_again(self):
+        nbt = self._read_slot(self.data)["nbt"]
+        nbt["value"][1]["value"] = 6
+        changed = {"type": 10, "name": "", "value": [
+            dict(tag) for tag in self.TAG["value"]]}
+        changed["value"][1]["value"] = 6
+        self.assertEqual(self.pk.send_tag(nbt), self.pk.send_tag(changed))
+
+    def test_empty_slots(self):
+        self.assertEqual(self._read_slot(self.pk.send_short(-1)),
+                         {"id": -1})
+        slot = {"id": 1, "count": 2, "damage": 0, "nbt": None}
+        self.assertEqual(self._read_slot(self.pk.send_slot(slot))["nbt"],
+                         {"type": 0})
+
+    def test_damage_before_1_13(self):
+        pk = Packet(None, _Owner(version=PROTOCOL_1_8START))
+        pk.buffer = io.BytesIO(pk.send_slot(dict(self.slot, damage=7)))
+        slot = pk.readpkt([SLOT])[0]
+        self.assertEqual(slot["damage"], 7)
+        self.assertEqual(slot["nbt"], self.TAG)
+
+
+if __name__ == "__main__":
+    unittest.main()
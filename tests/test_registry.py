@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+""" proxy.client.registry - the proxy's indexed client list. """
+
+import unittest
+
+from proxy.client.registry import ClientRegistry
+
+
+class _UUID(object):
+    def __init__(self, string):
+        self.string = string
+
+
+class _Client(object):
+    """ The attributes of a Client that the registry indexes. """
+
+    def __init__(self, username, eid, port):
+        self.username = username
+        self.server_eid = eid
+        self.client_address = ("127.0.0.1", port)
+        self.local_uuid = _UUID("offline-%s" % username)
+        self.wrapper_uuid = _UUID("wrapper-%s" % username)
+        self.mojanguuid = _UUID("mojang-%s" % username)
+
+    def __repr__(self):
+        return "_Client(%s)" % self.username
+
+
+class ClientRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = ClientRegistry()
+        self.alice = _Client("alice", 10, 50001)
+        self.bob = _Client("bob", 11, 50002)
+        self.registry.add(self.alice)
+        self.registry.add(self.bob)
+
+    def test_lookups(self):
+        registry = self.registry
+        self.assertTrue(registry.by_username("alice") is self.alice)
+        self.assertTrue(registry.by_eid(11) is self.bob)
+        self.assertTrue(
+            registry.by_address(("127.0.0.1", 50002)) is self.bob)
+        self.assertTrue(registry.by_server_uuid("offline-bob") is self.bob)
+        self.assertTrue(registry.by_uuid("wrapper-alice") is self.alice)
+        self.assertTrue(registry.by_uuid("mojang-alice") is self.alice)
+        self.assertEqual(registry.by_username("carol"), None)
+
+    def test_list_like(self):
+        self.assertEqual(len(self.registry), 2)
+        self.assertTrue(self.bob in self.registry)
+        self.assertEqual(list(self.registry), [self.alice, self.bob])
+
+    def test_remove(self):
+        self.assertTrue(self.registry.remove(self.alice))
+        self.assertFalse(self.registry.remove(self.alice))
+        self.assertEqual(self.registry.by_username("alice"), None)
+        self.assertEqual(self.registry.by_eid(10), None)
+        self.assertEqual(list(self.registry), [self.bob])
+
+    def test_iterating_while_clients_leave(self):
+        carol = _Client("carol", 12, 50003)
+        seen = []
+        for client in self.registry:
+            seen.append(client)
+            self.registry.remove(client)
+            self.registry.add(carol)
+        self.assertEqual(seen, [self.alice, self.bob])
+        self.assertEqual(list(self.registry), [carol])
+
+    def test_reindex(self):
+        self.alice.server_eid = 20
+        self.alice.mojanguuid = _UUID("mojang-new")
+        self.registry.reindex(self.alice)
+        self.assertTrue(self.registry.by_eid(20) is self.alice)
+        self.assertEqual(self.registry.by_eid(10), None)
+        self.assertTrue(self.registry.by_uuid("mojang-new") is self.alice)
+        self.assertEqual(self.registry.by_uuid("mojang-alice"), None)
+
+    def test_stale_entries_are_checked(self):
+        # changed without a reindex; the old key must not find them
+        self.alice.username = "alice2"
+        self.assertEqual(self.registry.by_username("alice"), None)
+        self.assertTrue(self.registry.by_username("alice2") is self.alice)
+
+    def test_key_taken_over(self):
+        # bob's old entity id went to alice, and neither was reindexed
+        self.bob.server_eid = 21
+        self.alice.server_eid = 11
+        self.assertTrue(self.registry.by_eid(11) is self.alice)
+        self.assertTrue(self.registry.by_eid(21) is self.bob)
+        self.assertEqual(self.registry.by_eid(10), None)
+
+    def test_removing_one_keeps_a_shared_key(self):
+        again = _Client("alice", 30, 50004)
+        self.registry.add(again)
+        self.registry.remove(self.alice)
+        self.assertTrue(self.registry.by_username("alice") is again)
+
+    def test_missing_uuids(self):
+        carol = _Client("carol", 12, 50003)
+        carol.local_uuid = carol.wrapper_uuid = carol.mojanguuid = None
+        self.registry.add(carol)
+        self.assertTrue(self.registry.by_username("carol") is carol)
+        self.assertEqual(self.registry.by_server_uuid("offline-carol"),
+                         None)
+
+
+if __name__ == "__main__":
+    unittest.main()
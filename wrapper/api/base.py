@@ -225,6 +225,11 @@ class API(object):
         if self.id not in self.wrapper.events:
             self.wrapper.events[self.id] = {}
         self.wrapper.events[self.id][eventname] = callback
+        # The proxy may need to start parsing packets for this event.
+        # (plugins still loading are picked up once all are loaded.)
+        loaded = self.name in self.wrapper.plugins.plugins_loaded
+        if loaded and self.wrapper.proxy:
+            self.wrapper.proxy.refresh_parsers()
 
     def registerPermission(self, permission=None, value=False):
         """
@@ -10,6 +10,7 @@ from __future__ import print_function
 
 import os
 import errno
+import io
 import sys
 import json
 import time
@@ -297,9 +298,11 @@ def getjsonfile(filename, directory=".", encodedas="UTF-8"):
     if not os.path.exists(directory):
         mkdir_p(directory)
     if os.path.exists("%s/%s.json" % (directory, filename)):
-        with open("%s/%s.json" % (directory, filename)) as f:
+        # (json.loads() no longer takes an encoding in Python 3.9+)
+        with io.open("%s/%s.json" % (directory, filename),
+                     encoding=encodedas) as f:
             try:
-                return json.loads(f.read(), encoding=encodedas)
+                return json.loads(f.read())
             except ValueError:
                 return None
             #  Exit yielding None (no data)
@@ -404,6 +407,28 @@ def isipv4address(addr):
     return True
 
 
+def islanaddress(addr):
+    """
+    Returns a Boolean indicating if the address is this machine or
+    a private (LAN) IPv4 address.  None is treated as localhost.
+
+    :arg addr: Address to check.
+
+    :returns: True or False
+
+    """
+    if addr is None or addr == "localhost":
+        return True
+    if not isipv4address(addr) or addr.count(".") != 3:
+        return False
+    octets = [int(x) for x in addr.split(".")]
+    if octets[0] in (10, 127):
+        return True
+    if octets[0] == 172 and 16 <= octets[1] <= 31:
+        return True
+    return octets[0] == 192 and octets[1] == 168
+
+
 def pickle_load(path, filename):
     """
     Load data from a Pickle file (*.pkl).  Normally the returned data would
@@ -994,6 +1019,12 @@ def _test():
     assert (isipv4address("honkin")) is False
     assert (isipv4address("www.surestcraft.com")) is False
 
+    assert (islanaddress(None)) is True
+    assert (islanaddress("127.0.0.1")) is True
+    assert (islanaddress("172.20.0.4")) is True
+    assert (islanaddress("172.32.0.4")) is False
+    assert (islanaddress("www.surestcraft.com")) is False
+
     assert (_secondstohuman(36986) == '10.27 hours')
     assert (3698 // 3600) == 1
 
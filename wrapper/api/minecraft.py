@@ -12,8 +12,8 @@ import os
 from core.nbt import NBTFile
 from proxy.entity.entitybasics import Items
 from api.helpers import scrub_item_value, pickle_load
-from proxy.packets.mcpackets_cb import Packets as ClientBound
-from proxy.packets.mcpackets_sb import Packets as ServerBound
+from proxy.packets.mcpackets_cb import get_packets as get_clientbound
+from proxy.packets.mcpackets_sb import get_packets as get_serverbound
 
 
 # noinspection PyBroadException
@@ -150,9 +150,9 @@ class Minecraft(object):
         version = self.wrapper.javaserver.protocolVersion
 
         if packetset == "SB":
-            return ServerBound(version)
+            return get_serverbound(version)
         else:
-            return ClientBound(version)
+            return get_clientbound(version)
 
     def getTimeofDay(self, dttmformat=0):
         """
@@ -297,9 +297,6 @@ class Minecraft(object):
             :self.entityControl:
              config["Entities"]["enable-entity-controls"]
 
-            :self.entityProcessorFrequency:
-             config["Entities"]["entity-update-frequency"]
-
             :self.thiningFrequency:
              config["Entities"]["thinning-frequency"]
 
@@ -356,14 +353,14 @@ class Minecraft(object):
         :returns: The Player Class object for the specified EID.
          If the EID is not a player or is not found, returns False
         """
-        for client in self.wrapper.proxy.clients:
-            if client.server_eid == eid:
-                try:
-                    return self.wrapper.players[client.username]
-                except Exception as e:
-                    self.log.debug("getplayerby_eid failed to get "
-                                   "player %s: \n%s", client.username, e)
-                    return False
+        client = self.wrapper.proxy.clients.by_eid(eid)
+        if client:
+            try:
+                return self.wrapper.players[client.username]
+            except Exception as e:
+                self.log.debug("getplayerby_eid failed to get "
+                               "player %s: \n%s", client.username, e)
+                return False
         self.log.debug("Failed to get any player by client Eid: %s", eid)
         return False
 
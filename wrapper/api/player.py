@@ -9,8 +9,8 @@ import time
 import threading
 import pprint
 
-from proxy.packets.mcpackets_cb import Packets as Packets_cb
-from proxy.packets.mcpackets_sb import Packets as Packets_sb
+from proxy.packets.mcpackets_cb import get_packets as get_packets_cb
+from proxy.packets.mcpackets_sb import get_packets as get_packets_sb
 
 from proxy.utils.constants import *
 from core.storage import Storage
@@ -116,8 +116,8 @@ class Player(object):
         self.client
         self.clientUuid
         self.clientgameversion
-        self.clientboundPackets = Packets_cb(self.clientgameversion)
-        self.serverboundPackets = Packets_sb(self.clientgameversion)
+        self.clientboundPackets = get_packets_cb(self.clientgameversion)
+        self.serverboundPackets = get_packets_sb(self.clientgameversion)
 
         # some player properties associated with abilities (proxy)
         # default is 1.  Should normally be congruent with speed.
@@ -186,8 +186,8 @@ class Player(object):
 
         self.client = None
         self.clientgameversion = self.wrapper.javaserver.protocolVersion
-        self.cbpkt = Packets_cb(self.clientgameversion)
-        self.sbpkt = Packets_sb(self.clientgameversion)
+        self.cbpkt = get_packets_cb(self.clientgameversion)
+        self.sbpkt = get_packets_sb(self.clientgameversion)
 
         self.playereid = None
 
@@ -203,21 +203,18 @@ class Player(object):
         self.fly_speed = float(1)
 
         if self.wrapper.proxy:
-            gotclient = False
-            for client in self.wrapper.proxy.clients:
-                if client.username == self.username:
-                    self.client = client
-                    self.clientUuid = client.wrapper_uuid
-                    self.serverUuid = client.local_uuid
-                    self.mojangUuid = client.mojanguuid
-                    self.ipaddress = client.ip
-
-                    # pktSB already set to self.wrapper.javaserver.protocolVersion  # noqa
-                    self.clientboundPackets = self.client.pktCB
-                    self.clientgameversion = self.client.clientversion
-                    gotclient = True
-                    break
-            if not gotclient:
+            client = self.wrapper.proxy.clients.by_username(self.username)
+            if client:
+                self.client = client
+                self.clientUuid = client.wrapper_uuid
+                self.serverUuid = client.local_uuid
+                self.mojangUuid = client.mojanguuid
+                self.ipaddress = client.ip
+
+                # pktSB already set to self.wrapper.javaserver.protocolVersion  # noqa
+                self.clientboundPackets = self.client.pktCB
+                self.clientgameversion = self.client.clientversion
+            else:
                 pprint.pprint(self.wrapper.proxy.clients)
                 self.log.error("Proxy is on, but this client is not "
                                "listed in proxy.clients!")
@@ -398,10 +395,10 @@ class Player(object):
 
         """
         if self.client is None:
-            for client in self.wrapper.proxy.clients:
-                if client.username == self.username:
-                    self.client = client
-                    return client
+            client = self.wrapper.proxy.clients.by_username(self.username)
+            if client:
+                self.client = client
+                return client
             self.log.warning("getClient could not return a client for:%s"
                              " \nThe usual cause of this condition"
                              " is that no client instance exists because"
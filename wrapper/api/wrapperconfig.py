@@ -152,11 +152,7 @@ CONFIG = {
 
             "enable-entity-controls": False,
 
-         # how often the entity processor updates world entity counts
-
-            "entity-update-frequency": 4,
-
-         # how often thinning of mobs runs, in seconds.  a large difference between this and the entity update frequency will ensure no 'overkill" occurs.
+         # how often thinning of mobs runs, in seconds.
 
             "thinning-frequency": 30,
 
@@ -164,6 +160,10 @@ CONFIG = {
 
             "thinning-activation-threshhold": 100,
 
+         # Thinning sends one command for each kind of mob over its limit in each 128x128 block overworld area, at most this many each time it runs (half as many if the server lagged since the last run).
+
+            "thinning-commands-per-pass": 8,
+
          # The following items thin specific mobs over the stated count.  This only happens after the total mob count threshold above is met first.  For example, 'thin-Cow: 40` starts thinning cows > 40.  Entity names must match minecraft naming exactly as they would appear in the game.
 
          # Check /wrapper-data/json/entities.json
@@ -355,10 +355,76 @@ CONFIG = {
 
             "max-players": 1024,
 
-         # Flush rate sets the interval for packet flushing.  This is a fine-tuning mechanism. 50 Ms is one minecraft tick.  Faster (smaller) rates result in dropped items disappearing.  Larger values can create jerkiness or lag, but result in more reliable transmission.  This is a fine tuning that may be different for each server based on the number of plugins, whether the server is hub, etc.. 50-100 is recommended for most servers.  Hub servers with limited play can be set at 10.
+         # Packets are sent as soon as they are queued (queued packets are sent together in one batch).  Flush rate is now only the longest time (in milliseconds) an idle connection waits before checking whether it has closed.
 
             "flush-rate-ms": 50,
 
+         # How the proxy drives its sockets. "threads" uses several threads for every player (the original model).  "selectors" runs all player and server sockets on one event loop thread (requires Python 3.4+; falls back to "threads" otherwise).  Logins, disconnects and chat are still handled on short-lived worker threads, so plugin events for those can still block safely.
+
+            "proxy-engine": "threads",
+
+         # zlib level (0-9) for packets the proxy compresses for players.  -1 is zlib's default (6), the same as the Minecraft server uses.
+
+            "compression-level": -1,
+
+         # 'fast' profile - the zlib level for packets compressed for a server on this machine or the LAN (localhost, 10.x, 172.16-31.x, 192.168.x).  Those packets are decompressed right away, so a low level saves CPU without costing bandwidth that matters.
+
+            "compression-level-lan": 1,
+
+         # Threads shared by all connections for compressing and encrypting large packets (like chunk data) on other CPU cores.  0 does all the work on each connection's own thread.  Requires Python 3 (or the 'futures' package on Python 2).
+
+            "packet-workers": 2,
+
+         # Packets (or batches of packets, with the "selectors" proxy-engine) smaller than this many bytes are not worth handing to the packet-workers.
+
+            "packet-worker-cutoff": 32768,
+
+         # Send queue limits for each connection, in KiB (0 turns a limit off).  When a player's queue is over the high mark (their connection is not keeping up), entity movement/look packets are dropped and time updates are merged until the queue drains below the low mark.  Over the hard limit, the player is disconnected.
+
+            "send-queue-high-kb": 2048,
+
+            "send-queue-low-kb": 1024,
+
+            "send-queue-limit-kb": 32768,
+
+         # Priority lanes for packets sent to players, so keep-alives and chat are not stuck behind megabytes of chunks.  Control packets are always sent first.  Everything not listed is 'interactive' and shares each send with the bulk lane by "lane-weights" [interactive, bulk].  Names are the packet names in proxy/packets/mcpackets_cb.py.  Block changes, respawns and joins never overtake queued bulk packets.  Entity packets are best left out of the bulk lane (moves must not overtake their spawn).
+
+            "priority-lanes": True,
+
+            "lanes-control": ["KEEP_ALIVE", "CHAT_MESSAGE", "DISCONNECT", "TAB_COMPLETE"],
+
+            "lanes-bulk": ["CHUNK_DATA", "MAP_CHUNK_BULK", "UNLOAD_CHUNK"],
+
+            "lane-weights": [4, 1],
+
+         # KiB of chunk data the proxy keeps (shared by all players) for re-sending a player's surroundings after a hub world change, besides the chunks players are holding for that.  0 keeps only the held chunks.
+
+            "chunk-cache-kb": 65536,
+
+         # The proxy socket's listen() backlog (connections waiting to be accepted).
+
+            "listen-backlog": 128,
+
+         # Admission limits, checked as each connection is accepted (before any work is done for it).  Each IP address and each /24 subnet gets a token bucket: connections per second ("connect-rate-...", 0 turns it off) with a "connect-burst-..." allowance.  Connections over the limit are closed immediately.  These keep reconnect storms and bot floods from starving real logins.
+
+            "connect-rate-ip": 1.0,
+
+            "connect-burst-ip": 8,
+
+            "connect-rate-subnet": 8.0,
+
+            "connect-burst-subnet": 32,
+
+         # Addresses (or CIDR blocks like "10.0.0.0/8") the connect-rate limits never apply to.  Add the address of any BungeeCord or wrapper proxy in front of this one, since all its players share that address.
+
+            "connect-exempt": ["127.0.0.0/8", "::1"],
+
+         # Most connections allowed to be in the handshake/login stage at once (0 for no limit).  Those taking longer than "handshake-timeout" seconds are disconnected (only when max-handshakes is used).  Logins still waiting for authentication after "handshake-timeout" seconds are always disconnected.
+
+            "max-handshakes": 64,
+
+            "handshake-timeout": 30,
+
          # Auto name changes causes wrapper to automatically change the player's server name.  Enabling this makes name change handling automatic, but will prevent setting your own custom names on the server.
 
             "auto-name-changes": True,
@@ -367,6 +433,18 @@ CONFIG = {
 
             "online-mode": True,
 
+         # Online-mode logins.  The session server (change it to point at a local stub server for testing), how many session server requests may run at once (logins past this wait their turn), and timeouts in seconds.  Decrypting each login's shared secret runs on "auth-rsa-workers" threads (0 decrypts on the login's own thread).
+
+            "auth-session-server": "https://sessionserver.mojang.com",
+
+            "auth-concurrency": 8,
+
+            "auth-connect-timeout": 5,
+
+            "auth-read-timeout": 10,
+
+            "auth-rsa-workers": 2,
+
             "proxy-bind": "0.0.0.0",
 
             "proxy-enabled": False,
@@ -786,12 +786,16 @@ class Commands(object):
         whitelist = getjsonfile(
             "whitelist", self.wrapper.serverpath, self.wrapper.encoding
         )
-        online_uuid = self.wrapper.uuids.getuuidbyusername(arg).string
+        online_uuid = self.wrapper.uuids.getuuidbyusername(arg)
 
         if online_uuid in (None, False):
             player.message("&c INVALID NAME")
             return
+        online_uuid = online_uuid.string
         proper_spelled = self.wrapper.uuids.getusernamebyuuid(online_uuid)
+        if not proper_spelled:
+            player.message("&c Could not look up the name for %s" % arg)
+            return
         off_line = self.wrapper.uuids.getuuidfromname(proper_spelled).string
 
         add_record = True
@@ -856,6 +860,11 @@ class Commands(object):
                 continue
             correctnamed = self.wrapper.uuids.getusernamebyuuid(
                 onlineuuid.string)
+            if not correctnamed:
+                player.message(
+                    "Could not find Mojangs name for %s" % onlineuuid.string)
+                player.message("&cSkipped!")
+                continue
             whitelist[index]["name"] = correctnamed
             newuuid = self.wrapper.uuids.getuuidfromname(correctnamed).string
             whitelist[index]["uuid"] = newuuid
@@ -1103,6 +1112,9 @@ class Commands(object):
             username = getargs(payload["args"], 1)
             subcommand = getargs(payload["args"], 2)
             uuid = self.wrapper.uuids.getuuidbyusername(username)
+            if not uuid:
+                player.message("&c'%s' is not a valid player name!" % username)
+                return False
             if str(uuid) not in self.wrapper.wrapper_permissions.Data["users"]:
                 self.perms.fill_user(str(uuid))
             if subcommand in ("group", "groups"):
@@ -30,6 +30,12 @@ try:
 except ImportError:
     resource = False
 
+try:
+    import queue
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import Queue as queue
+
 OFF = 0  # this is the start mode.
 STARTING = 1
 STARTED = 2
@@ -37,6 +43,12 @@ STOPPING = 3
 FROZEN = 4
 LOBBY = 4
 
+# most console lines waiting to be parsed.  When full, the output readers
+# wait (and so does the server, once its pipe buffer fills).
+CONSOLE_QUEUE_LINES = 10000
+# queued after a server process's last console line.
+_SERVER_EXITED = object()
+
 
 # noinspection PyBroadException,PyUnusedLocal
 class MCServer(object):
@@ -54,6 +66,8 @@ class MCServer(object):
         self.operator_list = []
         self.spammy_stuff = ["found nothing", "vehicle of", "Wrong location!",
                              "Tried to add entity", ]
+        # when the server last said it "Can't keep up!"
+        self.lagged_at = 0
         # this is string name of the version, collected by console output
         self.version = ""
         self.version_compute = 0
@@ -96,7 +110,8 @@ class MCServer(object):
         self.server_autorestart = self.config["General"]["auto-restart"]
         self.proc = None
         self.lastsizepoll = 0
-        self.console_output_data = []
+        # console lines from the server's stdout and stderr
+        self.console_output_data = queue.Queue(CONSOLE_QUEUE_LINES)
 
         self.server_muted = False
         self.queued_lines = []
@@ -141,18 +156,6 @@ class MCServer(object):
         # is passed as an argument to the proxy).
         self.api.registerEvent("proxy.console", self._console_event)
 
-    def init(self):
-        """ Start up the listen threads for reading server console
-        output.
-        """
-        capturethread = threading.Thread(target=self.__stdout__, args=())
-        capturethread.daemon = True
-        capturethread.start()
-
-        capturethread = threading.Thread(target=self.__stderr__, args=())
-        capturethread.daemon = True
-        capturethread.start()
-
     def __del__(self):
         self.state = 0
 
@@ -215,11 +218,14 @@ class MCServer(object):
                 # exit server_handle
                 break
 
+            self._watch_process(self.proc)
+
             # The server loop
             while True:
                 # Loop runs continously as long as server console is running
-                time.sleep(0.1)
-                if self.proc.poll() is not None:
+                # (parsing each console line as it arrives)
+                line = self.console_output_data.get()
+                if line is _SERVER_EXITED:
                     self.changestate(OFF)
                     trystart = 0
                     self.boot_server = self.server_autorestart
@@ -227,13 +233,10 @@ class MCServer(object):
                     # to (possibly) connect to server again.
                     break
 
-                # is is only reading server console output
-                for line in self.console_output_data:
-                    try:
-                        self.readconsole(line.replace("\r", ""))
-                    except Exception as e:
-                        self.log.exception(e)
-                self.console_output_data = []
+                try:
+                    self.readconsole(line.replace("\r", ""))
+                except Exception as e:
+                    self.log.exception(e)
 
         # code ends here on wrapper.haltsig.halt and execution returns to
         # the end of wrapper.start()
@@ -421,6 +424,8 @@ class MCServer(object):
 
         if self.wrapper.proxy and self.wrapper.players[username].client:
             self.wrapper.players[username].client.server_eid = servereid
+            self.wrapper.proxy.clients.reindex(
+                self.wrapper.players[username].client)
             self.wrapper.players[username].client.position = position
 
         # activate backup status
@@ -630,36 +635,48 @@ class MCServer(object):
 
         self.stop_server_command()
 
-    def __stdout__(self):
-        """handles server output, not lines typed in console."""
-        while not self.wrapper.haltsig.halt:
-            # noinspection PyBroadException,PyUnusedLocal
-
-            # this reads the line and puts the line in the
-            # 'self.data' buffer for processing by
-            # readconsole() (inside handle_server)
-            try:
-                data = self.proc.stdout.readline()
-                for line in data.split("\n"):
-                    if len(line) < 1:
-                        continue
-                    self.console_output_data.append(line)
-            except Exception as e:
-                time.sleep(0.1)
-                continue
-
-    def __stderr__(self):
-        """like __stdout__, handles server output (not lines
-        typed in console)."""
-        while not self.wrapper.haltsig.halt:
+    def _watch_process(self, proc):
+        """ Start the threads that read a server process's console
+        output and wait for it to exit.
+        """
+        readers = []
+        for pipe in (proc.stdout, proc.stderr):
+            reader = threading.Thread(target=self._read_output, args=(pipe,))
+            reader.daemon = True
+            reader.start()
+            readers.append(reader)
+
+        waiter = threading.Thread(target=self._wait_for_exit,
+                                  args=(proc, readers))
+        waiter.daemon = True
+        waiter.start()
+
+    def _read_output(self, pipe):
+        """handles server output (stdout or stderr), not lines typed in
+        console.  Lines are queued for readconsole() (inside
+        handle_server) until the pipe closes."""
+        while True:
             try:
-                data = self.proc.stderr.readline()
-                if len(data) > 0:
-                    for line in data.split("\n"):
-                        self.console_output_data.append(line.replace("\r", ""))
-            except Exception as e:
-                time.sleep(0.1)
+                data = pipe.readline()
+            except UnicodeDecodeError as e:
+                self.log.debug("Unreadable server console output: %s", e)
                 continue
+            except (IOError, ValueError):
+                # pipe closed
+                break
+            if not data:
+                break
+            line = data.rstrip("\n")
+            if line:
+                self.console_output_data.put(line)
+
+    def _wait_for_exit(self, proc, readers):
+        proc.wait()
+        # let the readers queue the last lines (unless something else
+        # is holding the pipes open)
+        for reader in readers:
+            reader.join(2)
+        self.console_output_data.put(_SERVER_EXITED)
 
     def read_ops_file(self, read_super_ops=True):
         """Keep a list of ops in the server instance to stop
@@ -993,6 +1010,7 @@ class MCServer(object):
 
         # server lagged
         elif "Can't keep up!" in buff:
+            self.lagged_at = time.time()
             skipping_ticks = getargs(line_words, 17)
             self.wrapper.events.callevent("server.lagged", {
                 "ticks": get_int(skipping_ticks)
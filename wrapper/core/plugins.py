@@ -163,12 +163,19 @@ class Plugins(object):
 
         for names in py_files:
             self.loadplugin(names, py_files)
+        self._refresh_proxy()
+
+    def _refresh_proxy(self):
+        # the proxy only parses the packets that loaded plugins need.
+        if self.wrapper.proxy:
+            self.wrapper.proxy.refresh_parsers()
 
     def disableplugins(self):
         self.log.info("Disabling plugins...")
         for i in self.plugins:
             self.unloadplugin(i)
         self.plugins = {}
+        self._refresh_proxy()
         self.log.info("Disabling plugins...Done!")
 
     def reloadplugins(self):
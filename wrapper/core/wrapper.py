@@ -267,7 +267,6 @@ class Wrapper(object):
 
         # The MCServerclass is a console wherein the server is started
         self.javaserver = MCServer(self)
-        self.javaserver.init()
 
         # load plugins
         self.plugins.loadplugins()
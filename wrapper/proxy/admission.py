@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+Admission control for the proxy's accept loop.
+
+Every accepted socket is checked here before a Client (and its threads)
+is created for it.  A connection is refused when:
+
+- its IP or its /24 subnet has used up its token bucket (connections
+   per second, with a burst allowance), or
+- too many connections are still in the handshake/login stage.
+
+Refused sockets are simply closed.  This keeps reconnect storms (every
+player reconnecting at once after a backend crash) and simple bot floods
+from starving the logins that matter.  Addresses in "connect-exempt"
+(the local host, or a BungeeCord/wrapper in front of this proxy, whose
+players all share its address) skip the per IP and subnet buckets.
+"""
+
+import threading
+import time
+
+from proxy.utils.constants import *
+
+# seconds between removing idle (full) buckets.
+_PRUNE = 60.0
+
+
+class _Bucket(object):
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens, stamp):
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+class Admission(object):
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.log = proxy.log
+        config = proxy.config
+
+        # (rate per second, burst) - a rate of 0 turns a bucket off.
+        self.ip_limit = (float(config["connect-rate-ip"]),
+                         float(config["connect-burst-ip"]))
+        self.subnet_limit = (float(config["connect-rate-subnet"]),
+                             float(config["connect-burst-subnet"]))
+        self.max_handshakes = config["max-handshakes"]
+        self.handshake_timeout = config["handshake-timeout"]
+        # exact addresses and (network, mask) CIDR blocks
+        self.exempt = set()
+        self.exempt_networks = []
+        for entry in config["connect-exempt"]:
+            self._add_exempt(entry)
+
+        self._lock = threading.Lock()
+        self._ips = {}
+        self._subnets = {}
+        self._next_prune = time.time() + _PRUNE
+        # clients that have not finished logging in: {client: accept time}
+        self.handshaking = {}
+
+        self.counters = {
+            "accepted": 0,
+            "rejected-ip": 0,
+            "rejected-subnet": 0,
+            "rejected-handshakes": 0,
+            "handshake-timeouts": 0,
+        }
+
+    def admit(self, addr):
+        """
+        Check an accepted connection from `addr` (ip, port).
+
+        :returns: None if admitted, otherwise the counter name of the
+            reason it was refused.
+        """
+        ip = addr[0]
+        now = time.time()
+        with self._lock:
+            if now > self._next_prune:
+                self._prune(now)
+
+            if not self.is_exempt(ip):
+                if not self._take(self._ips, ip, self.ip_limit, now):
+                    return self._reject("rejected-ip")
+                subnet = ip.rsplit(".", 1)[0]
+                if not self._take(self._subnets, subnet, self.subnet_limit,
+                                  now):
+                    return self._reject("rejected-subnet")
+
+            if self.max_handshakes:
+                self._drop_finished()
+                if len(self.handshaking) >= self.max_handshakes:
+                    return self._reject("rejected-handshakes")
+
+            self.counters["accepted"] += 1
+        return None
+
+    def track(self, client):
+        """
+        Count `client` against max-handshakes until it logs in.  It is
+        disconnected if still handshaking after handshake-timeout.
+        """
+        if self.max_handshakes:
+            with self._lock:
+                self.handshaking[client] = time.time()
+            if self.handshake_timeout:
+                self.proxy.scheduler.call_later(
+                    self.handshake_timeout, self._handshake_deadline, client)
+
+    def is_exempt(self, ip):
+        """ True if `ip` is in connect-exempt. """
+        if ip in self.exempt:
+            return True
+        if self.exempt_networks:
+            try:
+                address = _ip_int(ip)
+            except ValueError:
+                return False
+            for network, mask in self.exempt_networks:
+                if address & mask == network:
+                    return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["handshaking"] = len(self.handshaking)
+        return stats
+
+    def _reject(self, reason):
+        self.counters[reason] += 1
+        return reason
+
+    @staticmethod
+    def _take(buckets, key, limit, now):
+        """ Take one token from the bucket for `key`. """
+        rate, burst = limit
+        if not rate:
+            return True
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket(burst, now)
+        else:
+            bucket.tokens = min(
+                burst, bucket.tokens + (now - bucket.stamp) * rate)
+            bucket.stamp = now
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    def _add_exempt(self, entry):
+        try:
+            if "/" in entry:
+                address, bits = entry.split("/")
+                mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
+                self.exempt_networks.append((_ip_int(address) & mask, mask))
+            else:
+                self.exempt.add(entry)
+        except ValueError:
+            self.log.warning("Ignoring bad connect-exempt entry '%s'", entry)
+
+    def _drop_finished(self):
+        """ Stop counting clients that logged in or closed. """
+        for client in list(self.handshaking):
+            if client.abort or client.state in (PLAY, LOBBY):
+                del self.handshaking[client]
+
+    def _handshake_deadline(self, client):
+        """ Scheduled by track(); disconnects a stuck handshake. """
+        with self._lock:
+            if self.handshaking.pop(client, None) is None:
+                return
+            if client.abort or client.state in (PLAY, LOBBY):
+                return
+            self.counters["handshake-timeouts"] += 1
+        self.log.debug("Closing %s - handshake took too long.",
+                       client.client_address)
+        client.abort = True
+        try:
+            # wakes up its handle() thread.
+            client.client_socket.shutdown(2)
+        except Exception:
+            pass
+
+    def _prune(self, now):
+        """ Forget buckets that have refilled (idle addresses). """
+        for buckets, limit in ((self._ips, self.ip_limit),
+                               (self._subnets, self.subnet_limit)):
+            rate, burst = limit
+            for key, bucket in list(buckets.items()):
+                if bucket.tokens + (now - bucket.stamp) * rate >= burst:
+                    del buckets[key]
+        self._next_prune = now + _PRUNE
+
+
+def _ip_int(address):
+    parts = [int(part) for part in address.split(".")]
+    if len(parts) != 4:
+        raise ValueError("not an IPv4 address: %s" % address)
+    return (parts[0] << 24) | (parts[1] << 16) | (parts[2] << 8) | parts[3]
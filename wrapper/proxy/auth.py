@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+The online-mode login pipeline shared by all clients.
+
+- One requests.Session keeps connections to the session server alive
+  (instead of a new TLS connection for every login).
+- At most "auth-concurrency" session server requests run at once; the
+  other logins queue for a slot.
+- Every request has a timeout.
+- The RSA decryption of the client's shared secret runs on a small
+  worker pool, so a login storm can not take every CPU.
+
+A login still waits for its own requests (on its login thread); the
+pipeline pools and bounds them so a login storm is served in parallel
+rather than one player after another.
+
+Latency is recorded for each stage (see AuthPipeline.stats()).  The
+session server URL is configurable ("auth-session-server"), so a local
+stub server can stand in for Mojang's when testing.
+"""
+
+import threading
+from timeit import default_timer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = False
+
+import proxy.utils.encryption as encryption
+
+HASJOINED = "/session/minecraft/hasJoined"
+
+
+class AuthPipeline(object):
+    def __init__(self, proxy):
+        self.log = proxy.log
+        config = proxy.config
+
+        self.base_url = config["auth-session-server"].rstrip("/")
+        # requests' (connect, read) timeout, in seconds
+        self.timeout = (config["auth-connect-timeout"],
+                        config["auth-read-timeout"])
+        concurrency = max(1, config["auth-concurrency"])
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+        self._workers = None
+        if ThreadPoolExecutor and config["auth-rsa-workers"] > 0:
+            self._workers = ThreadPoolExecutor(
+                max_workers=config["auth-rsa-workers"])
+
+        self._lock = threading.Lock()
+        # {stage: [count, total seconds, max seconds]}
+        self._stats = {}
+
+    def decrypt(self, private_key, *blobs):
+        """
+        RSA (PKCS1v15) decrypt each of `blobs` on the worker pool.
+
+        :returns: a list of the decrypted bytes.
+        """
+        start = default_timer()
+        if self._workers:
+            result = self._workers.submit(
+                _decrypt_all, private_key, blobs).result()
+        else:
+            result = _decrypt_all(private_key, blobs)
+        self.record("decrypt", default_timer() - start)
+        return result
+
+    def has_joined(self, username, server_id):
+        """
+        Ask the session server whether `username` joined `server_id`.
+
+        :returns: the requests Response.
+        :raises: requests.RequestException (including timeouts).
+        """
+        start = default_timer()
+        self._slots.acquire()
+        try:
+            self.record("queue", default_timer() - start)
+            start = default_timer()
+            return self.session.get(
+                self.base_url + HASJOINED,
+                params={"username": username, "serverId": server_id},
+                timeout=self.timeout)
+        finally:
+            self._slots.release()
+            self.record("session", default_timer() - start)
+
+    def record(self, stage, seconds):
+        """ Add one timing to a stage's latency stats. """
+        with self._lock:
+            entry = self._stats.get(stage)
+            if entry is None:
+                self._stats[stage] = [1, seconds, seconds]
+                return
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def stats(self):
+        """
+        :returns: {stage: {"count", "avg", "max"}} (seconds).  Stages are
+            decrypt, queue (waiting for a session server slot), session,
+            profile (name/uuid lookups) and login (the whole login).
+        """
+        with self._lock:
+            return dict((stage, {"count": count,
+                                 "avg": total / count,
+                                 "max": most})
+                        for stage, (count, total, most)
+                        in self._stats.items())
+
+
+def _decrypt_all(private_key, blobs):
+    return [encryption.decrypt_PKCS1v15_shared_data(blob, private_key)
+            for blob in blobs]
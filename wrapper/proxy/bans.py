@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+In-memory indexes of the server's ban files (banned-players.json and
+banned-ips.json).
+
+A file is read once and read again only when its mtime changes (the
+Minecraft server writes these files too).  Lookups are dictionary
+lookups; IP bans may also be prefixes ("10.0.") or CIDR blocks
+("10.0.0.0/8").  Expiry times are kept in a min-heap, so expired bans
+are pardoned together (one file write) instead of being found one
+lookup at a time.  Bans and pardons update the index and the file
+together.
+"""
+
+import heapq
+import os
+import threading
+import time
+
+from api.helpers import getjsonfile, putjsonfile, read_timestr
+
+# read_timestr() value for "forever" (and unreadable dates)
+_FOREVER = 9999999999
+
+
+class _BanIndex(object):
+    """ One ban file.  Subclasses define how records are indexed. """
+
+    def __init__(self, filename, directory, log):
+        self.filename = filename
+        self.directory = directory
+        self.path = "%s/%s.json" % (directory, filename)
+        self.log = log
+
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.exists = False
+        # the records, in file order
+        self.records = []
+        # min-heap of (expiry epoch, sequence, record)
+        self._expiry = []
+        self._seq = 0
+        self._clear()
+
+    # subclass parts
+    # -----------------------------
+
+    def _clear(self):
+        pass
+
+    def _add_key(self, record):
+        pass
+
+    # loading and saving
+    # -----------------------------
+
+    def refresh(self):
+        """ (Re-)read the file if it changed on disk. """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime == self._mtime and self._mtime is not None:
+                return
+            banlist = getjsonfile(self.filename, self.directory)
+            self.exists = banlist is not False
+            self._mtime = mtime
+            self._clear()
+            self.records = []
+            self._expiry = []
+            for record in banlist or ():
+                self._insert(record)
+
+    def _save(self):
+        """ :returns: putjsonfile()'s result. """
+        result = putjsonfile(self.records, self.filename, self.directory)
+        try:
+            self._mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._mtime = None
+        self.exists = self.exists or bool(result)
+        return result
+
+    def _insert(self, record):
+        self.records.append(record)
+        self._add_key(record)
+        expires = record.get("expires", "forever")
+        if expires == "forever":
+            return
+        expires = read_timestr(expires)
+        if expires < _FOREVER:
+            self._seq += 1
+            heapq.heappush(self._expiry, (expires, self._seq, record))
+
+    # changes
+    # -----------------------------
+
+    def add(self, record):
+        """ Add a ban record and write the file. """
+        with self._lock:
+            self.refresh()
+            self._insert(record)
+            return self._save()
+
+    def remove(self, record):
+        """ Remove a ban record and write the file. """
+        with self._lock:
+            self._discard((record,))
+            return self._save()
+
+    def _discard(self, records):
+        gone = set(id(record) for record in records)
+        self.records = [x for x in self.records if id(x) not in gone]
+        # (a duplicate entry may take over a key, so rebuild them all.
+        # Their heap entries are skipped when they come up.)
+        self._clear()
+        for record in self.records:
+            self._add_key(record)
+
+    def expire(self, now=None):
+        """
+        Pardon every ban that has expired, with one write of the file.
+
+        :returns: the expired records.
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            self.refresh()
+            if not self._expiry or self._expiry[0][0] >= now:
+                return []
+            live = set(id(record) for record in self.records)
+            expired = []
+            while self._expiry and self._expiry[0][0] < now:
+                record = heapq.heappop(self._expiry)[2]
+                if id(record) in live:
+                    expired.append(record)
+            if expired:
+                self._discard(expired)
+                if not self._save():
+                    self.log.warning("Could not write %s after pardoning "
+                                     "expired bans.", self.path)
+            return expired
+
+
+class PlayerBans(_BanIndex):
+    """ banned-players.json, indexed by uuid and by name. """
+
+    def __init__(self, directory, log):
+        super(PlayerBans, self).__init__("banned-players", directory, log)
+
+    def _clear(self):
+        self.by_uuid = {}
+        self.by_name = {}
+
+    def _add_key(self, record):
+        self.by_uuid.setdefault(record.get("uuid"), record)
+        self.by_name.setdefault(record.get("name"), record)
+
+    def find(self, uuid=None, name=None):
+        """ The ban record for a uuid (string) or name, or None. """
+        with self._lock:
+            self.refresh()
+            if uuid is not None:
+                return self.by_uuid.get(str(uuid))
+            return self.by_name.get(name)
+
+
+class IPBans(_BanIndex):
+    """
+    banned-ips.json.  Entries are single addresses, prefixes of an
+    address ("192.168.") or CIDR blocks ("192.168.0.0/16").
+    """
+
+    def __init__(self, directory, log):
+        super(IPBans, self).__init__("banned-ips", directory, log)
+
+    def _clear(self):
+        self.exact = {}
+        self.prefixes = {}
+        # {prefix length: {network as integer: record}}
+        self.networks = {}
+
+    def _key(self, entry):
+        """ :returns: (index dict, key) for a ban entry. """
+        if "/" in entry:
+            address, _, bits = entry.partition("/")
+            try:
+                bits = int(bits)
+                network = _ip_int(address) & _mask(bits)
+            except ValueError:
+                return self.prefixes, entry
+            return self.networks.setdefault(bits, {}), network
+        if entry.count(".") == 3 and not entry.endswith("."):
+            return self.exact, entry
+        return self.prefixes, entry
+
+    def _add_key(self, record):
+        index, key = self._key(record.get("ip", ""))
+        index.setdefault(key, record)
+
+    def find(self, ipaddress):
+        """ The ban record that covers `ipaddress`, or None. """
+        with self._lock:
+            self.refresh()
+            record = self.exact.get(ipaddress)
+            if record is not None:
+                return record
+            if self.prefixes:
+                for end in range(len(ipaddress), 0, -1):
+                    record = self.prefixes.get(ipaddress[:end])
+                    if record is not None:
+                        return record
+            if self.networks:
+                try:
+                    address = _ip_int(ipaddress)
+                except ValueError:
+                    return None
+                for bits, networks in self.networks.items():
+                    record = networks.get(address & _mask(bits))
+                    if record is not None:
+                        return record
+            return None
+
+
+def _ip_int(address):
+    parts = [int(part) for part in address.split(".")]
+    if len(parts) != 4:
+        raise ValueError("not an IPv4 address: %s" % address)
+    return (parts[0] << 24) | (parts[1] << 16) | (parts[2] << 8) | parts[3]
+
+
+def _mask(bits):
+    return (0xffffffff << (32 - bits)) & 0xffffffff
@@ -7,6 +7,8 @@
 from __future__ import absolute_import
 
 import base64
+import heapq
+import itertools
 import socket
 import threading
 import time
@@ -14,8 +16,7 @@ import json
 import requests
 
 # imports that are still dependent upon wrapper:
-from api.helpers import getjsonfile, putjsonfile, find_in_json
-from api.helpers import epoch_to_timestr, read_timestr
+from api.helpers import epoch_to_timestr
 from api.helpers import isipv4address
 from utils.py23 import py_str
 from proxy.utils.constants import *
@@ -42,11 +43,25 @@ except ImportError:
 
 try:
     from proxy.client.clientconnection import Client
-    from proxy.packets.packet import Packet
+    from proxy.packets.packet import Packet, configure_workers
+    from proxy.auth import AuthPipeline
 
 except ImportError:
     Client = False
     Packet = False
+    configure_workers = False
+    AuthPipeline = False
+
+from proxy.admission import Admission
+from proxy.bans import IPBans, PlayerBans
+from proxy.chunkcache import ChunkCache
+from proxy.client.registry import ClientRegistry
+
+# the event loop engine requires the `selectors` module (Python 3.4+)
+try:
+    from proxy.eventloop import EventLoop
+except ImportError:
+    EventLoop = False
 
 
 class Proxy(object):
@@ -58,7 +73,7 @@ class Proxy(object):
         self.ent_config = self.wrapper.config["Entities"]
         self.log = self.wrapper.log
 
-        self.clients = []
+        self.clients = ClientRegistry()
         self.maxplayers = 20
         self.command_prefix = self.config["command-prefix"]
 
@@ -90,10 +105,30 @@ class Proxy(object):
         self.proxy_worlds = self.config["worlds"]
         self.usehub = self.config["built-in-hub"]
         self.onlinemode = self.config["online-mode"]
+        self.engine = self.config["proxy-engine"]
+        self.compress_level = self.config["compression-level"]
+        self.compress_level_lan = self.config["compression-level-lan"]
+        # bytes; (high watermark, low watermark, hard limit)
+        self.send_queue_limits = (
+            self.config["send-queue-high-kb"] * 1024,
+            self.config["send-queue-low-kb"] * 1024,
+            self.config["send-queue-limit-kb"] * 1024
+        )
+        if configure_workers:
+            configure_workers(self.config["packet-workers"],
+                              self.config["packet-worker-cutoff"])
 
         # proxy internal workings
         self.proxy_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.usingSocket = False
+        # the EventLoop instance if using the "selectors" engine
+        self.eventloop = None
+        # keep-alive and login timers for all clients
+        self.scheduler = Scheduler(self)
+        self.listen_backlog = self.config["listen-backlog"]
+        self.admission = Admission(self)
+        # chunks for re-spawning players after world changes
+        self.chunk_cache = ChunkCache(self.config["chunk-cache-kb"] * 1024)
 
         self.skins = {}
         self.skinTextures = {}
@@ -108,6 +143,14 @@ class Proxy(object):
         self.forge = False
         self.forge_login_packet = None
 
+        # banned-players.json / banned-ips.json
+        self.player_bans = PlayerBans(self.javaserver.serverpath, self.log)
+        self.ip_bans = IPBans(self.javaserver.serverpath, self.log)
+
+        # encoded server list (status) responses; see
+        #  Client._parse_status_request()
+        self.status_cache = {}
+
         # Channels monitored by wrapper.  We don't register our channels
         # because they are only used between wrapper instances.  Minecraft
         # servers and clients will ignore them.
@@ -121,6 +164,10 @@ class Proxy(object):
         self.private_key = encryption.generate_private_key_set()
         self.public_key = encryption.get_public_key_bytes(self.private_key)
 
+        # session server logins (shared HTTP connections and RSA workers)
+        self.auth = AuthPipeline(self)
+        self.uuids.set_http(self.auth.session, self.auth.timeout)
+
     def host(self):
         """ the caller should ensure host() is not called before the 
         server is fully up and running."""
@@ -155,10 +202,19 @@ class Proxy(object):
                 self.usingSocket = False
                 time.sleep(10)
             self.usingSocket = True
-            self.proxy_socket.listen(5)
+            self.proxy_socket.listen(self.listen_backlog)
 
         # proxy now up and running, bound to server port.
         self.entity_control = EntityControl(self)
+        self.scheduler.start()
+
+        if self.engine == "selectors":
+            if EventLoop:
+                self.eventloop = EventLoop(self)
+                self.eventloop.start()
+            else:
+                self.log.warning("proxy-engine 'selectors' requires Python"
+                                 " 3.4 or later.  Using 'threads' instead.")
 
         # accept clients and start their threads
         while not (self.abort or self.wrapper.haltsig.halt):
@@ -169,6 +225,14 @@ class Proxy(object):
                                    "accept a socket connection \n(%s)", e)
                 continue
 
+            # refuse floods before anything is spent on them.
+            refused = self.admission.admit(addr)
+            if refused:
+                sock.close()
+                self.log.debug("Refused connection from %s (%s)",
+                               addr[0], refused)
+                continue
+
             banned_ip = self.isipbanned(addr)
             if self.silent_ip_banning and banned_ip:
                 # 0: done receiving, 1: done sending, 2: both
@@ -181,17 +245,100 @@ class Proxy(object):
             # spur off client thread
             # self.server_temp = ServerConnection(self, ip, port)
             client = Client(self, sock, addr, banned=banned_ip)
+            self.admission.track(client)
+            if self.eventloop:
+                self.eventloop.add(client)
+                continue
             t = threading.Thread(target=client.handle, args=())
             t.daemon = True
             t.start()
 
+    def compression_stats(self):
+        """
+        Sums Packet.compression_stats() for all connections, split into
+        "client" (player) and "server" connections.
+        """
+        totals = {"client": {}, "server": {}}
+        for client in self.clients:
+            packets = (("client", client.packet), ("server", getattr(
+                client.server_connection, "packet", None)))
+            for side, packet in packets:
+                if not packet:
+                    continue
+                for key, value in packet.compression_stats().items():
+                    if key.endswith("ratio") or key == "level":
+                        continue
+                    totals[side][key] = totals[side].get(key, 0) + value
+        for side in totals.values():
+            side["compress_ratio"] = (
+                side["compress_out"] / float(side["compress_in"])
+                if side.get("compress_in") else 0.0)
+            side["decompress_ratio"] = (
+                side["decompress_in"] / float(side["decompress_out"])
+                if side.get("decompress_out") else 0.0)
+        return totals
+
+    def auth_stats(self):
+        """
+        Login latency for each stage of the auth pipeline; see
+        proxy.auth.AuthPipeline.stats().
+        """
+        return self.auth.stats()
+
+    def admission_stats(self):
+        """
+        Accept-time admission counters (accepted, rejected-ip,
+        rejected-subnet, rejected-handshakes, handshake-timeouts) and
+        the number of connections still handshaking.
+        """
+        return self.admission.stats()
+
+    def chunk_cache_stats(self):
+        """
+        Chunk cache counters (stored, shared, patched, evicted) and its
+        size (chunks, held, buffers, bytes).
+        """
+        return self.chunk_cache.stats()
+
+    def wants_event(self, *events):
+        """
+        True if a plugin (or an API event listener) has registered any of
+        `events`.  Parsers that only exist to fire an event are installed
+        when this is True.
+        """
+        handlers = self.eventhandler
+        if handlers.listeners:
+            # blockForEvent() listeners receive every event.
+            return True
+        for registered in list(handlers.events.values()):
+            for event in events:
+                if event in registered:
+                    return True
+        return False
+
+    def wants_state(self):
+        """
+        True if player state (position, inventory, health, etc) must be
+        tracked.  The plugin Player API reads it and the built-in hub needs
+        it to switch servers.
+        """
+        return bool(self.usehub or self.wrapper.plugins.plugins)
+
+    def refresh_parsers(self):
+        """
+        Rebuild the parser tables of every connection.  Called after
+        plugins are loaded/unloaded or register events.
+        """
+        for client in self.clients:
+            client.refresh_parsers()
+
     def removestaleclients(self):
         """removes aborted client and player objects"""
-        for i, client in enumerate(self.clients):
-            if self.clients[i].abort:
-                if self.clients[i].username in self.wrapper.players:
-                    del self.wrapper.players[self.clients[i].username]
-                self.clients.pop(i)
+        for client in self.clients:
+            if client.abort and self.clients.remove(client):
+                self.wrapper.players.pop(client.username, None)
+                if self.entity_control:
+                    self.entity_control.remove_owner(client.username)
 
     def pollserver(self, host="localhost", port=None):
         """
@@ -274,6 +421,7 @@ class Proxy(object):
         self.usercache[realuuid]["localname"] = newname
         client.info["username"] = newname
         client.username = newname
+        self.clients.reindex(client)
         self.usercache_obj.save()
         return new_local_uuid
 
@@ -282,16 +430,12 @@ class Proxy(object):
         :param uuid: - MCUUID
         :return: the matching client
         """
-        attempts = ["Search: %s" % str(uuid)]
-        for client in self.clients:
-            attempts.append("try: client-%s uuid-%s serveruuid-%s name-%s" %
-                            (client, client.wrapper_uuid.string,
-                             client.local_uuid.string, client.username))
-            if client.local_uuid.string == str(uuid):
-                self.uuidTranslate[uuid] = client.wrapper_uuid.string
-                return client
-
-        self.log.debug("getclientbyofflineserveruuid failed: \n %s", attempts)
+        client = self.clients.by_server_uuid(str(uuid))
+        if client:
+            self.uuidTranslate[uuid] = client.wrapper_uuid.string
+            return client
+
+        self.log.debug("getclientbyofflineserveruuid failed: %s", uuid)
         self.log.debug("POSSIBLE CLIENTS: \n %s", self.clients)
         return False  # no client
 
@@ -315,11 +459,8 @@ class Proxy(object):
         :param uuid: uuid of player as string
         :return: string representing ban reason
         """
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist:
-            banrecord = find_in_json(banlist, "uuid", uuid)
+        banrecord = self.player_bans.find(uuid)
+        if banrecord:
             return "%s by %s" % (banrecord["reason"], banrecord["source"])
         return "Banned by server"
 
@@ -337,41 +478,15 @@ class Proxy(object):
 
         This probably only works on 1.7.10 servers or later
         """
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                banlist = dict()  # ensure valid dict before operating on it
-            if find_in_json(banlist, "uuid", str(uuid)):
-                return "player already banned"  # error text
-            else:
-                if expires:
-                    try:
-                        expiration = epoch_to_timestr(expires)
-                    except Exception as e:
-                        print('Exception: %s' % e)
-                        return "expiration date invalid"  # error text
-                else:
-                    expiration = "forever"
-                name = self.uuids.getusernamebyuuid(uuid.string)
-                banlist.append({"uuid": uuid.string,
-                                "name": name,
-                                "created": epoch_to_timestr(time.time()),
-                                "source": source,
-                                "expires": expiration,
-                                "reason": reason})
-                if putjsonfile(banlist,
-                               "banned-players",
-                               self.javaserver.serverpath):
-                    # this actually is not needed. Commands now handle the kick.
-                    console_command = "kick %s %s" % (name, reason)
-                    self.run_command(console_command)
+        name = self.uuids.getusernamebyuuid(uuid.string)
+        result = self._ban_player(uuid, name, reason, source, expires)
+        if result is True:
+            # this actually is not needed. Commands now handle the kick.
+            console_command = "kick %s %s" % (name, reason)
+            self.run_command(console_command)
 
-                    return "Banned %s: %s" % (name, reason)
-                return "Could not write banlist to disk"
-        else:
-            return "Banlist not found on disk"
+            return "Banned %s: %s" % (name, reason)
+        return result
 
     def banuuidraw(self, uuid, username, reason="The Ban Hammer has spoken!",
                    source="Wrapper", expires=False):
@@ -388,41 +503,50 @@ class Proxy(object):
 
         This probably only works on 1.7.10 servers or later
         """
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                banlist = dict()  # ensure valid dict before operating on it
-            if find_in_json(banlist, "uuid", str(uuid)):
-                return "player already banned"  # error text
-            else:
-                if expires:
-                    try:
-                        expiration = epoch_to_timestr(expires)
-                    except Exception as e:
-                        print('Exception: %s' % e)
-                        return "expiration date invalid"  # error text
-                else:
-                    expiration = "forever"
-                banlist.append({"uuid": uuid.string,
-                                "name": username,
-                                "created": epoch_to_timestr(time.time()),
-                                "source": source,
-                                "expires": expiration,
-                                "reason": reason})
-                if putjsonfile(banlist,
-                               "banned-players",
-                               self.javaserver.serverpath):
-                    self.log.info("kicking %s... %s", username, reason)
-
-                    console_command = "kick %s Banned: %s" % (username, reason)
-                    self.run_command(console_command)
+        result = self._ban_player(uuid, username, reason, source, expires)
+        if result is True:
+            self.log.info("kicking %s... %s", username, reason)
 
-                    return "Banned %s: %s - %s" % (username, uuid, reason)
-                return "Could not write banlist to disk"
-        else:
+            console_command = "kick %s Banned: %s" % (username, reason)
+            self.run_command(console_command)
+
+            return "Banned %s: %s - %s" % (username, uuid, reason)
+        return result
+
+    def _ban_player(self, uuid, name, reason, source, expires):
+        """
+        Adds the banned-players record.
+
+        :returns: True, or the error text.
+        """
+        bans = self.player_bans
+        bans.refresh()
+        if not bans.exists:  # file and directory exist.
             return "Banlist not found on disk"
+        if bans.find(str(uuid)):
+            return "player already banned"  # error text
+        expiration = self._ban_expiration(expires)
+        if expiration is None:
+            return "expiration date invalid"  # error text
+        if bans.add({"uuid": uuid.string,
+                     "name": name,
+                     "created": epoch_to_timestr(time.time()),
+                     "source": source,
+                     "expires": expiration,
+                     "reason": reason}):
+            return True
+        return "Could not write banlist to disk"
+
+    @staticmethod
+    def _ban_expiration(expires):
+        """ The ban file's "expires" text (None if `expires` is invalid). """
+        if not expires:
+            return "forever"
+        try:
+            return epoch_to_timestr(expires)
+        except Exception as e:
+            print('Exception: %s' % e)
+            return None
 
     def banip(self, ipaddress, reason="The Ban Hammer has spoken!",
               source="Wrapper", expires=False):
@@ -440,151 +564,93 @@ class Proxy(object):
         """
         if not isipv4address(ipaddress):
             return "Invalid IPV4 address: %s" % ipaddress
-        banlist = getjsonfile("banned-ips", self.javaserver.serverpath)
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                banlist = dict()  # ensure valid dict before operating on it
-            if find_in_json(banlist, "ip", ipaddress):
-                return "address already banned"  # error text
-            else:
-                if expires:
-                    try:
-                        expiration = epoch_to_timestr(expires)
-                    except Exception as e:
-                        print('Exception: %s' % e)
-                        return "expiration date invalid"  # error text
-                else:
-                    expiration = "forever"
-                banlist.append({"ip": ipaddress,
-                                "created": epoch_to_timestr(time.time()),
-                                "source": source,
-                                "expires": expiration,
-                                "reason": reason})
-                if putjsonfile(banlist, "banned-ips",
-                               self.javaserver.serverpath):
-                    banned = ""
-                    for client in self.clients:
-                        if client.ip == str(ipaddress):
-
-                            console_command = "kick %s Your IP is Banned!" % client.username  # noqa
-                            self.run_command(console_command)
-
-                            banned += "\n%s" % client.username
-                    return "Banned ip address: %s\nPlayers kicked as " \
-                           "a result:%s" % (ipaddress, banned)
-                return "Could not write banlist to disk"
-        else:
+        bans = self.ip_bans
+        bans.refresh()
+        if not bans.exists:  # file and directory exist.
             return "Banlist not found on disk"
+        if bans.exact.get(ipaddress):
+            return "address already banned"  # error text
+        expiration = self._ban_expiration(expires)
+        if expiration is None:
+            return "expiration date invalid"  # error text
+        if bans.add({"ip": ipaddress,
+                     "created": epoch_to_timestr(time.time()),
+                     "source": source,
+                     "expires": expiration,
+                     "reason": reason}):
+            banned = ""
+            for client in self.clients:
+                if client.ip == str(ipaddress):
+
+                    console_command = "kick %s Your IP is Banned!" % client.username  # noqa
+                    self.run_command(console_command)
+
+                    banned += "\n%s" % client.username
+            return "Banned ip address: %s\nPlayers kicked as " \
+                   "a result:%s" % (ipaddress, banned)
+        return "Could not write banlist to disk"
 
     def pardonip(self, ipaddress):
         if not isipv4address(ipaddress):
             return "Invalid IPV4 address: %s" % ipaddress
-        banlist = getjsonfile("banned-ips", self.javaserver.serverpath)
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                return "No IP bans have ever been recorded."
-            banrecord = find_in_json(banlist, "ip", ipaddress)
-            if banrecord:
-                for x in banlist:
-                    if x == banrecord:
-                        banlist.remove(x)
-                if putjsonfile(banlist, "banned-ips",
-                               self.javaserver.serverpath):
-                    return "pardoned %s" % ipaddress
-                return "Could not write banlist to disk"
-            else:
-                return "That address was never banned"  # error text
-
-        else:
+        bans = self.ip_bans
+        bans.refresh()
+        if not bans.exists:  # file and directory exist.
             return "Banlist not found on disk"  # error text
+        if not bans.records:
+            return "No IP bans have ever been recorded."
+        banrecord = bans.exact.get(ipaddress)
+        if banrecord:
+            if bans.remove(banrecord):
+                return "pardoned %s" % ipaddress
+            return "Could not write banlist to disk"
+        return "That address was never banned"  # error text
 
     def pardonuuid(self, uuid):
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                return "No bans have ever been recorded..?"
-            banrecord = find_in_json(banlist, "uuid", str(uuid))
-            if banrecord:
-                for x in banlist:
-                    if x == banrecord:
-                        banlist.remove(x)
-                if putjsonfile(banlist,
-                               "banned-players",
-                               self.javaserver.serverpath):
-                    name = self.uuids.getusernamebyuuid(str(uuid))
-                    return "pardoned %s" % name
-                return "Could not write banlist to disk"
-            else:
-                return "That person was never banned"  # error text
-        else:
-            return "Banlist not found on disk"  # error text
+        result = self._pardon_player(self.player_bans.find(str(uuid)))
+        if result is True:
+            name = self.uuids.getusernamebyuuid(str(uuid))
+            return "pardoned %s" % name
+        return result
 
     def pardonname(self, username):
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist is not False:  # file and directory exist.
-            if banlist is None:  # file was empty or not valid
-                return "No bans have ever been recorded..?"
-            banrecord = find_in_json(banlist, "name", str(username))
-            if banrecord:
-                for x in banlist:
-                    if x == banrecord:
-                        banlist.remove(x)
-                if putjsonfile(banlist,
-                               "banned-players",
-                               self.javaserver.serverpath):
-                    return "pardoned %s" % username
-                return "Could not write banlist to disk"
-            else:
-                return "That person was never banned"  # error text
-        else:
+        result = self._pardon_player(
+            self.player_bans.find(name=str(username)))
+        if result is True:
+            return "pardoned %s" % username
+        return result
+
+    def _pardon_player(self, banrecord):
+        """ :returns: True, or the error text. """
+        bans = self.player_bans
+        if not bans.exists:  # file and directory exist.
             return "Banlist not found on disk"  # error text
+        if not bans.records and not banrecord:
+            return "No bans have ever been recorded..?"
+        if banrecord:
+            if bans.remove(banrecord):
+                return True
+            return "Could not write banlist to disk"
+        return "That person was never banned"  # error text
+
+    def expirebans(self):
+        """ Pardon all expired player and IP bans. """
+        for bans, key, kind in ((self.player_bans, "uuid", "UUID"),
+                                (self.ip_bans, "ip", "IP")):
+            for record in bans.expire():
+                self.log.info("%s: %s was pardoned (expired ban)",
+                              kind, record.get(key))
 
     def isuuidbanned(self, uuid):  # Check if the UUID of the user is banned
-        banlist = getjsonfile(
-            "banned-players", self.javaserver.serverpath
-        )
-        if banlist:  # make sure banlist exists
-            banrecord = find_in_json(banlist, "uuid", str(uuid))
-            if banrecord:
-                # if ban has expired
-                if read_timestr(banrecord["expires"]) < int(time.time()):
-                    pardoning = self.pardonuuid(str(uuid))
-                    if pardoning[:8] == "pardoned":
-                        self.log.info("UUID: %s was pardoned "
-                                      "(expired ban)", str(uuid))
-                        return False  # player is "NOT" banned (anymore)
-                    else:
-                        self.log.warning("isuuidbanned attempted a pardon of"
-                                         " uuid: %s (expired ban), "
-                                         "but it failed:\n %s",
-                                         uuid, pardoning)
-                return True  # player is still banned
-        return False  # banlist empty or record not found
+        self.expirebans()
+        return self.player_bans.find(str(uuid)) is not None
 
     def isipbanned(self, ipaddress):  # Check if the IP address is banned
-        banlist = getjsonfile("banned-ips", self.javaserver.serverpath)
-        if banlist:  # make sure banlist exists
-            for record in banlist:
-                _ip = record["ip"]
-                if _ip in ipaddress:
-                    _expires = read_timestr(record["expires"])
-                    if _expires < int(time.time()):  # if ban has expired
-                        pardoning = self.pardonip(ipaddress)
-                        if pardoning[:8] == "pardoned":
-                            self.log.info("IP: %s was pardoned "
-                                          "(expired ban)", ipaddress)
-                            return False  # IP is "NOT" banned (anymore)
-                        else:
-                            self.log.warning("isipbanned attempted a pardon "
-                                             "of IP: %s (expired ban),  but"
-                                             " it failed:\n %s",
-                                             ipaddress, pardoning)
-                    return True  # IP is still banned
-        return False  # banlist empty or record not found
+        if type(ipaddress) is tuple:
+            # (address, port) from socket.accept()
+            ipaddress = ipaddress[0]
+        self.expirebans()
+        return self.ip_bans.find(ipaddress) is not None
 
     def getskintexture(self, uuid):
         import pprint
@@ -626,3 +692,70 @@ class Proxy(object):
             self.log.warning("Could not fetch skin texture! "
                              "(status code %d)", r.status_code)
             return False
+
+
+class Scheduler(object):
+    """
+    The proxy's timers (keep-alives, keep-alive timeouts and login
+    deadlines for every client) on one thread, kept in a heap ordered by
+    due time, instead of a sleeping thread per client.
+
+    Callbacks run on the scheduler thread, so they must not block (start
+    a thread for anything slow, like Client.disconnect()).
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.log = proxy.log
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def start(self):
+        t = threading.Thread(target=self._run, name="proxy-scheduler",
+                             args=())
+        t.daemon = True
+        t.start()
+
+    def call_at(self, when, callback, *args):
+        """
+        Run `callback(*args)` at `when` (a time.time() value).
+
+        :returns: a handle for cancel().
+        """
+        timer = [when, next(self._seq), callback, args]
+        with self._cond:
+            heapq.heappush(self._heap, timer)
+            if self._heap[0] is timer:
+                self._cond.notify()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.time() + delay, callback, *args)
+
+    @staticmethod
+    def cancel(timer):
+        """ Cancel a timer from call_at() (a timer that ran is ignored). """
+        if timer:
+            # left in the heap and skipped when it comes up.
+            timer[2] = None
+
+    def _run(self):
+        proxy = self.proxy
+        while not (proxy.abort or proxy.wrapper.haltsig.halt):
+            with self._cond:
+                now = time.time()
+                if not self._heap:
+                    self._cond.wait(1)
+                    continue
+                if self._heap[0][0] > now:
+                    self._cond.wait(min(self._heap[0][0] - now, 1))
+                    continue
+                when, _, callback, args = heapq.heappop(self._heap)
+            if callback is None:
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                self.log.exception("Proxy scheduler callback %s failed: %s",
+                                   callback, e)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+The proxy's shared store of raw CHUNK_DATA payloads, used to re-send a
+player's chunks after a respawn or a hub world change.
+
+Chunks are keyed by ((server ip, port), dimension, chunk x, chunk z).
+Each player holds the CachedChunk objects of their first chunks, so the
+same chunk is stored once however many players are near it.  Payloads
+are also shared by content hash (identical worlds on different
+servers).  Block changes are recorded on the chunk and re-sent after
+it, so a held chunk always matches what the server sent.
+
+Besides the chunks players hold, the least recently stored chunks are
+kept up to the "chunk-cache-kb" budget (0 keeps only the held ones).
+"""
+
+import hashlib
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class CachedChunk(object):
+    """ A chunk's CHUNK_DATA payload and the changes sent since. """
+    __slots__ = ("key", "payload", "digest", "changes", "__weakref__")
+
+    def __init__(self, key):
+        self.key = key
+        self.payload = None
+        self.digest = None
+        # {identity: (packet id, payload)}, in the order last changed
+        self.changes = OrderedDict()
+
+
+class ChunkCache(object):
+    def __init__(self, budget):
+        """ :param budget: most bytes of chunk data to keep unheld. """
+        self.budget = budget
+        self.size = 0
+
+        self._lock = threading.Lock()
+        # {key: CachedChunk} of every chunk still referenced
+        self._held = weakref.WeakValueDictionary()
+        # {key: CachedChunk}, least recently stored first
+        self._entries = OrderedDict()
+        # {digest: [payload, number of _entries using it]}
+        self._blobs = {}
+        self._serial = itertools.count()
+
+        self.counters = {
+            "stored": 0,
+            "shared": 0,
+            "patched": 0,
+            "evicted": 0,
+        }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._held
+
+    def put(self, key, payload):
+        """
+        Store (or replace) the chunk payload for `key`.
+
+        :returns: the CachedChunk; hold it to keep the chunk.
+        """
+        digest = hashlib.sha1(payload).digest()
+        with self._lock:
+            chunk = self._held.get(key)
+            if chunk is None:
+                chunk = CachedChunk(key)
+                self._held[key] = chunk
+            elif key in self._entries:
+                self._unaccount(self._entries.pop(key))
+            blob = self._blobs.get(digest)
+            if blob:
+                payload = blob[0]
+                self.counters["shared"] += 1
+            else:
+                self.counters["stored"] += 1
+            chunk.payload = payload
+            chunk.digest = digest
+            chunk.changes = OrderedDict()
+            if self.budget:
+                self._entries[key] = chunk
+                self._account(chunk)
+                self._evict()
+        return chunk
+
+    def patch(self, key, pkid, payload, position=None):
+        """
+        Record a change (a packet to re-send after the chunk) to `key`.
+
+        :param position: the block changed, if only one; a later change
+         to the same block replaces this one.
+        """
+        with self._lock:
+            chunk = self._held.get(key)
+            if chunk is None:
+                return
+            if position is None:
+                position = next(self._serial)
+            old = chunk.changes.pop(position, None)
+            chunk.changes[position] = (pkid, payload)
+            self.counters["patched"] += 1
+            if key in self._entries:
+                self.size += len(payload)
+                if old:
+                    self.size -= len(old[1])
+                self._evict()
+
+    def contents(self, chunk):
+        """
+        :returns: (chunk payload, [(packet id, payload), ...] changes)
+        """
+        with self._lock:
+            return chunk.payload, list(chunk.changes.values())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["chunks"] = len(self._entries)
+            stats["held"] = len(self._held)
+            stats["buffers"] = len(self._blobs)
+            stats["bytes"] = self.size
+        return stats
+
+    def _evict(self):
+        while self.size > self.budget and self._entries:
+            self._unaccount(self._entries.popitem(last=False)[1])
+            self.counters["evicted"] += 1
+
+    def _account(self, chunk):
+        blob = self._blobs.get(chunk.digest)
+        if blob:
+            blob[1] += 1
+        else:
+            self._blobs[chunk.digest] = [chunk.payload, 1]
+            self.size += len(chunk.payload)
+        for pkid, payload in chunk.changes.values():
+            self.size += len(payload)
+
+    def _unaccount(self, chunk):
+        blob = self._blobs[chunk.digest]
+        blob[1] -= 1
+        if blob[1] < 1:
+            del self._blobs[chunk.digest]
+            self.size -= len(blob[0])
+        for pkid, payload in chunk.changes.values():
+            self.size -= len(payload)
@@ -9,19 +9,19 @@
 from __future__ import division
 
 # Standard Library imports
-import copy
 import threading
 import time
 import json
 import hashlib
 from socket import error as socket_error
+from timeit import default_timer
 import requests
 
 # Local imports
 import proxy.utils.encryption as encryption
 
 from proxy.server.serverconnection import ServerConnection
-from proxy.packets.packet import Packet
+from proxy.packets.packet import Packet, LANE_CONTROL, LANE_BULK
 from proxy.client.parse_sb import ParseSB
 from proxy.packets import mcpackets_sb
 from proxy.packets import mcpackets_cb
@@ -29,6 +29,12 @@ from proxy.utils.constants import *
 
 from api.helpers import processcolorcodes, getjsonfile, putjsonfile
 
+# Fallback limits (seconds) for the steps of a server switch.  Each step
+# normally ends as soon as the packet/event it waits for arrives.
+SWITCH_CLOSE_TIMEOUT = 1.0
+SWITCH_LOGIN_TIMEOUT = 10.0
+SWITCH_CHUNKS_TIMEOUT = 1.0
+
 
 # noinspection PyMethodMayBeStatic
 class Client(object):
@@ -70,6 +76,8 @@ class Client(object):
         self.abort = False
         self.username = "PING REQUEST"
         self.packet = Packet(self.client_socket, self)
+        self.packet.compress_level = self.proxy.compress_level
+        self.packet.set_queue_limits(*self.proxy.send_queue_limits)
         self.verifyToken = encryption.generate_challenge_token()
         self.serverID = encryption.generate_server_id().encode('utf-8')
         self.MOTD = {}
@@ -80,17 +88,24 @@ class Client(object):
         self.serverport = self.javaserver.server_port
 
         # packet stuff
-        self.pktSB = mcpackets_sb.Packets(self.clientversion)
-        self.pktCB = mcpackets_cb.Packets(self.clientversion)
+        self.pktSB = mcpackets_sb.get_packets(self.clientversion)
+        self.pktCB = mcpackets_cb.get_packets(self.clientversion)
         self.parse_sb = ParseSB(self, self.packet)
         # dictionary of parser packet constants and associated parsing methods
         self.parsers = {}
+        # PLAY packets whose parsers call registered plugin events
+        self.event_parsers = set()
         self._getclientpacketset()
 
         # keep alive data
         self.time_last_ping_to_client = 0
         self.time_client_responded = 0
         self.keepalive_val = 0
+        # timers on the proxy's scheduler
+        self._keepalive_timer = None
+        self._keepalive_ended = False
+        self._keepalive_lock = threading.Lock()
+        self._login_timer = None
 
         # client and server status
         # ------------------------
@@ -98,7 +113,7 @@ class Client(object):
         self.health = False
         self.food = 0
         self.food_sat = 0.0
-        # raw chunk data for re-spawning player
+        # proxy.chunk_cache CachedChunks for re-spawning player
         self.first_chunks = []
         # track rain states to ensure client and server are in same rain state
         self.raining = False
@@ -112,11 +127,17 @@ class Client(object):
         # Hub controls
         # tells wrapper when the player login is authenticated
         self.wait_wait_for_auth = False
+        # set when wait_wait_for_auth goes False
+        self.auth_done = threading.Event()
+        self.login_started = 0
         # whether or not the player is on this wrapper world
         self.local = True
         # Handle disconnections based on what world player is in
         self.disc_request = False
         self.disc_reason = "No connection"
+        # [(stage, seconds)] of the last change_servers()
+        self.switch_trace = []
+        self._switch_started = 0
         # client info shared between wrappers:
         self.info = {
             "client-is-wrapper": False,
@@ -218,9 +239,14 @@ class Client(object):
                     {"text": "Lost server connection: %s" % message,
                      "color": "red"}
                 )
-                time.sleep(.4)
                 self.disc_request = False
-                self.change_servers("localhost", self.serverport)
+                # (not on this thread; it may be the one that reads
+                # the hub server's packets)
+                t = threading.Thread(target=self.change_servers,
+                                     name="hub",
+                                     args=("localhost", self.serverport))
+                t.daemon = True
+                t.start()
             else:
                 self.disc_request = True
 
@@ -250,20 +276,35 @@ class Client(object):
                 self.abort = True
                 break
 
-            # Each condition is executed and evaluated in sequence:
-            if self._parse(pkid) and \
-                    self.server_connection and \
-                    self.server_connection.packet and \
-                    self.server_connection.state == PLAY:
-
-                # wrapper handles LOGIN/HANDSHAKE with servers (via
-                # self._parse(pkid), which DOES happen in all modes
-                # as part of the `if` statement evaluation).
-
-                # sending on to the server only happens in PLAY.
-                self.server_connection.packet.send_raw_untouched(orig_packet)
+            self.handle_packet(pkid, orig_packet)
 
         # upon self.abort
+        self.handle_ended()
+
+    def handle_packet(self, pkid, orig_packet):
+        """
+        Parse one packet and pass it on to the server.  Used by both
+        handle() and the event loop engine.
+        """
+        # Each condition is executed and evaluated in sequence:
+        if self._parse(pkid) and \
+                self.server_connection and \
+                self.server_connection.packet and \
+                self.server_connection.state == PLAY:
+
+            # wrapper handles LOGIN/HANDSHAKE with servers (via
+            # self._parse(pkid), which DOES happen in all modes
+            # as part of the `if` statement evaluation).
+
+            # sending on to the server only happens in PLAY.
+            self.server_connection.packet.send_raw_untouched(
+                orig_packet, pkid)
+
+    def handle_ended(self):
+        """ Close the server connection and the client socket. """
+        if self._keepalive_timer:
+            # let the keep alive tracker finish up now.
+            self._schedule_keep_alive(time.time())
         self._close_server_instance("Client Handle Ended")
         try:
             self.client_socket.shutdown(2)
@@ -276,18 +317,16 @@ class Client(object):
 
     def _flush_loop(self):
         """
-        packets accumulate in the packet.queue.  They are periodically 
-        sent to the client in intervals.  The '.05' interval, which is also
-        a minecraft tick, seems ideal.  Any shorter and packets seem to 
-        get lost (Dropped items are invisible, etc).  Any longer makes the 
-        game kind of jerky. '.1' would be tolerable unless in a combat
-        situation.
+        packets accumulate in the packet.queue.  The loop sleeps until
+        something is queued and then sends everything waiting in one
+        batch.  The flush rate is only the longest the loop will sleep
+        before checking whether the client has aborted.
         """
         rate = self.flush_rate
         while not self.abort:
-            time.sleep(rate)
             try:
-                self.packet.flush()
+                if self.packet.wait_for_queue(rate):
+                    self.packet.flush()
             except AttributeError:
                 self.log.debug(
                     "%s client packet instance gone.", self.username
@@ -316,7 +355,7 @@ class Client(object):
         """
         The packets we parse and the methods that parse them.
         """
-        self.parsers = {
+        parsers = {
             HANDSHAKE: {
                 self.pktSB.LEGACY_HANDSHAKE[PKT]:
                     self._parse_handshaking_legacy,
@@ -344,30 +383,12 @@ class Client(object):
             PLAY: {
                 self.pktSB.CHAT_MESSAGE[PKT]:
                     self.parse_sb.play_chat_message,
-                self.pktSB.CLICK_WINDOW[PKT]:
-                    self.parse_sb.play_click_window,
                 self.pktSB.CLIENT_SETTINGS[PKT]:
                     self.parse_sb.play_client_settings,
-                self.pktSB.HELD_ITEM_CHANGE[PKT]:
-                    self.parse_sb.play_held_item_change,
                 self.pktSB.KEEP_ALIVE[PKT]:
                     self.parse_sb.keep_alive,
-                self.pktSB.PLAYER_BLOCK_PLACEMENT[PKT]:
-                    self.parse_sb.play_player_block_placement,
-                self.pktSB.PLAYER_DIGGING[PKT]:
-                    self.parse_sb.play_player_digging,
-                self.pktSB.PLAYER_LOOK[PKT]:
-                    self.parse_sb.play_player_look,
-                self.pktSB.PLAYER_POSITION[PKT]:
-                    self.parse_sb.play_player_position,
-                self.pktSB.PLAYER_POSLOOK[PKT]:
-                    self.parse_sb.play_player_poslook,
-                self.pktSB.PLAYER_UPDATE_SIGN[PKT]:
-                    self.parse_sb.play_player_update_sign,
                 self.pktSB.SPECTATE[PKT]:
                     self.parse_sb.play_spectate,
-                self.pktSB.USE_ITEM[PKT]:
-                    self.parse_sb.play_use_item,
                 self.pktSB.PLUGIN_MESSAGE[PKT]:
                     self.parse_sb.plugin_message,
                 },
@@ -382,6 +403,45 @@ class Client(object):
                 }
         }
 
+        # The rest are only parsed when something uses what they provide.
+        play = parsers[PLAY]
+        # the event loop engine runs these off its thread (plugin code).
+        events = set()
+        if self.proxy.wants_state():
+            play[self.pktSB.CLICK_WINDOW[PKT]] = self.parse_sb.play_click_window  # noqa
+            play[self.pktSB.HELD_ITEM_CHANGE[PKT]] = self.parse_sb.play_held_item_change  # noqa
+            play[self.pktSB.PLAYER_LOOK[PKT]] = self.parse_sb.play_player_look
+            play[self.pktSB.PLAYER_POSITION[PKT]] = self.parse_sb.play_player_position  # noqa
+            play[self.pktSB.PLAYER_POSLOOK[PKT]] = self.parse_sb.play_player_poslook  # noqa
+        if self.proxy.wants_event("player.slotClick"):
+            play[self.pktSB.CLICK_WINDOW[PKT]] = self.parse_sb.play_click_window  # noqa
+            events.add(self.pktSB.CLICK_WINDOW[PKT])
+        if self.proxy.wants_event("player.dig", "player.interact"):
+            play[self.pktSB.PLAYER_DIGGING[PKT]] = self.parse_sb.play_player_digging  # noqa
+            events.add(self.pktSB.PLAYER_DIGGING[PKT])
+        # player.interact (use_item) uses the last placement's position.
+        if self.proxy.wants_event("player.place", "player.interact"):
+            play[self.pktSB.PLAYER_BLOCK_PLACEMENT[PKT]] = self.parse_sb.play_player_block_placement  # noqa
+            events.add(self.pktSB.PLAYER_BLOCK_PLACEMENT[PKT])
+        if self.proxy.wants_event("player.interact"):
+            play[self.pktSB.USE_ITEM[PKT]] = self.parse_sb.play_use_item
+            events.add(self.pktSB.USE_ITEM[PKT])
+        if self.proxy.wants_event("player.createSign"):
+            play[self.pktSB.PLAYER_UPDATE_SIGN[PKT]] = self.parse_sb.play_player_update_sign  # noqa
+            events.add(self.pktSB.PLAYER_UPDATE_SIGN[PKT])
+
+        self.parsers = parsers
+        self.event_parsers = events
+
+    def refresh_parsers(self):
+        """
+        Rebuild the parser tables of this client and its server
+        connection (see Proxy.refresh_parsers()).
+        """
+        self._set_parsers()
+        if self.server_connection:
+            self.server_connection.refresh_parsers()
+
     # LOGIN PARSERS SECTION
     # -----------------------
     def _parse_handshaking_legacy(self):
@@ -493,27 +553,57 @@ class Client(object):
         """
         Status Request - client sends server info in response and goes
         back to HANDSHAKE mode.
+
+        Server list pings are frequent, so the encoded response is
+        cached by the proxy and only rebuilt when something in it (MOTD,
+        icon, versions, mod info or the players) has changed.
         """
+        players = self.proxy.wrapper.players
         sample = []
-        for player in self.proxy.wrapper.players:
-            playerobj = self.proxy.wrapper.players[player]
+        for player in players:
+            playerobj = players[player]
             if playerobj.username not in self.hidden_ops:
-                sample.append({"name": playerobj.username,
-                               "id": str(playerobj.mojangUuid)})
+                sample.append(playerobj)
             if len(sample) > 5:
                 break
+        pkid = self.pktCB.PING_JSON_RESPONSE[PKT]
+        key = (pkid, self.clientversion >= PROTOCOL_1_8START)
+        status = (self.javaserver.motd, self.javaserver.servericon,
+                  self.javaserver.protocolVersion, self.javaserver.version,
+                  self.proxy.config["max-players"], self.proxy.forge,
+                  self.proxy.mod_info.get("modinfo"), len(players),
+                  tuple(sample))
+
+        cached = self.proxy.status_cache.get(key)
+        if cached is None or cached[0] != status:
+            motd = self._build_status(sample, key[1])
+            frame = self.packet.send_varint(pkid) + self.packet.send_string(
+                json.dumps(motd))
+            cached = (status, motd, frame)
+            self.proxy.status_cache[key] = cached
+        self.MOTD = cached[1]
+        self.packet.send_raw(cached[2], pkid)
+
+        # after this, proxy waits for the expected PING to
+        #  go back to Handshake mode
+        return False
+
+    def _build_status(self, sample, colorcodes):
+        """ The status response (MOTD) dictionary. """
         reported_version = self.javaserver.protocolVersion
         reported_name = self.javaserver.version
         motdtext = self.javaserver.motd
-        if self.clientversion >= PROTOCOL_1_8START:
+        if colorcodes:
             motdtext = processcolorcodes(motdtext.replace(
                 "\\", ""))
-        self.MOTD = {
+        motd = {
             "description": motdtext,
             "players": {
                 "max": int(self.proxy.config["max-players"]),
                 "online": len(self.proxy.wrapper.players),
-                "sample": sample
+                "sample": [{"name": playerobj.username,
+                            "id": str(playerobj.mojangUuid)}
+                           for playerobj in sample]
             },
             "version": {
                 "name": reported_name,
@@ -523,21 +613,12 @@ class Client(object):
 
         # add Favicon, if it exists
         if self.javaserver.servericon:
-            self.MOTD["favicon"] = self.javaserver.servericon
+            motd["favicon"] = self.javaserver.servericon
 
         # add Forge information, if applicable.
         if self.proxy.forge:
-            self.MOTD["modinfo"] = self.proxy.mod_info["modinfo"]
-
-        self.packet.sendpkt(
-            self.pktCB.PING_JSON_RESPONSE[PKT],
-            [STRING],
-            [json.dumps(self.MOTD)]
-        )
-
-        # after this, proxy waits for the expected PING to
-        #  go back to Handshake mode
-        return False
+            motd["modinfo"] = self.proxy.mod_info["modinfo"]
+        return motd
 
     def _parse_login_start(self):
         """
@@ -545,6 +626,10 @@ class Client(object):
         """
         # This blocks waiting for _login_authenticate_client to finish.
         self.wait_wait_for_auth = True
+        self.auth_done.clear()
+        self.login_started = default_timer()
+        self._login_timer = self.proxy.scheduler.call_later(
+            self.proxy.config["handshake-timeout"], self._login_deadline)
         t = threading.Thread(target=self._continue_login_start,
                              name="Login", args=())
         t.daemon = True
@@ -575,7 +660,7 @@ class Client(object):
             self._login_authenticate_client(None)
 
             # _login_authenticate_client already blocking since we called it...
-            self.wait_wait_for_auth = False
+            self._auth_finished()
             return False
 
     def _continue_login_start(self):
@@ -583,7 +668,10 @@ class Client(object):
         Wait for client authentication to complete before sending login event.
         """
         while self.wait_wait_for_auth:
-            continue
+            # (a failed login never finishes; its client is aborted.)
+            if self.abort:
+                return
+            self.auth_done.wait(1)
 
         # log the client on
         if self._logon_client_into_proxy():
@@ -626,10 +714,8 @@ class Client(object):
         else:
             data = self.packet.readpkt([BYTEARRAY, BYTEARRAY])
 
-        sharedsecret = encryption.decrypt_PKCS1v15_shared_data(
-            data[0], self.private_key)
-        verifytoken = encryption.decrypt_PKCS1v15_shared_data(
-            data[1], self.private_key)
+        sharedsecret, verifytoken = self.proxy.auth.decrypt(
+            self.private_key, data[0], data[1])
         h = hashlib.sha1()
         # self.serverID already encoded
         h.update(self.serverID)
@@ -765,15 +851,12 @@ class Client(object):
             self.pktCB.LOGIN_SUCCESS[PKT],
             [STRING, STRING],
             (self.wrapper_uuid.string, self.username))
+        self._set_play_sending()
         self.state = PLAY
 
         # start keep alives
         self.time_client_responded = time.time()
-        t_keepalives = threading.Thread(
-            target=self._keep_alive_tracker,
-            args=())
-        t_keepalives.daemon = True
-        t_keepalives.start()
+        self._schedule_keep_alive(time.time() + 1)
         return True
 
     def _connect_to_server(self, ip=None, port=None):
@@ -803,9 +886,13 @@ class Client(object):
             return False, mess
 
         # start server handle() to read the packets
-        t = threading.Thread(target=self.server_connection.handle, args=())
-        t.daemon = True
-        t.start()
+        if self.proxy.eventloop:
+            self.proxy.eventloop.add(self.server_connection)
+        else:
+            t = threading.Thread(target=self.server_connection.handle,
+                                 args=())
+            t.daemon = True
+            t.start()
 
         # switch server_connection to LOGIN to log in to (offline) server.
         # already done at server.connect()
@@ -848,8 +935,14 @@ class Client(object):
             self.server_connection.pktSB.LOGIN_START[PKT],
             [STRING],
             [self.username])
-        # give it a sec to get to play mode
-        time.sleep(.5)
+        # wait for it to get to play mode
+        if not self.server_connection.wait_for("logged_in",
+                                               SWITCH_LOGIN_TIMEOUT):
+            if self.server_connection.abort:
+                return False, self.disc_reason
+            mess = "The server did not answer the login."
+            self.notify_disconnect(mess)
+            return False, mess
         return True, "Success"
 
     def close_server(self, term_message):
@@ -880,6 +973,9 @@ class Client(object):
          be accessible to outside networks.
 
         """
+        self._switch_started = default_timer()
+        self.switch_trace = []
+
         # save these in case server can't be reached
         oldchunks = self.first_chunks
         oldinv = self.inventory
@@ -893,13 +989,13 @@ class Client(object):
                        port)
         self.permit_disconnect_from_server = self.serverport == port
         self.state = LOBBY
-        self._close_server_instance("Leaving this world...")
-        # This sleep gives server connection time to finish flush and close.
-        time.sleep(.5)
+        self._leave_server("Leaving this world...")
+        self._trace_switch("left")
 
         # enter lobby (close the client's rendering of the world).
         self._lobbify()
         despawn_dimension = self.dimension
+        self._trace_switch("lobby")
 
         # set up for connect to server
         self.state = PLAY
@@ -910,7 +1006,13 @@ class Client(object):
 
         # connect to new server
         server_try = self._connect_to_server(ip, port)
-        time.sleep(.3)
+        if server_try[0]:
+            self._trace_switch("logged-in")
+            if self.server_connection.wait_for("joined",
+                                               SWITCH_LOGIN_TIMEOUT):
+                self._trace_switch("joined")
+            elif not self.disc_request:
+                server_try = False, "The server did not send the world."
         if not server_try[0] or self.disc_request:
 
             # Could not connect...
@@ -935,13 +1037,15 @@ class Client(object):
 
             # close attempted server and try to reconnect to former server.
             self.state = LOBBY
-            self._close_server_instance("Unsuccessful connection...")
-            time.sleep(.4)
+            self._leave_server("Unsuccessful connection...")
+            self._trace_switch("failed")
             self.state = PLAY
-            time.sleep(.1)
             server = self._connect_to_server(ip, port)
-            time.sleep(.5)
-            if not server[0]:
+            if server[0]:
+                self.server_connection.wait_for("joined",
+                                                SWITCH_LOGIN_TIMEOUT)
+                self._trace_switch("returned")
+            else:
                 self.disconnect(
                     "Could not return to HUB from failed subworld! %s|%s" % (
                         ip, port
@@ -953,8 +1057,11 @@ class Client(object):
                            id(self.server_connection),
                            port)
         # We are now back on the original or a new server
-        # give server time to get all chunks before respawn
-        time.sleep(.3)
+        # wait for the chunks (to re-send them) before respawn
+        if len(self.first_chunks) < 49:
+            self.server_connection.wait_for("chunks_ready",
+                                            SWITCH_CHUNKS_TIMEOUT)
+            self._trace_switch("chunks")
         new_dimension = self.dimension
         if new_dimension == despawn_dimension:
             # self._toggle_dim()
@@ -966,8 +1073,7 @@ class Client(object):
 
         # We must re-send a few things to re-sync the client and (new) server.
         # re-send chunks
-        for chunks in copy.copy(self.first_chunks):
-            self.packet.sendpkt(self.pktCB.CHUNK_DATA[PKT], [RAW], chunks)
+        self._resend_chunks()
 
         self.send_client_settings()
 
@@ -1002,6 +1108,32 @@ class Client(object):
         self.permit_disconnect_from_server = self.serverport == port
 
         self.chat_to_client(confirmation)
+        self._trace_switch("done")
+        self.log.debug("%s changed servers (port %s): %s", self.username,
+                       port, self.switch_trace)
+
+    def _leave_server(self, term_message):
+        """
+        Close the server connection and wait for it to stop handling
+        packets (so none of its packets change the client afterwards).
+        """
+        server = self.server_connection
+        self._close_server_instance(term_message)
+        if server:
+            server.stopped.wait(SWITCH_CLOSE_TIMEOUT)
+
+    def _trace_switch(self, stage):
+        self.switch_trace.append(
+            (stage, round(default_timer() - self._switch_started, 4)))
+
+    def _resend_chunks(self):
+        """ Send the first_chunks and the changes made to them since. """
+        cache = self.proxy.chunk_cache
+        for chunk in list(self.first_chunks):
+            data, changes = cache.contents(chunk)
+            self.packet.sendpkt(self.pktCB.CHUNK_DATA[PKT], [RAW], [data])
+            for pkid, change in changes:
+                self.packet.sendpkt(pkid, [RAW], [change])
 
     def _lobbify(self):
         """
@@ -1009,6 +1141,8 @@ class Client(object):
         raining.  Prepare to collect RAW chunk data (TODO and maybe health/inv).
         """
         self.first_chunks = []
+        # the old world's entities are gone from the client
+        self._drop_entities()
 
         # stop local rain fall.
         if self.raining:
@@ -1018,8 +1152,6 @@ class Client(object):
                                 (1, 0))
 
         self.chat_to_client("§5§lHold still.. changing worlds!", 2)
-        # This sleep gives client time to read the message above
-        time.sleep(1)
 
         # This respawns in a different dimension in preparation for respawning.
         self._toggle_dim()
@@ -1143,10 +1275,47 @@ class Client(object):
          what is being received/sent from/to the client.
         That is why we refresh to the clientversion.
         """
-        self.pktSB = mcpackets_sb.Packets(self.clientversion)
-        self.pktCB = mcpackets_cb.Packets(self.clientversion)
+        self.pktSB = mcpackets_sb.get_packets(self.clientversion)
+        self.pktCB = mcpackets_cb.get_packets(self.clientversion)
         self._set_parsers()
 
+    def _set_play_sending(self):
+        """
+        Set up what a congested send queue may drop (or coalesce) and
+        the priority lanes.  These are by PLAY packet ids, so they are
+        only set once the login packets are queued (a LOGIN or STATUS
+        packet would otherwise be sorted by a PLAY packet sharing its id).
+        """
+        self.packet.coalesce = {self.pktCB.TIME_UPDATE[PKT]}
+        self.packet.droppable = {
+            self.pktCB.TIME_UPDATE[PKT],
+            self.pktCB.ENTITY_RELATIVE_MOVE[PKT],
+            self.pktCB.ENTITY_LOOK[PKT],
+            self.pktCB.ENTITY_LOOK_AND_RELATIVE_MOVE[PKT],
+            self.pktCB.ENTITY_HEAD_LOOK[PKT]
+        }
+
+        if self.proxy.config["priority-lanes"]:
+            self._set_lanes()
+
+    def _set_lanes(self):
+        """ Sets up the client packet's priority lanes from the config. """
+        lane_of = {}
+        lanes = ((LANE_CONTROL, "lanes-control"), (LANE_BULK, "lanes-bulk"))
+        for lane, key in lanes:
+            for name in self.proxy.config[key]:
+                if hasattr(self.pktCB, name):
+                    lane_of[getattr(self.pktCB, name)[PKT]] = lane
+                else:
+                    self.log.warning("Proxy config '%s': unknown packet"
+                                     " '%s'", key, name)
+        follow = [getattr(self.pktCB, name)[PKT] for name in (
+            "BLOCK_CHANGE", "MULTI_BLOCK_CHANGE", "BLOCK_ACTION",
+            "BLOCK_BREAK_ANIMATION", "UPDATE_BLOCK_ENTITY", "EXPLOSION")]
+        barriers = (self.pktCB.JOIN_GAME[PKT], self.pktCB.RESPAWN[PKT])
+        self.packet.set_lanes(lane_of, self.proxy.config["lane-weights"],
+                              follow, barriers)
+
     # client API things
     # -----------------
     def editsign(self, position, line1, line2, line3, line4, pre18=False):
@@ -1227,9 +1396,14 @@ class Client(object):
     def _login_authenticate_client(self, server_id):
         # future TODO have option to be online but bypass session server.
         if self.onlinemode:
-            r = requests.get("https://sessionserver.mojang.com"
-                             "/session/minecraft/hasJoined?username=%s"
-                             "&serverId=%s" % (self.username, server_id))
+            try:
+                r = self.proxy.auth.has_joined(self.username, server_id)
+            except requests.RequestException as e:
+                self.log.warning("Session server request for %s failed: %s",
+                                 self.username, e)
+                self.disconnect("Proxy Client Session-Server Error"
+                                " (no response)")
+                return False
             if r.status_code == 200:
                 # {
                 #     "id": "<profile identifier>",
@@ -1264,11 +1438,20 @@ class Client(object):
                 self.disconnect("Proxy Client Session-Server Error"
                                 " (HTTP Status Code %d)" % r.status_code)
                 return False
-            mojang_name = self.proxy.uuids.getusernamebyuuid(
-                self.wrapper_uuid.string, uselocalname=False)
+            start = default_timer()
+            try:
+                mojang_name = self.proxy.uuids.getusernamebyuuid(
+                    self.wrapper_uuid.string, uselocalname=False)
+            except requests.RequestException as e:
+                self.log.warning("Mojang profile lookup for %s failed: %s",
+                                 self.username, e)
+                self.disconnect("Proxy Client Mojang API Error"
+                                " (no response)")
+                return False
             self.local_uuid = self.proxy.uuids.getuuidfromname(self.username)
             local_name = self.proxy.usercache[
                 self.wrapper_uuid.string]["localname"]
+            self.proxy.auth.record("profile", default_timer() - start)
             if mojang_name:
                 if mojang_name != local_name:
                     if self.names_change:
@@ -1323,59 +1506,118 @@ class Client(object):
             self.log.debug("Client logon with wrapper offline-"
                            " 'self.wrapper_uuid = OfflinePlayer:<name>'")
 
+        self._auth_finished()
+
+    def _auth_finished(self):
+        self.proxy.scheduler.cancel(self._login_timer)
+        self._login_timer = None
+        if self.login_started:
+            self.proxy.auth.record("login",
+                                   default_timer() - self.login_started)
+            self.login_started = 0
         self.wait_wait_for_auth = False
+        self.auth_done.set()
 
     def _add_client(self):
         """
         Put client into server data. (player login will be called
         later by mcserver.py)
         """
-        if self not in self.proxy.clients:
-            self.proxy.clients.append(self)
+        self.proxy.clients.add(self)
+
+    def _schedule_keep_alive(self, when):
+        with self._keepalive_lock:
+            if self.abort:
+                # (re)scheduling must not push back the tracker's clean up.
+                when = min(when, time.time())
+            self.proxy.scheduler.cancel(self._keepalive_timer)
+            self._keepalive_timer = self.proxy.scheduler.call_at(
+                when, self._keep_alive_tracker)
 
     def _keep_alive_tracker(self):
         """
-        Send keep alives to client.
+        Send keep alives to client.  Runs on the proxy's scheduler, which
+        calls it again when the next keep alive or timeout is due.
         """
-        while not self.abort:
-            time.sleep(1)
-            if self.state in (PLAY, LOBBY):
-                # client expects < 20sec
-                # sending more frequently (5 seconds) seems to help with
-                # some slower connections.
-                if time.time() - self.time_last_ping_to_client > 9:
-                    # vanilla MC 1.12 .2 uses a time() value.
-                    # I use simple incrementing numbers vs randoms... I mean,
-                    # what is the point of a random keepalive?
-                    if self.version < PROTOCOL_1_12_2:
-                        # sending a keepalive every second for more than 68
-                        # years would be required to exceed the VARINT capacity
-                        self.keepalive_val += 1
-                    else:
-                        # running forever would not allow keepalive to exceed
-                        # LONG contraints
-                        self.keepalive_val += 1
-
-                    # challenge the client with it
-                    self.packet.sendpkt(
-                        self.pktCB.KEEP_ALIVE[PKT],
-                        self.pktCB.KEEP_ALIVE[PARSER],
-                        [self.keepalive_val])
-
-                    self.time_last_ping_to_client = time.time()
-
-                # check for active client keep alive status:
-                # server can allow up to 30 seconds for response
-                if time.time() - self.time_client_responded > 30:
-                    self.disconnect("Client closed due to lack of"
-                                    " keepalive response")
-                    self.log.debug("Closed %s's client thread due to "
-                                   "lack of keepalive response", self.username)
-                    return
-        self.log.debug("%s Client keepalive tracker aborted", self.username)
+        if self._keepalive_ended:
+            return
+        if self.abort:
+            self._keepalive_timer = None
+            self._keepalive_ended = True
+            self.log.debug("%s Client keepalive tracker aborted",
+                           self.username)
+            t = threading.Thread(target=self._keep_alive_ended, args=())
+            t.daemon = True
+            t.start()
+            return
+
+        now = time.time()
+        if self.state in (PLAY, LOBBY):
+            # client expects < 20sec
+            # sending more frequently (5 seconds) seems to help with
+            # some slower connections.
+            if now - self.time_last_ping_to_client > 9:
+                # vanilla MC 1.12 .2 uses a time() value.
+                # I use simple incrementing numbers vs randoms... I mean,
+                # what is the point of a random keepalive?
+                if self.version < PROTOCOL_1_12_2:
+                    # sending a keepalive every second for more than 68
+                    # years would be required to exceed the VARINT capacity
+                    self.keepalive_val += 1
+                else:
+                    # running forever would not allow keepalive to exceed
+                    # LONG contraints
+                    self.keepalive_val += 1
+
+                # challenge the client with it
+                self.packet.sendpkt(
+                    self.pktCB.KEEP_ALIVE[PKT],
+                    self.pktCB.KEEP_ALIVE[PARSER],
+                    [self.keepalive_val])
+
+                self.time_last_ping_to_client = now
+
+            # check for active client keep alive status:
+            # server can allow up to 30 seconds for response
+            if now - self.time_client_responded > 30:
+                self._keepalive_timer = None
+                self._keepalive_ended = True
+                t = threading.Thread(
+                    target=self.disconnect,
+                    args=("Client closed due to lack of keepalive "
+                          "response",))
+                t.daemon = True
+                t.start()
+                self.log.debug("Closed %s's client thread due to "
+                               "lack of keepalive response", self.username)
+                return
+            # (a response moves the timeout; it is re-checked then.)
+            due = min(self.time_last_ping_to_client + 9,
+                      self.time_client_responded + 30)
+        else:
+            # (between servers or logging in)
+            due = now + 1
+        # just past the due time, so the '>' checks above are True.
+        self._schedule_keep_alive(max(due, now) + 0.01)
+
+    def _keep_alive_ended(self):
         self.disconnect("Client disconnected.")
         self.state = HANDSHAKE
 
+    def _login_deadline(self):
+        """ Scheduled when the login starts; disconnects stuck logins. """
+        self._login_timer = None
+        if not self.wait_wait_for_auth or self.abort:
+            return
+        self.log.info("Login of %s (%s) timed out.", self.username, self.ip)
+        self.abort = True
+        # wake _continue_login_start() so it can quit.
+        self.auth_done.set()
+        t = threading.Thread(target=self.disconnect,
+                             args=("Login timed out.",))
+        t.daemon = True
+        t.start()
+
     def _remove_client_and_player(self):
         """
         This is needed when the player is logged into wrapper, but not
@@ -1386,6 +1628,12 @@ class Client(object):
             if self.proxy.wrapper.players[self.username].client.state != LOBBY:
                 self.proxy.wrapper.players[self.username].abort = True
                 del self.proxy.wrapper.players[self.username]
+        self._drop_entities()
+
+    def _drop_entities(self):
+        """ Forget the entities tracked for this client. """
+        if self.proxy.entity_control:
+            self.proxy.entity_control.remove_owner(self.username)
 
     def send_client_settings(self):
         """
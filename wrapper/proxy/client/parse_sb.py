@@ -86,6 +86,7 @@ class ParseSB(object):
                 self.client.mojanguuid = self.proxy.wrapper.mcuuid(
                     response["realuuid"])
             self.client.username = response["username"]
+            self.proxy.clients.reindex(self.client)
             return True
         else:
             self.log.debug(
@@ -842,12 +843,12 @@ class ParseSB(object):
         data = self.packet.readpkt([UUID, NULL])
 
         # ("uuid:target_player")
-        for client in self.proxy.clients:
-            if data[0] == client.wrapper_uuid:
-                self.client.server_connection.packet.sendpkt(
-                    self.client.pktSB.SPECTATE[PKT],
-                    [UUID],
-                    [client.wrapper_uuid])
-                self.log.debug("spectate returned False (SB)")
-                return False
+        client = self.proxy.clients.by_uuid(data[0].string)
+        if client and data[0] == client.wrapper_uuid:
+            self.client.server_connection.packet.sendpkt(
+                self.client.pktSB.SPECTATE[PKT],
+                [UUID],
+                [client.wrapper_uuid])
+            self.log.debug("spectate returned False (SB)")
+            return False
         return True
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+Proxy.clients - the logged in Client objects, indexed for lookups.
+
+Iterating the registry iterates a snapshot, so clients may be added or
+removed (by any thread) while someone loops over it.  Indexes are kept
+by username, server (offline) uuid, wrapper/Mojang uuid, entity id and
+remote address.  Code that changes one of those on a registered client
+calls reindex(client).
+"""
+
+import threading
+
+
+class ClientRegistry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {client: [(index, key), ...]}
+        self._clients = {}
+        self._snapshot = ()
+        self._username = {}
+        self._server_uuid = {}
+        self._uuid = {}
+        self._eid = {}
+        self._address = {}
+
+    # list-like use
+    # -----------------------------
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __contains__(self, client):
+        return client in self._clients
+
+    def __repr__(self):
+        return "ClientRegistry(%r)" % (list(self._snapshot),)
+
+    def snapshot(self):
+        """ A tuple of the clients (safe to keep and iterate). """
+        return self._snapshot
+
+    # changes
+    # -----------------------------
+
+    def add(self, client):
+        """ Register (or reindex) a client. """
+        with self._lock:
+            self._unindex(client)
+            self._clients[client] = self._index(client)
+            self._snapshot = tuple(self._clients)
+
+    def remove(self, client):
+        with self._lock:
+            if client not in self._clients:
+                return False
+            self._unindex(client)
+            del self._clients[client]
+            self._snapshot = tuple(self._clients)
+            return True
+
+    def reindex(self, client):
+        """ Update the indexes after a client's name/uuid/eid changed. """
+        with self._lock:
+            if client in self._clients:
+                self._unindex(client)
+                self._clients[client] = self._index(client)
+
+    def _index(self, client):
+        keys = [(self._username, client.username),
+                (self._eid, client.server_eid),
+                (self._address, client.client_address)]
+        if client.local_uuid:
+            keys.append((self._server_uuid, client.local_uuid.string))
+        for uuid in (client.wrapper_uuid, client.mojanguuid):
+            if uuid:
+                keys.append((self._uuid, uuid.string))
+        for index, key in keys:
+            index[key] = client
+        return keys
+
+    def _unindex(self, client):
+        for index, key in self._clients.get(client, ()):
+            if index.get(key) is client:
+                del index[key]
+
+    # lookups
+    # -----------------------------
+
+    def by_username(self, username):
+        return self._find(self._username, username, lambda c: c.username)
+
+    def by_server_uuid(self, uuid):
+        """ :param uuid: the uuid string the server uses (local_uuid). """
+        return self._find(self._server_uuid, uuid,
+                          lambda c: c.local_uuid and c.local_uuid.string)
+
+    def by_uuid(self, uuid):
+        """ :param uuid: a wrapper_uuid or mojanguuid string. """
+        def current(client):
+            for each in (client.wrapper_uuid, client.mojanguuid):
+                if each and each.string == uuid:
+                    return uuid
+        return self._find(self._uuid, uuid, current)
+
+    def by_eid(self, eid):
+        return self._find(self._eid, eid, lambda c: c.server_eid)
+
+    def by_address(self, address):
+        """ :param address: the client's (ip, port). """
+        return self._find(self._address, address, lambda c: c.client_address)
+
+    def _find(self, index, key, current):
+        """
+        Look `key` up, checking that the client still has it (a stale
+        entry is reindexed and the clients searched instead).
+
+        :param current: returns a client's current value of the key.
+        """
+        client = index.get(key)
+        if client is None:
+            return None
+        if current(client) == key:
+            return client
+        self.reindex(client)
+        for client in self._snapshot:
+            if current(client) == key:
+                self.reindex(client)
+                return client
+        return None
@@ -109,12 +109,22 @@ class Objects(object):
 
 
 class Entity(object):
+    """
+    One tracked entity.  There can be tens of thousands of these, so
+    the record is slotted (no per-instance __dict__) and the position is
+    kept as three floats that moves update in place.  `position` is
+    still available as an (x, y, z) tuple.
+    """
+    __slots__ = ("eid", "uuid", "entitytype", "x", "y", "z", "look",
+                 "rodeBy", "riding", "isObject", "entityname", "active",
+                 "clientname", "dimension", "cell")
+
     def __init__(self, eid, uuid, entitytype, entityname, position, look,
-                 isobject, playerclientname):
+                 isobject, playerclientname, dimension=0):
         self.eid = eid  # Entity ID
         self.uuid = uuid  # Entity UUID
         self.entitytype = entitytype  # Type of Entity
-        self.position = position  # (x, y, z)
+        self.x, self.y, self.z = position
         self.look = look  # Head Position
         self.rodeBy = False
         self.riding = False
@@ -124,10 +134,22 @@ class Entity(object):
         self.entityname = entityname
         self.active = currtime()
         self.clientname = playerclientname
+        self.dimension = dimension
+        # EntityControl's grid cell (dimension, chunk x, chunk z)
+        self.cell = None
 
     def __str__(self):
         return self.entitytype
 
+    @property
+    def position(self):
+        """ (x, y, z) """
+        return self.x, self.y, self.z
+
+    @position.setter
+    def position(self, position):
+        self.x, self.y, self.z = position
+
     def move_relative(self, position):
         """ Move the entity relative to their position, unless it is illegal.
 
@@ -137,26 +159,28 @@ class Entity(object):
             position:
         """
         x, y, z = position
-        oldposition = [self.position[0], self.position[1], self.position[2]]
-        oldposition[0] += x / (128 * 32.0)
-        oldposition[1] += y / (128 * 32.0)
-        oldposition[2] += z / (128 * 32.0)
-        self.position = (oldposition[0], oldposition[1], oldposition[2])
+        self.x += x / (128 * 32.0)
+        self.y += y / (128 * 32.0)
+        self.z += z / (128 * 32.0)
         if self.rodeBy:
-            self.rodeBy.position = self.position
+            self.rodeBy.position = (self.x, self.y, self.z)
 
     def teleport(self, position):
         """ Track entity teleports to a specific location. """
-        self.position = (position[0] / 32, position[1] / 32, position[2] / 32)  # Fixed point numbers...
+        # Fixed point numbers...
+        self.x = position[0] / 32
+        self.y = position[1] / 32
+        self.z = position[2] / 32
         if self.rodeBy:
-            self.rodeBy.position = self.position
+            self.rodeBy.position = (self.x, self.y, self.z)
 
     def about_entity(self):
+        """ A dictionary describing the entity (built on each call). """
         info = {
             "eid": self.eid,
             "uuid": str(self.uuid),
             "type": self.entitytype,
-            "position": [int(self.position[0]), int(self.position[1]), int(self.position[2])],
+            "position": [int(self.x), int(self.y), int(self.z)],
             "rodeBy": self.rodeBy,
             "Riding": self.riding,
             "isObject": self.isObject,
@@ -200,5 +224,49 @@ def _test():
     # putjsonfile(x.entitylist, "processed",
     #             "/home/surest/github/Wrapper/wrapper/utils", indent_spaces=4)
 
+def _benchmark(count=50000):
+    """
+    Memory used by `count` entity records: the slotted Entity against
+    a plain object with the same fields (how Entity used to be).
+
+    Run from the wrapper folder:  python -m proxy.entity.entitybasics
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        print("the benchmark needs tracemalloc (Python 3.4+)")
+        return
+
+    class PlainEntity(object):
+        def __init__(self, eid, uuid, entitytype, entityname, position,
+                     look, isobject, playerclientname, dimension=0):
+            self.eid = eid
+            self.uuid = uuid
+            self.entitytype = entitytype
+            self.position = position
+            self.look = look
+            self.rodeBy = False
+            self.riding = False
+            self.isObject = isobject
+            self.entityname = entityname
+            self.active = currtime()
+            self.clientname = playerclientname
+            self.dimension = dimension
+            self.cell = None
+
+    for kind in (PlainEntity, Entity):
+        tracemalloc.start()
+        records = [kind(eid, None, 92, "cow",
+                        (eid * 1.5, 64.0, eid * -1.5), (0, 0, 0),
+                        False, "player")
+                   for eid in range(count)]
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print("%s: %d records, %d bytes (%.1f bytes each)" % (
+            kind.__name__, len(records), used, used / float(count)))
+        del records
+
+
 if __name__ == "__main__":
     _test()
+    _benchmark()
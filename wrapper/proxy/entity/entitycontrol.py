@@ -5,11 +5,17 @@
 # This program is distributed under the terms of the GNU
 # General Public License, version 3 or later.
 
-from time import sleep
+from time import sleep, time
 import threading
 from proxy.entity.entitybasics import Entities as Entitytypes
 from proxy.entity.entitybasics import Objects as Objecttypes
 
+# thinning areas are squares of AREA_CHUNKS x AREA_CHUNKS chunks.
+AREA_SHIFT = 3
+AREA_CHUNKS = 1 << AREA_SHIFT
+# width (blocks) of a thinning area and its command's dx/dz selector box.
+AREA_BLOCKS = AREA_CHUNKS * 16
+
 
 # noinspection PyPep8Naming
 class EntityControl(object):
@@ -58,24 +64,29 @@ class EntityControl(object):
         # load config settings
         self.entityControl = self.ent_config[
             "enable-entity-controls"]
-        self.entityProcessorFrequency = self.ent_config[
-            "entity-update-frequency"]
         self.thiningFrequency = self.ent_config[
             "thinning-frequency"]
         self.startThinningThreshshold = self.ent_config[
             "thinning-activation-threshhold"]
+        self.thinningCommands = self.ent_config[
+            "thinning-commands-per-pass"]
         # self.kill_aura_radius = self.javaserver.config["Entities"][
         #   "player-thinning-radius"]
 
         self.entities = {}
-        if self.entityControl:
-
-            # entity processor thread
-            t = threading.Thread(target=self._entity_processor,
-                                 name="entProc", args=())
-            t.daemon = True
-            t.start()
+        # indexes of self.entities, kept up to date by add_entity(),
+        # move_entity(), teleport_entity() and remove_entity().
+        self._lock = threading.Lock()
+        # {(dimension, chunk x, chunk z): {eid: entity}}
+        self._grid = {}
+        # {clientname: {eid: entity}}
+        self._owned = {}
+        # {clientname: {entity name: count}}
+        self._type_counts = {}
+        # {(dimension, area x, area z): {entity name: count}}
+        self._area_counts = {}
 
+        if self.entityControl:
             # entity killer thread
 
             ekt = threading.Thread(target=self._entity_thinner,
@@ -107,6 +118,138 @@ class EntityControl(object):
         """
         return len(self.entities)
 
+    def add_entity(self, entity):
+        """ Track a spawned entity (replacing any with the same eid). """
+        with self._lock:
+            self._remove(entity.eid)
+            self.entities[entity.eid] = entity
+            self._owned.setdefault(entity.clientname, {})[entity.eid] = entity
+            counts = self._type_counts.setdefault(entity.clientname, {})
+            counts[entity.entityname] = counts.get(entity.entityname, 0) + 1
+            self._place(entity)
+
+    def move_entity(self, eid, delta):
+        """ Apply a relative move packet's (dx, dy, dz). """
+        entity = self.entities.get(eid)
+        if entity:
+            entity.move_relative(delta)
+            self._relocate(entity)
+
+    def teleport_entity(self, eid, position):
+        """ Apply a teleport packet's (fixed point) position. """
+        entity = self.entities.get(eid)
+        if entity:
+            entity.teleport(position)
+            self._relocate(entity)
+
+    def remove_entity(self, eid):
+        """ Stop tracking an entity (destroyed or out of range). """
+        with self._lock:
+            self._remove(eid)
+
+    def remove_owner(self, clientname):
+        """
+        Stop tracking all of a player's entities (the player left or
+        changed servers).
+        """
+        with self._lock:
+            for eid in list(self._owned.get(clientname, ())):
+                self._remove(eid)
+
+    def _remove(self, eid):
+        entity = self.entities.pop(eid, None)
+        if entity is None:
+            return
+        owned = self._owned.get(entity.clientname)
+        if owned:
+            owned.pop(eid, None)
+            if not owned:
+                del self._owned[entity.clientname]
+        counts = self._type_counts.get(entity.clientname)
+        if counts:
+            counts[entity.entityname] -= 1
+            if counts[entity.entityname] < 1:
+                del counts[entity.entityname]
+            if not counts:
+                del self._type_counts[entity.clientname]
+        cell = self._grid.get(entity.cell)
+        if cell:
+            cell.pop(eid, None)
+            if not cell:
+                del self._grid[entity.cell]
+        self._count_area(entity, entity.cell, -1)
+
+    def _relocate(self, entity):
+        """ Move an entity to its grid cell, if it moved to a new one. """
+        if _cell_of(entity) == entity.cell:
+            return
+        with self._lock:
+            if self.entities.get(entity.eid) is not entity:
+                return
+            cell = self._grid.get(entity.cell)
+            if cell:
+                cell.pop(entity.eid, None)
+                if not cell:
+                    del self._grid[entity.cell]
+            self._count_area(entity, entity.cell, -1)
+            self._place(entity)
+
+    def _place(self, entity):
+        entity.cell = _cell_of(entity)
+        self._grid.setdefault(entity.cell, {})[entity.eid] = entity
+        self._count_area(entity, entity.cell, 1)
+
+    def _count_area(self, entity, cell, change):
+        """ Add `change` to the area count of the entity's kind. """
+        if cell is None:
+            return
+        area = _area_of(cell)
+        counts = self._area_counts.setdefault(area, {})
+        count = counts.get(entity.entityname, 0) + change
+        if count > 0:
+            counts[entity.entityname] = count
+        else:
+            counts.pop(entity.entityname, None)
+            if not counts:
+                del self._area_counts[area]
+
+    def getEntitiesNear(self, position, radius, dimension=0):
+        """
+        Returns a list of the entities (entity objects, see
+        getEntityByEID) within `radius` blocks of `position`.
+
+        :Args:
+            :position: (x, y, z)
+            :radius: distance in blocks
+            :dimension: the dimension (0 overworld, -1 nether, 1 end)
+
+        """
+        x, y, z = position
+        near = []
+        within = radius * radius
+        with self._lock:
+            for chunkx in range(int((x - radius) // 16),
+                                int((x + radius) // 16) + 1):
+                for chunkz in range(int((z - radius) // 16),
+                                    int((z + radius) // 16) + 1):
+                    cell = self._grid.get((dimension, chunkx, chunkz))
+                    if not cell:
+                        continue
+                    for entity in cell.values():
+                        if ((entity.x - x) ** 2 + (entity.y - y) ** 2 +
+                                (entity.z - z) ** 2) <= within:
+                            near.append(entity)
+        return near
+
+    def countEntityTypesInPlayer(self, playername):
+        """
+        Returns a dictionary of the number of each kind of entity in
+        a player's client, like {"Cow": 12, "Zombie": 3}.
+
+        """
+        with self._lock:
+            return dict(self._type_counts.get(playername, ()))
+
     def countEntitiesInPlayer(self, playername):
         """
         returns a list of entity info dictionaries
@@ -129,14 +272,9 @@ class EntityControl(object):
             @:type Dict
 
         """
-        ents = []
-        entities = self.entities
-        for v in iter(entities.values()):
-            if v.clientname == playername:
-                about = v.about_entity
-                if about:
-                    ents.append(about())
-        return ents
+        with self._lock:
+            owned = list(self._owned.get(playername, {}).values())
+        return [entity.about_entity() for entity in owned]
 
     def getEntityInfo(self, eid):
         """
@@ -217,35 +355,6 @@ class EntityControl(object):
 
         self.proxy.run_command(console_command)
 
-    def _entity_processor(self):
-        self._log.debug("_entityprocessor thread started.")
-        timer = float(0)
-        # server is running
-        while self.javaserver.state in (1, 2, 4) and not (
-                self.proxy.wrapper.haltsig.halt or self.proxy.abort
-        ):
-            timer += .1
-            sleep(.1)
-            # timer for removing stale entities we want a FAST response
-            # to server shutdowns (activate while loop frequently)
-            if timer < float(self.entityProcessorFrequency):
-                continue
-            timer = float(0)
-
-            # start looking for stale client entities
-            playerlist = []
-            for player in self.proxy.clients:
-                playerlist.append(player.username)
-            entity_eids = list(self.entities.keys())
-            for eid in entity_eids:
-                if self.getEntityByEID(eid).clientname not in playerlist:
-                    # noinspection PyBroadException
-                    try:
-                        self.entities.pop(eid, None)
-                    except:
-                        pass
-        self._log.debug("_entityprocessor thread closed.")
-
     # each entity IS a dictionary, so...
     # noinspection PyTypeChecker
     def _entity_thinner(self):
@@ -269,50 +378,68 @@ class EntityControl(object):
                 # don't bother, server load is light.
                 continue
 
-            # gather client list
-            playerlist = self.proxy.clients
-            # loop through playerlist
-            for playerclient in playerlist:
-                players_position = playerclient.position
-                his_entities = self.countEntitiesInPlayer(playerclient.username)
-                if len(his_entities) < self.startThinningThreshshold:
-                    # don't worry with this player, his load is light.
-                    continue
-
-                # now we need to count each entity type
-                counts = {}
-                for entity in his_entities:
-                    if entity["name"] in counts:
-                        counts[entity["name"]] += 1
-                    else:
-                        counts[entity["name"]] = 1  # like {"Cow": 1}
-
-                for mob_type in counts:
-                    if "thin-%s" % mob_type in self.ent_config:
-                        maxofthiskind = self.ent_config["thin-%s" % mob_type]
-                        if counts[mob_type] >= maxofthiskind:
-
-                            # turn off console_spam
-                            server_msg = "Teleported %s to" % mob_type
-                            if server_msg not in self.javaserver.spammy_stuff:
-                                self.javaserver.spammy_stuff.append(
-                                    "Teleported %s to" % mob_type)
-
-                            # can't be too agressive with killing because
-                            # entitycount might be off/lagging
-                            # kill half of any mob above this number
-                            killcount = (counts[mob_type] - maxofthiskind) // 2
-                            if killcount > 1:
-                                self._kill_around_player(
-                                    players_position, "%s" % mob_type,
-                                    killcount)
+            self._thin()
 
         self._log.debug("_entity_thinner thread closed.")
 
-    def _kill_around_player(self, position, entity_name, count):
-        pos = position
-        # send those creatures away
+    def _thin(self):
+        """
+        Thin each area holding more of a mob than its "thin-<mob>"
+        setting, with one selector command per mob type and area.  At
+        most "thinning-commands-per-pass" commands are sent (half that
+        if the server lagged since the last pass), biggest first.
+
+        Only overworld areas are thinned; console selectors can not
+        reach the other dimensions.
+        """
+        limit = self.thinningCommands
+        if self.javaserver.lagged_at > time() - self.thiningFrequency:
+            limit = max(1, limit // 2)
+
+        with self._lock:
+            areas = [(area, dict(counts))
+                     for area, counts in self._area_counts.items()]
+        surplus = []
+        for area, counts in areas:
+            if area[0] != 0:
+                continue
+            for mob_type, count in counts.items():
+                maxofthiskind = self.ent_config.get("thin-%s" % mob_type)
+                if maxofthiskind is None:
+                    continue
+                # can't be too agressive with killing because
+                # entitycount might be off/lagging
+                # kill half of any mob above this number
+                killcount = (count - maxofthiskind) // 2
+                if killcount > 1:
+                    surplus.append((killcount, mob_type, area))
+
+        surplus.sort(key=lambda job: job[0], reverse=True)
+        for killcount, mob_type, area in surplus[:limit]:
+            # turn off console_spam
+            server_msg = "Teleported %s to" % mob_type
+            if server_msg not in self.javaserver.spammy_stuff:
+                self.javaserver.spammy_stuff.append(server_msg)
+            self._kill_in_area(area, mob_type, killcount)
+
+    def _kill_in_area(self, area, entity_name, count):
+        """ Send `count` of a mob in an (overworld) area away. """
+        areax, areaz = area[1:]
         self._log.debug("killing %d %s" % (count, entity_name))
-        console_command = "tp @e[type=%s,x=%d,y=%d,z=%d,c=%s] ~ ~-500 ~" % (
-            entity_name, pos[0], pos[1], pos[2], count)
+        # a full height box matching the area's grid cell
+        console_command = (
+            "tp @e[type=%s,x=%d,y=0,z=%d,dx=%d,dy=255,dz=%d,c=%s] "
+            "~ ~-500 ~" % (entity_name, areax * AREA_BLOCKS,
+                           areaz * AREA_BLOCKS, AREA_BLOCKS - 1,
+                           AREA_BLOCKS - 1, count))
         self.proxy.run_command(console_command)
+
+
+def _cell_of(entity):
+    """ The (dimension, chunk x, chunk z) grid cell of an entity. """
+    return entity.dimension, int(entity.x // 16), int(entity.z // 16)
+
+
+def _area_of(cell):
+    """ The (dimension, area x, area z) thinning area of a grid cell. """
+    return cell[0], cell[1] >> AREA_SHIFT, cell[2] >> AREA_SHIFT
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - BenBaptist and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+The "selectors" proxy engine.
+
+Instead of a handle() thread and a flush thread for each client and each
+server connection, one EventLoop thread waits on every proxy socket with
+the `selectors` module.  Readable sockets are read into their Packet's
+receive buffer and each complete frame is passed to the connection's
+handle_packet() - the same parsers the threaded engine uses.  Queued
+packets are written with non-blocking sends; whatever a socket will not
+take is kept in the Packet and sent when the socket becomes writable, so
+a slow player can not stall the others.
+
+Handlers that may block (handshakes, login and authentication,
+disconnects, chat commands and any packet that calls a registered
+plugin event) run on a worker thread.  Reading from that
+connection pauses until the handler returns, so packets are still
+handled in order.
+"""
+
+import os
+import selectors
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+
+from proxy.server.serverconnection import ServerConnection
+from proxy.utils.constants import *
+
+# seconds between checks for connections aborted by other threads.
+_SWEEP = 1.0
+
+
+class _Channel(object):
+    """ A connection (Client or ServerConnection) on the event loop. """
+    __slots__ = ("conn", "sock", "packet", "is_server",
+                 "events", "paused", "writing", "closed")
+
+    def __init__(self, conn, sock, is_server):
+        self.conn = conn
+        self.sock = sock
+        self.packet = conn.packet
+        self.is_server = is_server
+        # currently registered selector events
+        self.events = 0
+        # reading is paused while a handler runs on a worker thread
+        self.paused = False
+        # bytes are waiting for the socket to become writable
+        self.writing = False
+        self.closed = False
+
+
+class EventLoop(object):
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.wrapper = proxy.wrapper
+        self.log = proxy.log
+
+        self.selector = selectors.DefaultSelector()
+        self.channels = {}
+        self._bypacket = {}
+
+        # Other threads never touch the selector.  They queue an
+        # operation (or a packet to flush) and wake the loop.
+        self._ops = deque()
+        self._flushes = deque()
+        self._waking = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = None
+
+    def start(self):
+        t = threading.Thread(target=self._run, args=())
+        t.daemon = True
+        self._thread = t
+        t.start()
+
+    # Thread-safe API
+    # -----------------------------
+
+    def add(self, conn):
+        """ Hand a Client or ServerConnection over to the loop. """
+        self._ops.append((self._add, conn))
+        self.wakeup()
+
+    def discard(self, conn):
+        """
+        Remove a connection.  Call before its socket is closed; other
+        threads wait (up to _SWEEP seconds) for the loop to unregister it.
+        """
+        if threading.current_thread() is self._thread:
+            return self._discard((conn, None))
+        done = threading.Event()
+        self._ops.append((self._discard, (conn, done)))
+        self.wakeup()
+        if self._thread and self._thread.is_alive():
+            done.wait(_SWEEP)
+
+    def want_flush(self, packet):
+        """ Packet.wakeup callback; called when something is queued. """
+        self._flushes.append(packet)
+        self.wakeup()
+
+    def wakeup(self):
+        if self._waking:
+            return
+        self._waking = True
+        try:
+            self._wake_w.send(b"\x00")
+        except socket.error:
+            # the pipe is full, so the loop is awake anyway.
+            pass
+
+    # Loop
+    # -----------------------------
+
+    def _run(self):
+        next_sweep = time.time() + _SWEEP
+        while not (self.proxy.abort or self.wrapper.haltsig.halt):
+            try:
+                ready = self.selector.select(_SWEEP)
+            except (OSError, ValueError) as e:
+                self.log.error("Proxy event loop select failed: %s", e)
+                self._drop_broken()
+                continue
+            self._waking = False
+            for key, events in ready:
+                channel = key.data
+                if channel is None:
+                    self._drain_wakeups()
+                    continue
+                if channel.closed:
+                    continue
+                if events & selectors.EVENT_READ:
+                    self._read(channel)
+                if events & selectors.EVENT_WRITE and not channel.closed:
+                    self._write(channel)
+            while self._ops:
+                operation, item = self._ops.popleft()
+                operation(item)
+            self._flush()
+            if time.time() > next_sweep:
+                self._sweep()
+                next_sweep = time.time() + _SWEEP
+        self.selector.close()
+        self.log.debug("Proxy event loop ended.")
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def _sweep(self):
+        """ Close connections that other threads have aborted. """
+        for channel in list(self.channels.values()):
+            if self._stopped(channel):
+                self._lost(channel, "handle() received abort signal.")
+
+    def _drop_broken(self):
+        """
+        After a failed select(), close only the connections whose socket
+        is no longer valid.  If none is found, start a fresh selector.
+        """
+        broken = [channel for channel in list(self.channels.values())
+                  if channel.events and _invalid(channel.sock)]
+        for channel in broken:
+            self._lost(channel, "socket closed while registered")
+        if not broken:
+            self._rebuild_selector()
+
+    def _rebuild_selector(self):
+        old = self.selector
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+        for channel in list(self.channels.values()):
+            events = channel.events
+            channel.events = 0
+            if events:
+                try:
+                    self._register(channel, events)
+                except (KeyError, ValueError, OSError) as e:
+                    self._lost(channel, "selector error: %s" % e)
+                    continue
+                channel.events = events
+        try:
+            old.close()
+        except (OSError, ValueError):
+            pass
+
+    # Channel management
+    # -----------------------------
+
+    def _add(self, conn):
+        is_server = isinstance(conn, ServerConnection)
+        if is_server:
+            sock = conn.server_socket
+        else:
+            sock = conn.client_socket
+        if not sock or not conn.packet or conn.abort:
+            return
+        channel = _Channel(conn, sock, is_server)
+        sock.setblocking(False)
+        self.channels[conn] = channel
+        self._bypacket[channel.packet] = channel
+        channel.packet.wakeup = self.want_flush
+        self._update(channel)
+        if channel.packet.has_queued():
+            self._flushes.append(channel.packet)
+
+    def _discard(self, args):
+        conn, done = args
+        channel = self.channels.get(conn)
+        if channel:
+            self._remove(channel)
+        if done:
+            done.set()
+
+    def _remove(self, channel):
+        channel.closed = True
+        if channel.events:
+            try:
+                self.selector.unregister(channel.sock)
+            except (KeyError, ValueError):
+                pass
+            channel.events = 0
+        channel.packet.wakeup = None
+        if self.channels.get(channel.conn) is channel:
+            del self.channels[channel.conn]
+        if self._bypacket.get(channel.packet) is channel:
+            del self._bypacket[channel.packet]
+
+    def _update(self, channel):
+        """ Register the events this channel is waiting for. """
+        events = 0
+        if not channel.paused:
+            events |= selectors.EVENT_READ
+        if channel.writing:
+            events |= selectors.EVENT_WRITE
+        if events == channel.events:
+            return
+        try:
+            if events == 0:
+                self.selector.unregister(channel.sock)
+            elif channel.events == 0:
+                self._register(channel, events)
+            else:
+                self.selector.modify(channel.sock, events, channel)
+        except (KeyError, ValueError, OSError) as e:
+            return self._lost(channel, "selector error: %s" % e)
+        channel.events = events
+
+    def _register(self, channel, events):
+        try:
+            self.selector.register(channel.sock, events, channel)
+        except KeyError:
+            # The fd was reused after another thread closed a socket
+            # that was still registered; drop the stale channel.
+            stale = self.selector.get_map().get(channel.sock.fileno())
+            if stale is None or stale.data is None:
+                raise
+            self._remove(stale.data)
+            self.selector.register(channel.sock, events, channel)
+
+    def _stopped(self, channel):
+        conn = channel.conn
+        if channel.closed or conn.abort or channel.packet.abort:
+            return True
+        return channel.is_server and conn.client.abort
+
+    def _lost(self, channel, reason):
+        if channel.closed:
+            return
+        self._remove(channel)
+        conn = channel.conn
+        if channel.is_server:
+            conn.close_server(reason)
+        else:
+            conn.abort = True
+            conn.handle_ended()
+            self.proxy.removestaleclients()
+
+    # Reading
+    # -----------------------------
+
+    def _read(self, channel):
+        try:
+            channel.packet.feed()
+        except EOFError:
+            # This is not a true error, but means the connection closed.
+            return self._lost(channel, "handle EOF")
+        except socket.error:
+            return self._lost(channel, "handle socket.error")
+        self._dispatch(channel)
+
+    def _dispatch(self, channel):
+        """ Handle every complete frame in the receive buffer. """
+        packet = channel.packet
+        while not self._stopped(channel) and packet.has_frame():
+            try:
+                pkid, orig_packet = packet.grabpacket()
+            except Exception as e:
+                return self._lost(
+                    channel, "handle Exception: %s TRACEBACK: \n%s" % (
+                        e, traceback.format_exc()))
+
+            if self._blocking(channel, pkid, orig_packet):
+                channel.paused = True
+                self._update(channel)
+                t = threading.Thread(target=self._handle_off_loop,
+                                     args=(channel, pkid, orig_packet))
+                t.daemon = True
+                t.start()
+                return
+            failed = self._handle(channel, pkid, orig_packet)
+            if failed:
+                return self._lost(channel, failed)
+        if self._stopped(channel):
+            self._lost(channel, "handle() received abort signal.")
+
+    def _blocking(self, channel, pkid, orig_packet):
+        """ True if this packet's handler may block the loop. """
+        conn = channel.conn
+        if channel.is_server:
+            if conn.state != PLAY:
+                return True
+            return (pkid == conn.pktCB.DISCONNECT[PKT] or
+                    pkid in conn.event_parsers)
+        if conn.state == STATUS:
+            # (cached) server list responses; answering them here saves
+            # a thread per ping.
+            return False
+        if conn.state == HANDSHAKE and pkid == conn.pktSB.HANDSHAKE[PKT]:
+            # a ping's handshake only reads its fields.  The requested
+            # state is the last byte (handshakes are never compressed).
+            return orig_packet[-1:] != bytes([STATUS])
+        if conn.state not in (PLAY, LOBBY):
+            return True
+        # plugin event handlers may be slow or wait on this connection.
+        return (pkid == conn.pktSB.CHAT_MESSAGE[PKT] or
+                pkid in conn.event_parsers)
+
+    def _handle(self, channel, pkid, orig_packet):
+        """ :returns: the reason to close the connection, if any. """
+        try:
+            channel.conn.handle_packet(pkid, orig_packet)
+        except Exception as e:
+            # the threaded engine would lose the handle() thread here.
+            return "handle Exception: %s TRACEBACK: \n%s" % (
+                e, traceback.format_exc())
+        return None
+
+    def _handle_off_loop(self, channel, pkid, orig_packet):
+        failed = self._handle(channel, pkid, orig_packet)
+        self._ops.append((self._resume, (channel, failed)))
+        self.wakeup()
+
+    def _resume(self, args):
+        channel, failed = args
+        if channel.closed:
+            return
+        if failed:
+            return self._lost(channel, failed)
+        channel.paused = False
+        self._update(channel)
+        self._dispatch(channel)
+
+    # Writing
+    # -----------------------------
+
+    def _flush(self):
+        pending = set()
+        while self._flushes:
+            pending.add(self._flushes.popleft())
+        for packet in pending:
+            channel = self._bypacket.get(packet)
+            if channel and not channel.closed:
+                self._write(channel)
+
+    def _write(self, channel):
+        try:
+            writing = channel.packet.flush_nowait()
+        except socket.error:
+            return self._lost(channel, "socket error while sending")
+        except Exception as e:
+            return self._lost(channel, "could not encode packets: %s" % e)
+        if writing != channel.writing:
+            channel.writing = writing
+            self._update(channel)
+
+
+def _invalid(sock):
+    """ True if a socket was closed (or its descriptor is bad). """
+    try:
+        os.fstat(sock.fileno())
+    except (OSError, ValueError):
+        return True
+    return False
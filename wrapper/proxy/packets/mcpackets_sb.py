@@ -7,6 +7,7 @@
 
 from __future__ import print_function
 from proxy.utils.constants import *
+from proxy.packets.tables import get_table
 
 """
 Ways to reference packets by names and not hard-coded numbers.
@@ -26,6 +27,14 @@ set something False/unimplemented using 0xEE
 """
 
 
+def get_packets(protocol):
+    """
+    The shared, read-only packet table for `protocol`, built once.  Use
+    this instead of Packets(protocol) (see proxy/packets/tables.py).
+    """
+    return get_table(Packets, protocol)
+
+
 class Packets(object):
     def __init__(self, protocol):
         # not supporting 1.9 and 1.12 snapshots due to high instability/changes
@@ -10,11 +10,20 @@
 
 # standard
 from collections import deque
+import errno
 import io  # PY3
 import json
+import socket
 import struct
+import threading
 import zlib
 import sys
+from timeit import default_timer
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = False
 # import StringIO
 
 # local
@@ -59,6 +68,147 @@ _CODERS = {
     "rest": 90,
     "raw": 90
 }
+
+# size of each socket read into a connection's receive buffer
+_RECV_SIZE = 1024 * 64
+
+# most bytes flush() will join into one encrypt/sendall call
+_SEND_BATCH = 1024 * 256
+
+# Priority lanes (see Packet.set_lanes()).  With lanes, batches are
+# kept small so a control packet never waits behind much bulk data.
+LANE_CONTROL = 0
+LANE_INTERACTIVE = 1
+LANE_BULK = 2
+_LANE_BATCH = 1024 * 64
+# bytes of credit a lane gets per round for each unit of its weight
+_LANE_QUANTUM = 1024 * 4
+
+# fixed width types that can be grouped into a single struct
+_FIXED = {
+    UBYTE: "B",
+    BYTE: "b",
+    INT: "i",
+    SHORT: "h",
+    USHORT: "H",
+    LONG: "q",
+    DOUBLE: "d",
+    FLOAT: "f",
+    BOOL: "b"
+}
+
+# type lists already compiled by `_compile()`
+_COMPILED = {}
+
+# shared pool for compressing/encrypting large frames; see
+# `configure_workers()`.  None means everything runs inline.
+_WORKERS = None
+# smallest frame (or event loop batch) that is worth handing off
+_WORKER_CUTOFF = 1024 * 32
+# endregion
+
+
+# region Workers
+# ------------------------------------------------
+
+def configure_workers(workers, cutoff):
+    """
+    Start the worker pool used for large frames (called once by the
+    Proxy).  zlib and the AES cipher release the GIL, so the workers
+    use other cores while the connection threads carry on.
+
+    :param workers: pool size.  0 keeps all work inline.
+    :param cutoff: frames/batches smaller than this stay inline.
+    """
+    global _WORKERS, _WORKER_CUTOFF
+    _WORKER_CUTOFF = cutoff
+    if _WORKERS is None and workers > 0 and ThreadPoolExecutor:
+        _WORKERS = ThreadPoolExecutor(max_workers=workers)
+
+
+def _zlib_compress(payload, level):
+    """ Returns (compressed payload, seconds taken). """
+    start = default_timer()
+    result = zlib.compress(payload, level)
+    return result, default_timer() - start
+# endregion
+
+
+# region Codecs
+# ------------------------------------------------
+
+class _Codec(object):
+    """
+    A readpkt/sendpkt type list (like the ones in mcpackets_cb/sb),
+    compiled once.  Each run of fixed width fields is packed or unpacked
+    by one `struct.Struct`.  Variable fields (varint, string, slot, etc)
+    still go through the packet's own read/send methods.
+
+    steps are tuples of (type, struct, field count, bool positions).
+    For variable fields, struct is None.
+    """
+    __slots__ = ("steps",)
+
+    def __init__(self, args):
+        self.steps = []
+        run = []
+        for arg in args:
+            if arg in _FIXED:
+                run.append(arg)
+                continue
+            self._add_run(run)
+            run = []
+            self.steps.append((arg, None, 1, None))
+        self._add_run(run)
+
+    def _add_run(self, run):
+        if not run:
+            return
+        fmt = ">" + "".join([_FIXED[arg] for arg in run])
+        bools = tuple([i for i, arg in enumerate(run) if arg == BOOL])
+        self.steps.append((None, struct.Struct(fmt), len(run), bools))
+
+    def read(self, packet):
+        result = []
+        for arg, codec, count, bools in self.steps:
+            if codec is None:
+                result.append(packet._PKTREAD[arg]())
+                continue
+            values = codec.unpack(packet.read_data(codec.size))
+            if bools:
+                values = list(values)
+                for i in bools:
+                    values[i] = values[i] == 1
+            result.extend(values)
+        return result
+
+    def write(self, packet, payload):
+        parts = []
+        x = 0
+        for arg, codec, count, bools in self.steps:
+            if codec is None:
+                parts.append(packet._PKTSEND[arg](payload[x]))
+                x += 1
+                continue
+            values = payload[x:x + count]
+            if bools:
+                values = list(values)
+                for i in bools:
+                    values[i] = 1 if values[i] else 0
+            parts.append(codec.pack(*values))
+            x += count
+        return b"".join(parts)
+
+
+def _compile(args):
+    """ Returns the compiled `_Codec` for a list of types. """
+    key = tuple(args)
+    try:
+        return _COMPILED[key]
+    except KeyError:
+        codec = _Codec(key)
+        _COMPILED[key] = codec
+        return codec
 # endregion
 
 
@@ -68,47 +218,79 @@ class Packet(object):
         self.socket = sock
         self.obj = obj
         self.log = self.obj.log
-        self.recvCipher = None
         self.sendCipher = None
         self.compressThreshold = -1
         self.compression = False
+        # zlib level for packets this side compresses (set by the
+        # connection from the "compression-level" configs).
+        self.compress_level = zlib.Z_DEFAULT_COMPRESSION
         self.abort = False
 
+        # receive buffer.  Socket data is read in large chunks with
+        # recv_into and decrypted as it arrives; frames are then
+        # sliced out of it.  _rpos is the read position.
+        self._rbuf = bytearray()
+        self._rpos = 0
+        self._rchunk = bytearray(_RECV_SIZE)
+        self._rview = memoryview(self._rchunk)
+        self._recvcipher = None
+
         # this is set by the calling class/method.  Not presently used here,
         #  but could be. maybe to decide which metadata parser to use?
         self.version = self.obj.javaserver.protocolVersion
         self.buffer = io.BytesIO()  # Py3
         # self.buffer = StringIO.StringIO()
 
+        # running totals; see compression_stats()
+        self._stats = {
+            "compressed": 0,
+            "compress_in": 0,
+            "compress_out": 0,
+            "compress_time": 0.0,
+            "decompressed": 0,
+            "decompress_in": 0,
+            "decompress_out": 0,
+            "decompress_time": 0.0
+        }
+
+        # self.queue is the only queue unless set_lanes() is used, when
+        # it becomes the interactive lane.
         self.queue = deque([])
+        self.control = deque()
+        self.bulk = deque()
+        self.lane_of = {}
+        self.follow_bulk = set()
+        self.barriers = set()
+        self.lane_weights = (4, 1)
+        self._deficit = [0, 0]
+        self._barrier = False
+        # set whenever something is queued, so the flusher can sleep
+        self._queued = threading.Event()
+
+        # send queue limits (see set_queue_limits()).  _qbytes is only
+        # kept while a limit is set, and only while holding _qlock.
+        self.high_water = 0
+        self.low_water = 0
+        self.hard_limit = 0
+        self.droppable = set()
+        self.coalesce = set()
+        self.dropped = 0
+        self.coalesced = 0
+        self._congested = False
+        self._qbytes = 0
+        self._latest = {}
+        self._qlock = threading.Lock()
+
+        # Event loop engine only (see proxy/eventloop.py).  `wakeup` is
+        # called with this packet whenever something is queued. _wbuf
+        # holds encrypted bytes the socket has not taken yet.
+        self.wakeup = None
+        self._wbuf = bytearray()
+        # batch being encoded on the worker pool (a Future)
+        self._inflight = None
 
         # encode/decode for NBT operations
-        self._ENCODERS = {
-            1: self.send_byte,
-            2: self.send_short,
-            3: self.send_int,
-            4: self.send_long,
-            5: self.send_float,
-            6: self.send_double,
-            7: self.send_byte_array,
-            8: self.send_short_string,
-            9: self.send_list,
-            10: self.send_comp,
-            11: self.send_int_array
-        }
-        self._DECODERS = {
-            1: self.read_byte,
-            2: self.read_short,
-            3: self.read_int,
-            4: self.read_long,
-            5: self.read_float,
-            6: self.read_double,
-            7: self.read_bytearray,
-            8: self.read_short_string,
-            9: self.read_list,
-            10: self.read_comp,
-            11: self.read_int_array
-        }
+        self._nbt_codecs()
 
         # packet send/read operations
         self._PKTSEND = {
@@ -161,8 +343,57 @@ class Packet(object):
             100: self.read_none
         }
 
+    @property
+    def recvCipher(self):
+        return self._recvcipher
+
+    @recvCipher.setter
+    def recvCipher(self, cipher):
+        """
+        Encryption starts mid-stream.  Anything already buffered beyond
+        the current read position arrived encrypted, so it gets
+        decrypted now.
+        """
+        self._recvcipher = cipher
+        if cipher is not None and self._rpos < len(self._rbuf):
+            self._rbuf[self._rpos:] = cipher.update(
+                bytes(self._rbuf[self._rpos:]))
+
+    def _nbt_codecs(self):
+        """ Sets up the NBT tag type -> method tables. """
+        self._ENCODERS = {
+            1: self.send_byte,
+            2: self.send_short,
+            3: self.send_int,
+            4: self.send_long,
+            5: self.send_float,
+            6: self.send_double,
+            7: self.send_byte_array,
+            8: self.send_short_string,
+            9: self.send_list,
+            10: self.send_comp,
+            11: self.send_int_array,
+            12: self.send_long_array
+        }
+        self._DECODERS = {
+            1: self.read_byte,
+            2: self.read_short,
+            3: self.read_int,
+            4: self.read_long,
+            5: self.read_float,
+            6: self.read_double,
+            7: self.read_byte_array,
+            8: self.read_short_string,
+            9: self.read_list,
+            10: self.read_comp,
+            11: self.read_int_array,
+            12: self.read_long_array
+        }
+
     def close(self):
         self.abort = True
+        # wake the flusher so it can end
+        self._queued.set()
 
     def hexdigest(self, sh):
         d = int(sh.hexdigest(), 16)
@@ -172,34 +403,113 @@ class Packet(object):
 
     def decompress(self, datalength, payload):
         if datalength > 0:  # it is compressed, unpack it
-            return zlib.decompress(payload)
+            return self._inflate(payload)
         else:
             return payload
 
+    def _deflate(self, payload, compressed=None):
+        """
+        :param compressed: the `_zlib_compress()` result if a worker
+            already did the compressing.
+        """
+        if compressed is None:
+            compressed = _zlib_compress(payload, self.compress_level)
+        result, elapsed = compressed
+        stats = self._stats
+        stats["compress_time"] += elapsed
+        stats["compressed"] += 1
+        stats["compress_in"] += len(payload)
+        stats["compress_out"] += len(result)
+        return result
+
+    def _inflate(self, payload):
+        start = default_timer()
+        result = zlib.decompress(payload)
+        stats = self._stats
+        stats["decompress_time"] += default_timer() - start
+        stats["decompressed"] += 1
+        stats["decompress_in"] += len(payload)
+        stats["decompress_out"] += len(result)
+        return result
+
+    def compression_stats(self):
+        """
+        Compression work done by this connection.  Counts and byte totals
+        for each direction, the time spent (seconds) and the ratio
+        (compressed bytes / uncompressed bytes, lower is better).
+        """
+        stats = dict(self._stats)
+        stats["level"] = self.compress_level
+        stats["compress_ratio"] = (
+            stats["compress_out"] / float(stats["compress_in"])
+            if stats["compress_in"] else 0.0)
+        stats["decompress_ratio"] = (
+            stats["decompress_in"] / float(stats["decompress_out"])
+            if stats["decompress_out"] else 0.0)
+        return stats
+
     def pack_varint(self, val):
-        total = b''
+        total = bytearray()
         if val < 0:
             val = (1 << 32) + val
         while val >= 0x80:
-            bits = val & 0x7F
+            total.append(0x80 | (val & 0x7F))
             val >>= 7
-            total += struct.pack('B', (0x80 | bits))
-        bits = val & 0x7F
-        total += struct.pack('B', bits)
-        return total
+        total.append(val)
+        return bytes(total)
 
     def unpack_varint(self):
         total = 0
         shift = 0
         val = 0x80
         while val & 0x80:
-            val = struct.unpack('B', self.recv(1))[0]
+            if self._rpos >= len(self._rbuf):
+                self._fill(1)
+            val = self._rbuf[self._rpos]
+            self._rpos += 1
             total |= ((val & 0x7F) << shift)
             shift += 7
         if total & (1 << 31):
             total = total - (1 << 32)
         return total
 
+    def unpack_varint_from(self, data, offset=0):
+        """
+        Read a varint directly out of a bytes object (no socket or
+        buffer involved).
+
+        :returns: a tuple of (value, offset of the next byte)
+        """
+        total = 0
+        shift = 0
+        val = 0x80
+        raw = bytearray(data[offset:offset + 5])
+        pos = 0
+        while val & 0x80:
+            val = raw[pos]
+            total |= ((val & 0x7F) << shift)
+            shift += 7
+            pos += 1
+        if total & (1 << 31):
+            total = total - (1 << 32)
+        return total, offset + pos
+
+    def wants_packet(self, pkid):
+        """
+        Determine if the owning connection has a parser for this
+        packet in its' current state.  Packets that no parser is
+        interested in are never decompressed and are forwarded
+        as the original bytes.  Owners with no parsers (like the
+        proxy's pollserver) get every packet decoded.
+        """
+        parsers = getattr(self.obj, "parsers", None)
+        if not parsers:
+            return True
+        try:
+            return pkid in parsers[self.obj.state]
+        except (KeyError, AttributeError):
+            return True
+
     def grab_packet_uncomp(self):
         # unpacking varint recv's the varint byte(s)
         packet_length_rest = self.unpack_varint()
@@ -220,7 +530,7 @@ class Packet(object):
                 packet_length_rest -
                 len(self.pack_varint(packet_length_rest))
             )
-            uncomp_data = zlib.decompress(comp_payload)
+            uncomp_data = self._inflate(comp_payload)
 
         return uncomp_data, comp_payload, uncomp_data_length
 
@@ -252,22 +562,33 @@ class Packet(object):
             # using augmented assignment in the next line seems to BREAK this
             length = packet_length - len(self.pack_varint(datalength))
         orig_payload = self.recv(length)
-        payload_read = orig_payload
 
-        if datalength > 0:  # it is compressed, unpack it
-            payload_read = zlib.decompress(orig_payload)
+        if datalength > 0:
+            # inflate only as far as the packet ID (a varint is 5 bytes max)
+            head = zlib.decompressobj().decompress(orig_payload, 5)
+        else:
+            head = orig_payload
+        pkid, offset = self.unpack_varint_from(head)
 
-        self.buffer = io.BytesIO(payload_read)
-        pkid = self.read_varint()
+        # passthrough - packets nobody parses are forwarded untouched.
+        if self.wants_packet(pkid):
+            if datalength > 0:  # it is compressed, unpack it
+                self.buffer = io.BytesIO(self._inflate(orig_payload))
+            else:
+                self.buffer = io.BytesIO(orig_payload)
+            self.buffer.seek(offset)
+        else:
+            self.buffer = io.BytesIO()
         return pkid, self.pack_varint(datalength) + orig_payload
 
     def socket_transmit(self, packet):
         if self.sendCipher is None:
-            self.socket.send(packet)
+            self.socket.sendall(packet)
         else:
-            self.socket.send(self.sendCipher.update(packet))
+            self.socket.sendall(self.sendCipher.update(packet))
 
-    def handle_compression(self, compression_threshhold, payload):
+    def handle_compression(self, compression_threshhold, payload,
+                           compressed=None):
         """  # noqa
 
         Visual layout of packets:
@@ -285,8 +606,8 @@ class Packet(object):
         if compression_threshhold > -1:
             # compose compressed packet
             if len(payload) > self.compressThreshold:
-                pktcomp = self.pack_varint(len(payload)) + zlib.compress(
-                    payload)
+                pktcomp = self.pack_varint(len(payload)) + self._deflate(
+                    payload, compressed)
                 return self.pack_varint(len(pktcomp)) + pktcomp
             else:
                 packet = self.pack_varint(0) + payload
@@ -295,23 +616,324 @@ class Packet(object):
             # compose uncompressed packet
             return self.pack_varint(len(payload)) + payload
 
+    def wait_for_queue(self, timeout):
+        """
+        Block until something is queued (or the timeout passes).  Returns
+        True if there may be packets to flush.
+        """
+        queued = self._queued.wait(timeout)
+        # anything queued from here on sets the event again.
+        self._queued.clear()
+        return queued or self.has_queued()
+
+    def has_queued(self):
+        return len(self.queue) > 0 or len(self.control) > 0 or \
+            len(self.bulk) > 0
+
     def flush(self):
+        """
+        Send everything in the queue.  Frames are joined into batches
+        so that each batch costs one cipher update and one sendall.
+
+        Large batches are encrypted on the worker pool while the batch
+        before them is being sent.  One is encrypted at a time, so the
+        cipher stream stays in order.
+        """
+        pending = None
+        while self.has_queued():
+            data = b"".join(self._compress_batch(self._next_batch()))
+            if self.sendCipher is None:
+                self.socket.sendall(data)
+                continue
+            encrypted = None
+            if pending is not None:
+                encrypted = pending.result()
+                pending = None
+            if _WORKERS is not None and len(data) >= _WORKER_CUTOFF:
+                pending = _WORKERS.submit(self.sendCipher.update, data)
+                data = None
+            else:
+                data = self.sendCipher.update(data)
+            if encrypted is not None:
+                self.socket.sendall(encrypted)
+            if data is not None:
+                self.socket.sendall(data)
+        if pending is not None:
+            self.socket.sendall(pending.result())
+
+    def flush_nowait(self):
+        """
+        Event loop version of flush() for non-blocking sockets.  Queued
+        frames are encrypted into the write buffer and the socket is
+        given as much of it as it will take.
+
+        Large batches are encoded on the worker pool instead of the loop
+        thread.  Only one batch is out at a time, so the write buffer
+        (and the cipher stream) stay in order.  `wakeup` is called when
+        it is done.
+
+        :returns: True if bytes are still waiting to be sent.
+        """
+        while True:
+            if self._inflight is not None:
+                if not self._inflight.done():
+                    break
+                inflight = self._inflight
+                self._inflight = None
+                self._wbuf += inflight.result()
+            if not self.has_queued():
+                break
+            items = self._next_batch()
+            size = sum([len(payload) for compression, payload in items])
+            if _WORKERS is not None and size >= _WORKER_CUTOFF:
+                self._inflight = _WORKERS.submit(self._encode_batch, items)
+                self._inflight.add_done_callback(self._batch_done)
+            else:
+                self._wbuf += self._encode_batch(items)
+        if self._wbuf:
+            try:
+                sent = self.socket.send(self._wbuf)
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                sent = 0
+            del self._wbuf[:sent]
+        return len(self._wbuf) > 0
+
+    def _next_batch(self):
+        """ Pops the next batch of (compression, payload). """
+        if self.high_water or self.hard_limit:
+            with self._qlock:
+                return self._next_batch_limited()
+        return self._pop_batch()
+
+    def _pop_batch(self):
+        if self.lane_of:
+            return self._pop_lanes()
+        items = []
+        size = 0
+        while len(self.queue) > 0 and size < _SEND_BATCH:
+            # grab next packet (compression, `payload`)
+            item = self.queue.popleft()
+            items.append(item)
+            size += len(item[1])
+        return items
+
+    def _pop_lanes(self):
+        """
+        Control packets go first.  Then the interactive and bulk lanes
+        share the rest of the batch by weight (deficit round robin), so
+        neither can starve the other.
+        """
+        items = []
+        size = 0
+        while len(self.control) > 0 and size < _LANE_BATCH:
+            item = self.control.popleft()
+            items.append(item)
+            size += len(item[1])
+        lanes = ((0, self.queue, self.lane_weights[0]),
+                 (1, self.bulk, self.lane_weights[1]))
+        while size < _LANE_BATCH and (
+                len(self.queue) > 0 or len(self.bulk) > 0):
+            for index, lane, weight in lanes:
+                if len(lane) == 0:
+                    self._deficit[index] = 0
+                    continue
+                self._deficit[index] += weight * _LANE_QUANTUM
+                while len(lane) > 0 and \
+                        len(lane[0][1]) <= self._deficit[index]:
+                    item = lane.popleft()
+                    items.append(item)
+                    size += len(item[1])
+                    self._deficit[index] -= len(item[1])
+        if len(self.bulk) == 0:
+            self._barrier = False
+        return items
+
+    def _next_batch_limited(self):
+        """ _next_batch, keeping the queue accounting (holds _qlock). """
+        items = self._pop_batch()
+        size = 0
+        for index, item in enumerate(items):
+            if len(item) == 3:
+                # a coalescable packet; no longer replaceable
+                del self._latest[item[2]]
+                items[index] = item = (item[0], item[1])
+            size += len(item[1])
+        self._qbytes -= size
+        if self._congested and \
+                self._qbytes + len(self._wbuf) < self.low_water:
+            self._congested = False
+            self.log.info(
+                "%s send queue drained (%s packets dropped, %s coalesced"
+                " so far).", self._name(), self.dropped, self.coalesced)
+        return items
+
+    def _compress_batch(self, items):
+        """
+        Returns the frames for `items`.  Frames large enough to be worth
+        it are compressed on the worker pool, all at the same time.
+        """
+        frames = []
+        pending = []
+        for compression, payload in items:
+            if _WORKERS is not None and compression > -1 and \
+                    len(payload) > self.compressThreshold and \
+                    len(payload) >= _WORKER_CUTOFF:
+                future = _WORKERS.submit(
+                    _zlib_compress, payload, self.compress_level)
+                pending.append((len(frames), compression, payload, future))
+                frames.append(None)
+            else:
+                frames.append(self.handle_compression(compression, payload))
+        for index, compression, payload, future in pending:
+            frames[index] = self.handle_compression(
+                compression, payload, future.result())
+        return frames
+
+    def _encode_batch(self, items):
+        """ Compress and encrypt a batch (may run on a worker). """
+        data = b"".join(
+            [self.handle_compression(compression, payload)
+             for compression, payload in items])
+        if self.sendCipher is not None:
+            data = self.sendCipher.update(data)
+        return data
+
+    def _batch_done(self, future):
+        if self.wakeup:
+            self.wakeup(self)
+
+    def send_raw_untouched(self, payload, pkid=None):
+        """
+        :param pkid: optional; lets a congested queue recognize
+            `droppable`/`coalesce` packets.
+        """
+        self._enqueue(-1, payload, pkid)
+
+    def send_raw(self, payload, pkid=None):
+        self._enqueue(self.compressThreshold, payload, pkid)
+
+    def set_queue_limits(self, high, low, hard):
+        """
+        Bound the send queue (bytes; 0 means no limit).  Above `high`,
+        packets in `droppable` are dropped (those also in `coalesce`
+        replace the one still queued instead) until the queue drains
+        below `low`.  Above `hard`, the connection is closed.
+        """
+        self.high_water = high
+        self.low_water = low
+        self.hard_limit = hard
+
+    def set_lanes(self, lane_of, weights, follow_bulk=(), barriers=()):
+        """
+        Sort outgoing packets into priority lanes.
+
+        :param lane_of: dict of pkid: LANE_CONTROL/LANE_BULK.  Other
+            packets use LANE_INTERACTIVE.
+        :param weights: (interactive, bulk) share of each batch.
+        :param follow_bulk: pkids that must not overtake the bulk lane
+            (block changes behind their chunk).  They join the bulk
+            lane while it has anything queued.
+        :param barriers: like follow_bulk, and everything but control
+            packets follows them into the bulk lane until it is empty
+            (respawn or join game must not overtake the old world's
+            chunks, and the new world's packets must not overtake them).
+        """
+        self.lane_of = dict(lane_of)
+        self.lane_weights = tuple([max(1, weight) for weight in weights])
+        self.follow_bulk = set(follow_bulk) | set(barriers)
+        self.barriers = set(barriers)
+        # packets queued before this (the login) must not be overtaken
+        # by the control lane.
         while len(self.queue) > 0:
-            # grab next packet
-            packet_tuple = self.queue.popleft()
-            # see if it is compressed
-            compression = packet_tuple[0]
-            packet = packet_tuple[1]  # `payload`
-            trans_packet = self.handle_compression(compression, packet)
-            self.socket_transmit(trans_packet)
-
-    def send_raw_untouched(self, payload):
-        if not self.abort:
-            self.queue.append((-1, payload))
-
-    def send_raw(self, payload):
-        if not self.abort:
-            self.queue.append((self.compressThreshold, payload))
+            self.control.append(self.queue.popleft())
+
+    def _lane(self, pkid):
+        if not self.lane_of:
+            return self.queue
+        lane = self.lane_of.get(pkid, LANE_INTERACTIVE)
+        if lane == LANE_CONTROL:
+            return self.control
+        if lane == LANE_BULK:
+            return self.bulk
+        if len(self.bulk) > 0 and (
+                self._barrier or pkid in self.follow_bulk):
+            if pkid in self.barriers:
+                self._barrier = True
+            return self.bulk
+        return self.queue
+
+    def _enqueue(self, compression, payload, pkid):
+        if self.abort:
+            return
+        if self.high_water or self.hard_limit:
+            with self._qlock:
+                queued = self._enqueue_limited(compression, payload, pkid)
+            if queued is None:
+                return self._overflow()
+            if not queued:
+                return
+        else:
+            self._lane(pkid).append((compression, payload))
+        self._queued.set()
+        if self.wakeup:
+            self.wakeup(self)
+
+    def _enqueue_limited(self, compression, payload, pkid):
+        """
+        Called holding _qlock.  Returns True if queued, False if dropped
+        or coalesced, None if the hard limit is passed.
+        """
+        size = self._qbytes + len(self._wbuf)
+        if self.hard_limit and size > self.hard_limit:
+            return None
+        if self.high_water and size > self.high_water \
+                and not self._congested:
+            self._congested = True
+            self.log.warning(
+                "%s send queue is congested (%s bytes queued).  Dropping"
+                " droppable packets until it drains.", self._name(), size)
+        if self._congested and pkid in self.droppable:
+            if pkid not in self.coalesce:
+                self.dropped += 1
+                return False
+            item = self._latest.get(pkid)
+            if item is not None:
+                # replace the copy that is still waiting
+                self._qbytes += len(payload) - len(item[1])
+                item[0] = compression
+                item[1] = payload
+                self.coalesced += 1
+                return False
+            item = [compression, payload, pkid]
+            self._latest[pkid] = item
+            self._lane(pkid).append(item)
+        else:
+            self._lane(pkid).append((compression, payload))
+        self._qbytes += len(payload)
+        return True
+
+    def _overflow(self):
+        """ The hard limit was passed; close this connection. """
+        self.log.error(
+            "%s send queue passed its limit of %s bytes (the connection is"
+            " not keeping up) - disconnecting.", self._name(),
+            self.hard_limit)
+        self.abort = True
+        self.queue.clear()
+        self.control.clear()
+        self.bulk.clear()
+        self._queued.set()
+        self.obj.abort = True
+        # wake the blocked reader so the connection cleans up.
+        try:
+            self.socket.shutdown(2)
+        except (AttributeError, socket.error):
+            pass
+
+    def _name(self):
+        return getattr(self.obj, "username", "Proxy")
 
     def readpkt(self, args):
         """
@@ -331,11 +953,7 @@ class Packet(object):
                     same order the args were passed.
 
         """
-        result = []
-        for arg in args:
-            item = self._PKTREAD[arg]()
-            result.append(item)
-        return result
+        return _compile(args).read(self)
 
     def sendpkt(self, pkid, args, payload,):
         """
@@ -356,18 +974,9 @@ class Packet(object):
                             same order the args were passed.
 
                 """
-        result = b""  # PY 2-3
         # start with packet id
-        result += self.send_varint(pkid)
-        # append results to the result packet for each type
-        argcount = len(args)
-        if argcount == 0:
-            self.send_raw(result)
-            return result
-        for x, arg in enumerate(args):
-            pay = payload[x]
-            result += self._PKTSEND[arg](pay)
-        self.send_raw(result)
+        result = self.send_varint(pkid) + _compile(args).write(self, payload)
+        self.send_raw(result, pkid)
         return result
 
     # -- SENDING DATA TYPES -- #
@@ -437,7 +1046,8 @@ class Packet(object):
         r += self.send_byte(slot["count"])
         if self.version < PROTOCOL_PRE_RELEASE:
             r += self.send_short(slot["damage"])
-        if slot["nbt"]:
+        # (testing a LazyNBT's truth would decode it)
+        if isinstance(slot["nbt"], LazyNBT) or slot["nbt"]:
             r += self.send_tag(slot['nbt'])
         else:
             r += b"\x00"
@@ -498,6 +1108,9 @@ class Packet(object):
             elif value_type == 12:
                 b += self.send_varint(value)
 
+            elif value_type == 13:
+                b += self.send_tag(value)
+
             else:
                 self.log.error("Unsupported data type '%d' for"
                                " send_metadata() (Class Packet)", value_type)
@@ -568,7 +1181,8 @@ class Packet(object):
         return self.send_int(len(payload)) + payload
 
     def send_short_string(self, string_arg):
-        return self.send_short(len(string_arg)) + string_arg.encode("utf8")
+        encoded = string_arg.encode("utf8")
+        return self.send_short(len(encoded)) + encoded
 
     def send_list(self, tag):
         # Check that all values are the same type
@@ -604,10 +1218,17 @@ class Packet(object):
         r = self.send_int(len(values))
         return r + struct.pack(">%di" % len(values), *values)
 
+    def send_long_array(self, values):
+        r = self.send_int(len(values))
+        return r + struct.pack(">%dq" % len(values), *values)
+
     def send_tag(self, tag):
         """tag is what is found in the item 'nbt':
         This one is empty:
         {'nbt': {'type': 0}, 'count': 28, 'id': 5, 'damage': 1}"""
+        if isinstance(tag, LazyNBT) and not tag.loaded:
+            # nobody looked at it, so it can not have changed.
+            return tag.raw
         # send type indicator
         r = self.send_byte(tag['type'])
         if tag['type'] == 0:
@@ -622,21 +1243,68 @@ class Packet(object):
 
     # -- READING Methods  -- #
     # ---------------------- #
-    def recv(self, length):
-        if length > 200:
-            d = b""  # Py 2-3
-            while len(d) < length:
-                m = length - len(d)
-                if m > 5000:
-                    m = 5000
-                d += self.socket.recv(m)
+    def _fill(self, length):
+        """
+        Read from the socket until at least `length` unread bytes are
+        in the receive buffer.
+        """
+        # discard consumed bytes once they make up most of the buffer
+        if self._rpos and self._rpos >= len(self._rbuf) // 2:
+            del self._rbuf[:self._rpos]
+            self._rpos = 0
+        while len(self._rbuf) - self._rpos < length:
+            self._receive()
+
+    def _receive(self):
+        """ One recv_into the receive buffer (decrypting it). """
+        received = self.socket.recv_into(self._rchunk)
+        if received == 0:
+            raise EOFError("Packet stream ended (Client disconnected")
+        if self._recvcipher is None:
+            self._rbuf += self._rview[:received]
         else:
-            d = self.socket.recv(length)
-            if len(d) == 0:
-                raise EOFError("Packet stream ended (Client disconnected")
-        if self.recvCipher is None:
-            return d
-        return self.recvCipher.update(d)
+            self._rbuf += self._recvcipher.update(
+                bytes(self._rview[:received]))
+
+    def feed(self):
+        """
+        Event loop engine: read whatever a (non-blocking) socket has
+        ready into the receive buffer.  Follow with `has_frame()`.
+        """
+        if self._rpos and self._rpos >= len(self._rbuf) // 2:
+            del self._rbuf[:self._rpos]
+            self._rpos = 0
+        try:
+            self._receive()
+        except socket.error as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def has_frame(self):
+        """
+        True if a complete frame is in the receive buffer, meaning
+        grabpacket() can run without touching the socket.
+        """
+        if self._rpos >= len(self._rbuf):
+            return False
+        try:
+            length, offset = self.unpack_varint_from(self._rbuf, self._rpos)
+        except IndexError:
+            # the length varint itself is incomplete
+            return False
+        return len(self._rbuf) >= offset + length
+
+    def recv(self, length):
+        """
+        Returns the next `length` (decrypted) bytes of the stream.
+        """
+        if len(self._rbuf) - self._rpos < length:
+            self._fill(length)
+        start = self._rpos
+        self._rpos += length
+        # one copy out of the buffer.  The temporary view is released
+        # right away, so the buffer can still be resized.
+        return memoryview(self._rbuf)[start:self._rpos].tobytes()
 
     def read_data(self, length):
         d = self.buffer.read(length)
@@ -689,7 +1357,7 @@ class Packet(object):
         shift = 0
         val = 0x80
         while val & 0x80:
-            val = struct.unpack('B', self.read_data(1))[0]
+            val = ord(self.read_data(1))
             total |= ((val & 0x7F) << shift)
             shift += 7
         if total & (1 << 31):
@@ -784,13 +1452,9 @@ class Packet(object):
             elif data_type == 12:
                 meta_data[index] = (data_type, self.read_varint())
 
+            # NBT tag (1.12)
             elif data_type == 13:
-                self.log.error(
-                    "1.9 metadata found data type 13 'nbt tag',  "
-                    "which wrapper does not parse.. read as 'rest/raw'. "
-                    "Added in version 1.12 minecraft??"
-                )
-                meta_data[index] = (data_type, self.read_rest())
+                meta_data[index] = (data_type, self.read_nbt())
             else:
                 self.log.error(
                     "Unsupported data type '%d' for read_metadata_1_9()  "
@@ -852,7 +1516,7 @@ class Packet(object):
                 damage = self.read_short()
             else:
                 damage = -1
-            nbt = self.read_tag()
+            nbt = self.read_nbt()
             # nbtCount = self.read_ubyte()
             # nbt = self.read_data(nbtCount)
             payload = {"id": sid, "count": count, "damage": damage, "nbt": nbt}
@@ -910,9 +1574,165 @@ class Packet(object):
         size = self.read_int()
         return [self.read_int() for _ in xrange(size)]
 
+    def read_long_array(self):
+        size = self.read_int()
+        return list(struct.unpack(">%dq" % size, self.read_data(size * 8)))
+
+    def read_byte_array(self):
+        return self.read_data(self.read_int())
+
+    def read_nbt(self):
+        """
+        Reads a tag like read_tag(), but only finds where it ends.  The
+        tag's bytes are kept in a LazyNBT and decoded only if something
+        reads them.  An empty tag is returned as {"type": 0}.
+        """
+        start = self.buffer.tell()
+        tag_type = self.read_byte()
+        if tag_type == 0:
+            return {"type": 0}
+        name = self.read_short_string()
+        _skip_nbt(self.buffer, tag_type)
+        end = self.buffer.tell()
+        self.buffer.seek(start)
+        return LazyNBT(self.read_data(end - start), tag_type, name)
+
     def read_tag(self):
         a = {"type": self.read_byte()}
         if a["type"] != 0:
             a["name"] = self.read_short_string()
             a["value"] = self._DECODERS[a["type"]]()
         return a
+
+
+# region NBT
+# ------------------------------------------------
+
+# payload sizes of the fixed width NBT tag types
+_NBT_SIZES = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+_NBT_ARRAYS = {7: 1, 11: 4, 12: 8}
+_NBT_INT = struct.Struct(">i")
+_NBT_USHORT = struct.Struct(">H")
+_NBT_LIST = struct.Struct(">bi")
+
+
+def _skip_nbt(buf, tag_type):
+    """ Moves `buf` (a BytesIO) past one tag payload of `tag_type`. """
+    if tag_type in _NBT_SIZES:
+        buf.seek(_NBT_SIZES[tag_type], 1)
+    elif tag_type in _NBT_ARRAYS:
+        count = _NBT_INT.unpack(buf.read(4))[0]
+        buf.seek(count * _NBT_ARRAYS[tag_type], 1)
+    elif tag_type == 8:
+        buf.seek(_NBT_USHORT.unpack(buf.read(2))[0], 1)
+    elif tag_type == 9:
+        item_type, count = _NBT_LIST.unpack(buf.read(5))
+        if item_type in _NBT_SIZES:
+            buf.seek(count * _NBT_SIZES[item_type], 1)
+        else:
+            for _ in xrange(count):
+                _skip_nbt(buf, item_type)
+    elif tag_type == 10:
+        while True:
+            item_type = struct.unpack("b", buf.read(1))[0]
+            if item_type == 0:
+                return
+            buf.seek(_NBT_USHORT.unpack(buf.read(2))[0], 1)
+            _skip_nbt(buf, item_type)
+    else:
+        raise ValueError("Unknown NBT tag type %s" % tag_type)
+
+
+class _NBTReader(Packet):
+    """ Just enough of a Packet to run read_tag() over some bytes. """
+    # noinspection PyMissingConstructor
+    def __init__(self, raw):
+        self.buffer = io.BytesIO(raw)
+        self._nbt_codecs()
+
+    def read_data(self, length):
+        d = self.buffer.read(length)
+        if len(d) < length:
+            raise ValueError("NBT data ended early")
+        return d
+
+
+class LazyNBT(dict):
+    """
+    A slot's NBT tag, kept as the bytes it arrived as.  It is a normal
+    tag dict ({"type", "name", "value"}) to anything that reads it, but
+    "value" is only decoded the first time something needs it.  Until
+    then, send_tag() sends the original bytes back without re-encoding.
+    """
+    __slots__ = ("raw", "loaded")
+
+    def __init__(self, raw, tag_type, name):
+        # type and name are cheap and keep the dict non-empty (json's C
+        # encoder reads an empty dict subclass as "{}" without asking).
+        dict.__init__(self, type=tag_type, name=name)
+        self.raw = raw
+        self.loaded = False
+
+    def _load(self):
+        if not self.loaded:
+            dict.update(self, _NBTReader(self.raw).read_tag())
+            self.loaded = True
+        return self
+
+    def __getitem__(self, key):
+        if key == "value":
+            self._load()
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self._load(), key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self._load(), key)
+
+    def __contains__(self, key):
+        return key == "value" or dict.__contains__(self, key)
+
+    def __iter__(self):
+        return dict.__iter__(self._load())
+
+    def __len__(self):
+        return dict.__len__(self._load())
+
+    def __eq__(self, other):
+        return dict.__eq__(self._load(), other)
+
+    def __ne__(self, other):
+        return dict.__ne__(self._load(), other)
+
+    def __repr__(self):
+        return dict.__repr__(self._load())
+
+    def __reduce__(self):
+        # copies and pickles are plain tag dicts
+        return dict, (dict(self._load()),)
+
+    def get(self, key, default=None):
+        return dict.get(self._load(), key, default)
+
+    def keys(self):
+        return dict.keys(self._load())
+
+    def values(self):
+        return dict.values(self._load())
+
+    def items(self):
+        return dict.items(self._load())
+
+    def copy(self):
+        return dict(self._load())
+
+    def pop(self, key, *default):
+        return dict.pop(self._load(), key, *default)
+
+    def setdefault(self, key, default=None):
+        return dict.setdefault(self._load(), key, default)
+
+    def update(self, *args, **kwargs):
+        dict.update(self._load(), *args, **kwargs)
+# endregion
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 - 2018 - SurestTexas00 and Wrapper.py developer(s).
+# https://github.com/benbaptist/minecraft-wrapper
+# This program is distributed under the terms of the GNU
+# General Public License, version 3 or later.
+
+"""
+Read-only packet tables, built once per protocol version.
+
+mcpackets_cb/mcpackets_sb.Packets(protocol) still describe the packets
+(that is the place to add new protocol versions).  get_table() freezes
+one of those into a namedtuple of (pkid, parser tuple) entries that
+every player and connection on that protocol shares.
+
+    table.CHAT_MESSAGE[PKT]        # same use as a Packets instance
+    table.name_of(0x0f)            # "CHAT_MESSAGE" (diagnostics)
+"""
+
+from collections import namedtuple
+
+# {(Packets class, protocol): frozen table}
+_TABLES = {}
+
+
+def get_table(packets_class, protocol):
+    """
+    Returns the shared, frozen table of `packets_class(protocol)`.
+
+    :raises: ValueError for unsupported protocols (like Packets does).
+    """
+    key = (packets_class, protocol)
+    try:
+        return _TABLES[key]
+    except KeyError:
+        pass
+    table = _freeze(packets_class(protocol), protocol)
+    _TABLES[key] = table
+    return table
+
+
+def _freeze(packets, protocol):
+    entries = vars(packets)
+    names = sorted(entries)
+    values = []
+    reverse = {}
+    for name in names:
+        entry = entries[name]
+        if isinstance(entry, list):
+            entry = (entry[0], tuple(entry[1]))
+            # 0xEE marks a packet this protocol does not have.
+            if entry[0] != 0xee:
+                reverse.setdefault(entry[0], []).append(name)
+        values.append(entry)
+
+    base = namedtuple("%sTable" % type(packets).__module__.split(".")[-1],
+                      names)
+
+    class PacketTable(base):
+        __slots__ = ()
+
+        def name_of(self, pkid):
+            """
+            Packet name(s) for a pkid ("A/B" when ids are shared by
+            different connection states), or the hex id if unknown.
+            """
+            return "/".join(reverse.get(pkid, ("0x%02x" % pkid,)))
+
+        def names_of(self, pkid):
+            return tuple(reverse.get(pkid, ()))
+
+    PacketTable.protocol = protocol
+    return PacketTable(*values)
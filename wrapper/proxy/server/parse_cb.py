@@ -6,6 +6,7 @@
 # General Public License, version 3 or later.
 
 import json
+import struct
 
 from proxy.entity.entitybasics import Entity
 from proxy.utils.constants import *
@@ -322,7 +323,9 @@ class ParseCB(object):
         data = self.packet.readpkt(self.pktCB.JOIN_GAME[PARSER])
         self.client.gamemode = data[1]
         self.client.dimension = data[2]
+        self.server.dimension = data[2]
         self.client.server_eid = data[0]
+        self.proxy.clients.reindex(self.client)
 
         return True
 
@@ -373,6 +376,7 @@ class ParseCB(object):
         data = self.packet.readpkt([INT, UBYTE, UBYTE, STRING])
         # "int:dimension|ubyte:difficulty|ubyte:gamemode|level_type:string")
         self.client.dimension = data[0]
+        self.server.dimension = data[0]
         self.client.difficulty = data[1]
         self.client.gamemode = data[2]
         self.client.level_type = data[3]
@@ -492,12 +496,81 @@ class ParseCB(object):
     # chunk processing
     def play_chunk_data(self):
         """CHUNK_DATA
-        Cache first 49 raw chunks for use with respawning."""
-        if len(self.client.first_chunks) < 49:
-            data = self.packet.readpkt([RAW, ])
-            self.client.first_chunks.append(data)
+        Keep the first 49 chunks for use with respawning (in the
+        client's first_chunks).  Chunks the proxy still holds are kept
+        up to date."""
+        cache = self.proxy.chunk_cache
+        chunkx, chunkz, full = self.packet.readpkt([INT, INT, BOOL])
+        key = self._chunk_key(chunkx, chunkz)
+        first = full and len(self.client.first_chunks) < 49
+        if not (first or key in cache):
+            return True
+        data = struct.pack(">ii?", chunkx, chunkz, full) + self.packet.readpkt(
+            [RAW, ])[0]
+        if not full:
+            # only some sections of the chunk
+            cache.patch(key, self.pktCB.CHUNK_DATA[PKT], data)
+            return True
+        chunk = cache.put(key, data)
+        if first:
+            self.client.first_chunks.append(chunk)
+            if len(self.client.first_chunks) == 49:
+                self.server.advance("chunks_ready")
         return True
 
+    def play_block_change(self):
+        if self.server.version >= PROTOCOL_1_8START:
+            x, y, z = self.packet.readpkt([POSITION])[0]
+        else:
+            x, y, z = self.packet.readpkt([INT, UBYTE, INT])
+        key = self._chunk_key(x >> 4, z >> 4)
+        if key in self.proxy.chunk_cache:
+            block = self.packet.readpkt([RAW, ])[0]
+            self._patch_block(key, (x, y, z), block)
+        return True
+
+    def play_multi_block_change(self):
+        chunkx, chunkz = self.packet.readpkt([INT, INT])
+        key = self._chunk_key(chunkx, chunkz)
+        if key in self.proxy.chunk_cache:
+            data = struct.pack(">ii", chunkx, chunkz) + self.packet.readpkt(
+                [RAW, ])[0]
+            self.proxy.chunk_cache.patch(
+                key, self.pktCB.MULTI_BLOCK_CHANGE[PKT], data)
+        return True
+
+    def play_explosion(self):
+        """ The blocks an explosion destroyed become air. """
+        x, y, z, radius, count = self.packet.readpkt(
+            [FLOAT, FLOAT, FLOAT, FLOAT, INT])
+        records = self.packet.readpkt([RAW, ])[0]
+        cache = self.proxy.chunk_cache
+        air = self.packet.send_varint(0)
+        if self.server.version < PROTOCOL_1_8START:
+            # block id and metadata
+            air += self.packet.send_ubyte(0)
+        x, y, z = int(x), int(y), int(z)
+        for offset in range(0, min(count * 3, len(records)), 3):
+            dx, dy, dz = struct.unpack_from(">bbb", records, offset)
+            position = x + dx, y + dy, z + dz
+            key = self._chunk_key(position[0] >> 4, position[2] >> 4)
+            if 0 <= position[1] < 256 and key in cache:
+                self._patch_block(key, position, air)
+        return True
+
+    def _patch_block(self, key, position, block):
+        """ Record a BLOCK_CHANGE of `position` to `block` (raw id). """
+        if self.server.version >= PROTOCOL_1_8START:
+            data = self.packet.send_position(position) + block
+        else:
+            data = struct.pack(">iBi", *position) + block
+        self.proxy.chunk_cache.patch(
+            key, self.pktCB.BLOCK_CHANGE[PKT], data, position)
+
+    def _chunk_key(self, chunkx, chunkz):
+        return ((self.server.ip, self.server.port), self.server.dimension,
+                chunkx, chunkz)
+
     # Window processing/ inventory tracking
     # ---------------------------------------
 
@@ -576,11 +649,10 @@ class ParseCB(object):
         if dt[2] in self.ent_control.objecttypes:
             objectname = self.ent_control.objecttypes[
                 dt[2]]
-            newobject = {dt[0]: Entity(dt[0], entityuuid, dt[2], objectname,
-                                       (dt[3], dt[4], dt[5],), (dt[6], dt[7]),
-                                       True, self.client.username)}
-
-            self.ent_control.entities.update(newobject)
+            self.ent_control.add_entity(
+                Entity(dt[0], entityuuid, dt[2], objectname,
+                       (dt[3], dt[4], dt[5],), (dt[6], dt[7]),
+                       True, self.client.username, self.client.dimension))
         return True
 
     def play_spawn_mob(self):
@@ -613,12 +685,10 @@ class ParseCB(object):
         if dt[2] in self.ent_control.entitytypes:
             mobname = self.ent_control.entitytypes[
                 dt[2]]["name"]
-            newmob = {dt[0]: Entity(dt[0], entityuuid, dt[2], mobname,
-                                    (dt[3], dt[4], dt[5],),
-                                    (dt[6], dt[7], dt[8]),
-                                    False, self.client.username)}
-
-            self.ent_control.entities.update(newmob)
+            self.ent_control.add_entity(
+                Entity(dt[0], entityuuid, dt[2], mobname,
+                       (dt[3], dt[4], dt[5],), (dt[6], dt[7], dt[8]),
+                       False, self.client.username, self.client.dimension))
         return True
 
     def play_entity_relative_move(self):
@@ -634,10 +704,7 @@ class ParseCB(object):
             data = self.packet.readpkt([VARINT, BYTE, BYTE, BYTE])
         # ("varint:eid|byte:dx|byte:dy|byte:dz")
 
-        entupd = self.ent_control.getEntityByEID(
-            data[0])
-        if entupd:
-            entupd.move_relative((data[1], data[2], data[3]))
+        self.ent_control.move_entity(data[0], (data[1], data[2], data[3]))
         return True
 
     def play_entity_teleport(self):
@@ -656,10 +723,7 @@ class ParseCB(object):
 
         # ("varint:eid|int:x|int:y|int:z|byte:yaw|byte:pitch")
 
-        entupd = self.ent_control.getEntityByEID(
-            data[0])
-        if entupd:
-            entupd.teleport((data[1], data[2], data[3]))
+        self.ent_control.teleport_entity(data[0], (data[1], data[2], data[3]))
         return True
 
     def play_attach_entity(self):
@@ -780,8 +844,6 @@ class ParseCB(object):
 
         for _ in range(entitycount):
             eid = self.packet.readpkt(parser)[0]
-            # noinspection PyBroadException
-            if eid in self.ent_control.entities:
-                self.ent_control.entities.pop(eid, None)
+            self.ent_control.remove_entity(eid)
 
         return True
@@ -13,6 +13,7 @@ import time
 import traceback
 
 # local
+from api.helpers import islanaddress
 from proxy.packets.packet import Packet
 from proxy.server.parse_cb import ParseCB
 from proxy.packets import mcpackets_sb
@@ -55,10 +56,25 @@ class ServerConnection(object):
         self.packet = None
         self.parse_cb = None
 
+        # login progress, for the client's server switching (see
+        # wait_for()).  close_server() wakes anyone waiting.
+        self.progress = threading.Condition()
+        self.logged_in = False
+        self.joined = False
+        # the client has its first (49) chunks
+        self.chunks_ready = False
+        # set once no more packets will be handled
+        self.stopped = threading.Event()
+
         # dictionary of parser packet constants and associated parsing methods
         self.parsers = {}
+        # PLAY packets whose parsers call registered plugin events
+        self.event_parsers = set()
         self.entity_controls = self.proxy.ent_config["enable-entity-controls"]
         self.version = -1
+        # this server's dimension for the player (the client's may be
+        # the hub's lobby dimension)
+        self.dimension = 0
 
         # self parsers get updated here
         self._refresh_server_version()
@@ -73,8 +89,8 @@ class ServerConnection(object):
         """Get serverversion for mcpackets use"""
 
         self.version = self.proxy.javaserver.protocolVersion
-        self.pktSB = mcpackets_sb.Packets(self.version)
-        self.pktCB = mcpackets_cb.Packets(self.version)
+        self.pktSB = mcpackets_sb.get_packets(self.version)
+        self.pktCB = mcpackets_cb.get_packets(self.version)
         self.parse_cb = ParseCB(self, self.packet)
         self._define_parsers()
 
@@ -98,11 +114,19 @@ class ServerConnection(object):
         # start packet handler
         self.packet = Packet(self.server_socket, self)
         self.packet.version = self.client.clientversion
+        if islanaddress(self.ip):
+            self.packet.compress_level = self.proxy.compress_level_lan
+        else:
+            self.packet.compress_level = self.proxy.compress_level
+        self.packet.set_queue_limits(*self.proxy.send_queue_limits)
 
         # define parsers
         self.parse_cb = ParseCB(self, self.packet)
         self._define_parsers()
 
+        # the event loop engine does its own flushing
+        if self.proxy.eventloop:
+            return
         t = threading.Thread(target=self.flush_loop, args=())
         t.daemon = True
         t.start()
@@ -110,9 +134,9 @@ class ServerConnection(object):
     def flush_loop(self):
         rate = self.flush_rate
         while not self.abort:
-            time.sleep(rate)
             try:
-                self.packet.flush()
+                if self.packet.wait_for_queue(rate):
+                    self.packet.flush()
             except AttributeError:
                 self.log.debug(
                     "%s server packet instance gone.", self.username
@@ -125,6 +149,12 @@ class ServerConnection(object):
                        self.username)
 
     def handle(self):
+        try:
+            self._handle()
+        finally:
+            self.stopped.set()
+
+    def _handle(self):
         while not (self.abort or self.client.abort):
             # get packet
             try:
@@ -142,21 +172,34 @@ class ServerConnection(object):
                         e, traceback.format_exc())
                 )
 
-            # parse it
-            # send packet if parsing passed and client in play mode.
-            # all packets are parsed, but only play mode ones are transmitted.
-            if self.parse(pkid) and self.client.state == PLAY:
-                try:
-                    # self.parse will reject (False) any packet proxy modifies.
-                    self.client.packet.send_raw_untouched(orig_packet)
-                except Exception as e:
-                    return self.close_server(
-                        "handle() could not send packet '%s'.  "
-                        "Exception: %s TRACEBACK: \n%s" % (
-                            pkid, e, traceback.format_exc())
-                    )
+            if not self.handle_packet(pkid, orig_packet):
+                return
         return self.close_server("handle() received abort signal.")
 
+    def handle_packet(self, pkid, orig_packet):
+        """
+        Parse one packet and pass it on to the client. Used by both
+        handle() and the event loop engine.
+
+        :returns: False if the connection was closed.
+        """
+        # send packet if parsing passed and client in play mode.
+        # all packets are parsed, but only play mode ones are transmitted.
+        if self.parse(pkid) and self.client.state == PLAY:
+            try:
+                # self.parse will reject (False) any packet proxy modifies.
+                self.client.packet.send_raw_untouched(orig_packet, pkid)
+            except Exception as e:
+                self.close_server(
+                    "handle() could not send packet '%s'.  "
+                    "Exception: %s TRACEBACK: \n%s" % (
+                        self.pktCB.name_of(pkid), e, traceback.format_exc())
+                )
+                return False
+            if pkid == self.pktCB.JOIN_GAME[PKT] and not self.joined:
+                self.advance("joined")
+        return True
+
     def close_server(self, reason="Disconnected"):
         """
         Client is responsible for closing the server connection and handling
@@ -171,7 +214,12 @@ class ServerConnection(object):
 
         # end 'handle' and 'flush_loop' cleanly
         self.abort = True
-        # time.sleep(0.1)
+        with self.progress:
+            self.progress.notify_all()
+        if self.proxy.eventloop:
+            # leave the selector before the socket is closed
+            self.proxy.eventloop.discard(self)
+            self.stopped.set()
 
         # noinspection PyBroadException
         try:
@@ -184,10 +232,34 @@ class ServerConnection(object):
         except:
             condition = False
         # allow old packet and socket to be Garbage Collected
+        if self.packet:
+            self.packet.close()
         self.packet = None
         self.server_socket = None
         return condition
 
+    def advance(self, stage):
+        """ Mark a login stage (logged_in, joined, chunks_ready) done. """
+        with self.progress:
+            setattr(self, stage, True)
+            self.progress.notify_all()
+
+    def wait_for(self, stage, timeout):
+        """
+        Wait until `stage` is done, the connection closes or `timeout`
+        seconds pass.
+
+        :returns: whether the stage is done.
+        """
+        deadline = time.time() + timeout
+        with self.progress:
+            while not (getattr(self, stage) or self.abort):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.progress.wait(remaining)
+            return getattr(self, stage)
+
     # PARSERS SECTION
     # -----------------------------
 
@@ -264,6 +336,7 @@ class ServerConnection(object):
     # no point in parsing because we already know the UUID and Username
     def _parse_login_success(self):
         self.state = PLAY
+        self.advance("logged_in")
         return False
 
     def _parse_login_set_compression(self):
@@ -285,7 +358,7 @@ class ServerConnection(object):
 
     def _define_parsers(self):
         # the packets we parse and the methods that parse them.
-        self.parsers = {
+        parsers = {
             HANDSHAKE: {},  # maps identically to OFFLINE ( '0' )
             LOGIN: {
                 self.pktCB.LOGIN_DISCONNECT[PKT]:
@@ -316,53 +389,62 @@ class ServerConnection(object):
                 self.pktCB.SPAWN_PLAYER[PKT]:
                     self.parse_cb.play_spawn_player,
 
-                # features
-                self.pktCB.USE_BED[PKT]:
-                    self.parse_cb.play_use_bed,
-                self.pktCB.TIME_UPDATE[PKT]:
-                    self.parse_cb.play_time_update,
-                self.pktCB.TAB_COMPLETE[PKT]:
-                    self.parse_cb.play_tab_complete,
-                self.pktCB.SPAWN_POSITION[PKT]:
-                    self.parse_cb.play_spawn_position,
-
-                # Monitor player states
-                self.pktCB.CHANGE_GAME_STATE[PKT]:
-                    self.parse_cb.play_change_game_state,
-                self.pktCB.PLAYER_POSLOOK[PKT]:
-                    self.parse_cb.play_player_poslook,
+                # hub information
                 self.pktCB.JOIN_GAME[PKT]:
                     self.parse_cb.play_join_game,
-                # hub information
                 self.pktCB.RESPAWN[PKT]:
                     self.parse_cb.play_respawn,
-                self.pktCB.UPDATE_HEALTH[PKT]:
-                    self.parse_cb.update_health,
-                self.pktCB.CHUNK_DATA[PKT]:
-                    self.parse_cb.play_chunk_data,
-
-                # inventory management
-                self.pktCB.OPEN_WINDOW[PKT]:
-                    self.parse_cb.play_open_window,
-                self.pktCB.WINDOW_ITEMS[PKT]:
-                    self.parse_cb.play_window_items,
-                self.pktCB.HELD_ITEM_CHANGE[PKT]:
-                    self.parse_cb.play_held_item_change,
-                self.pktCB.SET_SLOT[PKT]:
-                    self.parse_cb.play_set_slot
+                # sends the client settings
+                self.pktCB.SPAWN_POSITION[PKT]:
+                    self.parse_cb.play_spawn_position,
             }
         }
 
+        # The rest are only parsed when something uses what they provide.
+        play = parsers[PLAY]
+        # the event loop engine runs these off its thread (plugin code).
+        events = set()
+        if self.proxy.wants_event("player.chatbox"):
+            events.add(self.pktCB.CHAT_MESSAGE[PKT])
+        if self.proxy.wants_event("player.spawned"):
+            events.add(self.pktCB.SPAWN_POSITION[PKT])
+        if self.proxy.wants_state():
+            # Monitor player states
+            play[self.pktCB.TIME_UPDATE[PKT]] = self.parse_cb.play_time_update
+            play[self.pktCB.CHANGE_GAME_STATE[PKT]] = self.parse_cb.play_change_game_state  # noqa
+            play[self.pktCB.PLAYER_POSLOOK[PKT]] = self.parse_cb.play_player_poslook  # noqa
+            play[self.pktCB.UPDATE_HEALTH[PKT]] = self.parse_cb.update_health
+            play[self.pktCB.CHUNK_DATA[PKT]] = self.parse_cb.play_chunk_data
+            # keep the held chunks up to date
+            play[self.pktCB.BLOCK_CHANGE[PKT]] = self.parse_cb.play_block_change  # noqa
+            play[self.pktCB.MULTI_BLOCK_CHANGE[PKT]] = self.parse_cb.play_multi_block_change  # noqa
+            play[self.pktCB.EXPLOSION[PKT]] = self.parse_cb.play_explosion
+            # inventory management
+            play[self.pktCB.OPEN_WINDOW[PKT]] = self.parse_cb.play_open_window
+            play[self.pktCB.WINDOW_ITEMS[PKT]] = self.parse_cb.play_window_items  # noqa
+            play[self.pktCB.HELD_ITEM_CHANGE[PKT]] = self.parse_cb.play_held_item_change  # noqa
+            play[self.pktCB.SET_SLOT[PKT]] = self.parse_cb.play_set_slot
+        # features
+        if self.proxy.wants_event("player.usebed"):
+            play[self.pktCB.USE_BED[PKT]] = self.parse_cb.play_use_bed
+            events.add(self.pktCB.USE_BED[PKT])
+        if self.proxy.wants_event("server.autoCompletes"):
+            play[self.pktCB.TAB_COMPLETE[PKT]] = self.parse_cb.play_tab_complete  # noqa
+            events.add(self.pktCB.TAB_COMPLETE[PKT])
+
         if self.entity_controls:
-            self.parsers[PLAY][
-                self.pktCB.SPAWN_OBJECT[PKT]] = self.parse_cb.play_spawn_object
-            self.parsers[PLAY][
-                self.pktCB.SPAWN_MOB[PKT]] = self.parse_cb.play_spawn_mob
-            self.parsers[PLAY][
-                self.pktCB.ENTITY_RELATIVE_MOVE[PKT]] = self.parse_cb.play_entity_relative_move  # noqa
-            self.parsers[PLAY][
-                self.pktCB.ENTITY_TELEPORT[PKT]] = self.parse_cb.play_entity_teleport  # noqa
-            self.parsers[PLAY][
-                self.pktCB.ATTACH_ENTITY[PKT]] = self.parse_cb.play_attach_entity  # noqa
-            self.parsers[PLAY][
-                self.pktCB.DESTROY_ENTITIES[PKT]] = self.parse_cb.play_destroy_entities  # noqa
+            play[self.pktCB.SPAWN_OBJECT[PKT]] = self.parse_cb.play_spawn_object
+            play[self.pktCB.SPAWN_MOB[PKT]] = self.parse_cb.play_spawn_mob
+            play[self.pktCB.ENTITY_RELATIVE_MOVE[PKT]] = self.parse_cb.play_entity_relative_move  # noqa
+            play[self.pktCB.ENTITY_TELEPORT[PKT]] = self.parse_cb.play_entity_teleport  # noqa
+            play[self.pktCB.ATTACH_ENTITY[PKT]] = self.parse_cb.play_attach_entity  # noqa
+            play[self.pktCB.DESTROY_ENTITIES[PKT]] = self.parse_cb.play_destroy_entities  # noqa
+            if self.proxy.wants_event("entity.mount", "entity.unmount"):
+                events.add(self.pktCB.ATTACH_ENTITY[PKT])
+
+        self.parsers = parsers
+        self.event_parsers = events
+
+    def refresh_parsers(self):
+        """ Rebuild the parser tables (see Proxy.refresh_parsers()). """
+        self._define_parsers()
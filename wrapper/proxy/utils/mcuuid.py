@@ -31,6 +31,17 @@ class UUIDS(object):
     def __init__(self, loginstance, usercache):
         self.log = loginstance
         self.usercache = usercache
+        # what Mojang's APIs are called with (see set_http())
+        self.http = requests
+        self.timeout = None
+
+    def set_http(self, session, timeout):
+        """
+        Make Mojang API calls with a (keep-alive) requests.Session and a
+        timeout.  The proxy shares its login pipeline's session.
+        """
+        self.http = session
+        self.timeout = timeout
 
     @staticmethod
     def formatuuid(playeruuid):
@@ -70,6 +81,7 @@ class UUIDS(object):
         :param forcepoll:  force polling even if record has been cached in past 30 days
         :returns: returns the online/Mojang MCUUID object from the given name. Updates the wrapper usercache.json
                 Yields False if failed.
+        :raises: requests.RequestException if Mojang could not be reached.
         """
         user_name = "%s" % username  # create a new name variable that is unrelated the the passed variable.
         frequency = 86400  # daily (to ensure a new persons name gets loaded
@@ -88,7 +100,8 @@ class UUIDS(object):
                 user_uuid_matched = useruuid  # cache for later in case multiple name changes require a uuid lookup.
 
         # try mojang  (a new player or player changed names.)
-        r = requests.get("https://api.mojang.com/users/profiles/minecraft/%s" % user_name)
+        r = self.http.get("https://api.mojang.com/users/profiles/minecraft/%s" % user_name,
+                          timeout=self.timeout)
         if r.status_code == 200:
             useruuid = self.formatuuid(r.json()["id"])  # returns a string uuid with dashes
             correctcapname = r.json()["name"]
@@ -130,6 +143,7 @@ class UUIDS(object):
         :param uselocalname:  Will return the name our server uses for this player.
 
         :returns: returns the username from the specified uuid, else returns False if failed.
+        :raises: requests.RequestException if Mojang could not be reached.
         """
         # if called directly, can update cache daily (refresh names list, etc)
         frequency = 86400
@@ -214,45 +228,45 @@ class UUIDS(object):
                 - otherwise, a list of names...
         """
 
-        r = requests.get(
+        r = self.http.get(
             "https://api.mojang.com/user/profiles/%s/names" %
-            str(user_uuid).replace("-", ""))
+            str(user_uuid).replace("-", ""), timeout=self.timeout)
         if r.status_code == 200:
             return r.json()
         if r.status_code == 204:
             return False
-        else:
-            rx = requests.get("https://status.mojang.com/check")
-            if rx.status_code == 200:
-                rx = rx.json()
-                for entry in rx:
-                    if "account.mojang.com" in entry:
-                        if entry["account.mojang.com"] == "green":
-                            self.log.warning("Mojang accounts is green, but request failed - have you "
-                                             "over-polled (large busy server) or supplied an incorrect UUID??")
-                            self.log.warning("uuid: %s", user_uuid)
-                            self.log.warning("response: \n%s", str(rx))
-                            return False
-                        elif entry["account.mojang.com"] in ("yellow", "red"):
-                            self.log.warning(
-                                "Mojang accounts is experiencing issues (%s).",
-                                entry["account.mojang.com"]
-                            )
-                            return False
+        rx = self.http.get("https://status.mojang.com/check",
+                           timeout=self.timeout)
+        if rx.status_code == 200:
+            rx = rx.json()
+            for entry in rx:
+                if "account.mojang.com" in entry:
+                    if entry["account.mojang.com"] == "green":
+                        self.log.warning("Mojang accounts is green, but request failed - have you "
+                                         "over-polled (large busy server) or supplied an incorrect UUID??")
+                        self.log.warning("uuid: %s", user_uuid)
+                        self.log.warning("response: \n%s", str(rx))
+                        return False
+                    elif entry["account.mojang.com"] in ("yellow", "red"):
                         self.log.warning(
-                            "Mojang Status found, but corrupted or in an "
-                            "unexpected format (status code %s)",
-                            r.status_code
+                            "Mojang accounts is experiencing issues (%s).",
+                            entry["account.mojang.com"]
                         )
                         return False
-                    else:
-                        self.log.warning(
-                            "Mojang Status not found - no internet connection, "
-                            "perhaps? (status code may not exist)")
-                        try:
-                            return self.usercache[user_uuid]["name"]
-                        except TypeError:
-                            return False
+                    self.log.warning(
+                        "Mojang Status found, but corrupted or in an "
+                        "unexpected format (status code %s)",
+                        r.status_code
+                    )
+                    return False
+                else:
+                    self.log.warning(
+                        "Mojang Status not found - no internet connection, "
+                        "perhaps? (status code may not exist)")
+                    try:
+                        return self.usercache[user_uuid]["name"]
+                    except TypeError:
+                        return False
 
     # noinspection PyBroadException
     @staticmethod